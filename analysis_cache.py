@@ -0,0 +1,85 @@
+# analysis_cache.py
+# Bounded LRU of pure per-text analysis results ("hi", "lol", "ok", "?" ...).
+# One entry per normalized text, holding whatever kinds were asked for
+# (signal, vibe, hits, pair). The whole cache is dropped as soon as the pair
+# index or any lexicon changes version, so entries never go stale.
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Tuple
+
+import emotion_engine
+import pair_index
+import safety_lexicon
+from config import ANALYSIS_CACHE_SIZE, ANALYSIS_CACHE_MAX_LEN
+
+_lru: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_gen: Tuple[int, int, int] = (-1, -1, -1)
+_stats: Dict[str, int] = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0, "uncacheable": 0}
+
+
+def _generation() -> Tuple[int, int, int]:
+    # load lexicons first so their initial load doesn't count as a change
+    safety_lexicon.get()
+    emotion_engine.get_index()
+    return (pair_index.version, safety_lexicon.version, emotion_engine.lexicon_version)
+
+
+def normalize(text: str) -> str:
+    return (text or "").strip().lower()
+
+
+def cached(kind: str, text: str, compute: Callable[[], Any]) -> Any:
+    """
+    compute() must depend only on `text` (and versioned data above).
+    The returned value is shared: treat it as read-only.
+    """
+    global _gen
+    key = normalize(text)
+    if ANALYSIS_CACHE_SIZE <= 0 or len(key) > ANALYSIS_CACHE_MAX_LEN:
+        _stats["uncacheable"] += 1
+        return compute()
+
+    gen = _generation()
+    if gen != _gen:
+        if _lru:
+            _stats["invalidations"] += 1
+        _lru.clear()
+        _gen = gen
+
+    entry = _lru.get(key)
+    if entry is not None and kind in entry:
+        _lru.move_to_end(key)
+        _stats["hits"] += 1
+        return entry[kind]
+
+    _stats["misses"] += 1
+    value = compute()
+    if entry is None:
+        entry = _lru[key] = {}
+        if len(_lru) > ANALYSIS_CACHE_SIZE:
+            _lru.popitem(last=False)
+            _stats["evictions"] += 1
+    entry[kind] = value
+    return value
+
+
+# -------------------------
+# Cached analyses
+# -------------------------
+def signal(text: str, state: Dict[str, Any]) -> Dict[str, Any]:
+    """infer_emotion with everything but ts cached (fresh dicts per call)."""
+    sig = cached("signal", text, lambda: {k: v for k, v in emotion_engine.infer_emotion(text, state).items() if k != "ts"})
+    return dict(sig, delta=dict(sig["delta"]), ts=time.time())
+
+
+def safety_hits(text: str) -> Dict[str, Any]:
+    return cached("hits", text, lambda: safety_lexicon.hits(text))
+
+
+def stats() -> Dict[str, Any]:
+    lookups = _stats["hits"] + _stats["misses"]
+    return dict(_stats, size=len(_lru), hit_rate=(_stats["hits"] / lookups) if lookups else 0.0)
+
+
+def clear():
+    _lru.clear()
@@ -0,0 +1,101 @@
+# bench_broadcast.py
+"""
+Broadcast at scale against the local fake Bot API.
+
+  python bench_broadcast.py [--users 1000000] [--rate 20000] [--interrupt 0.5]
+                            [--fault-429 0.001] [--latency-ms 2]
+
+Seeds N synthetic users in a temp bot.db, then broadcasts through a real
+PTB Bot pointed at fake_bot_api. --interrupt kills the run part-way (like a
+worker restart) and resumes from the checkpoint; the report shows how many
+chats were resent. Peak RSS shows the streaming cursor keeps memory flat.
+"""
+import argparse
+import asyncio
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from telegram import Bot
+from telegram.request import HTTPXRequest
+
+from fake_bot_api import FakeBotAPI
+
+
+def _seed(n: int):
+    import bot_db
+
+    bot_db.init_db()
+    db = bot_db._db()
+    step = 50000
+    now = time.time()
+    for start in range(1, n + 1, step):
+        rows = [(i, f"user{i}", now, now, 1, "{}") for i in range(start, min(n + 1, start + step))]
+        db.executemany(
+            "INSERT INTO users (chat_id, username, first_seen, last_seen, interaction_count, state_json) VALUES (?,?,?,?,?,?)",
+            rows,
+        )
+    db.commit()
+
+
+async def run(args):
+    import bot_db
+    import broadcast
+    from ratelimit import RateLimiter
+
+    api = FakeBotAPI(rate=0, record=False, fault_429=args.fault_429, retry_after=1, latency_ms=args.latency_ms)
+    await api.start()
+    bot = Bot("123456:FAKE", base_url=api.base_url, request=HTTPXRequest(connection_pool_size=args.concurrency + 4))
+
+    async with bot:
+        bc_id = bot_db.create_broadcast("hello from the bench 👋", admin_chat_id=0)
+        limiter = RateLimiter(args.rate, burst=args.concurrency)
+        t0 = time.time()
+
+        if args.interrupt:
+            task = broadcast.start(bot, bc_id, limiter=limiter, concurrency=args.concurrency)
+            while True:
+                bc = bot_db.get_broadcast(bc_id)
+                if bc["sent"] + bc["failed"] + bc["blocked"] >= args.interrupt * args.users:
+                    break
+                await asyncio.sleep(0.05)
+            task.cancel()  # "crash": status stays running, cursor is the last checkpoint
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            print(f"interrupted at cursor={bot_db.get_broadcast(bc_id)['cursor']}, resuming")
+
+        await broadcast.run(bot, bc_id, limiter=limiter, concurrency=args.concurrency)
+        elapsed = time.time() - t0
+
+    await api.stop()
+    bc = bot_db.get_broadcast(bc_id)
+    sends = api.calls_by_method().get("sendMessage", 0)
+    ok_sends = sends - api.errors_429
+    print(f"users={args.users} status={bc['status']} sent={bc['sent']} failed={bc['failed']} blocked={bc['blocked']}")
+    print(f"elapsed={elapsed:.1f}s throughput={bc['sent'] / elapsed:.0f} msg/s")
+    print(f"sendMessage calls={sends} (429 injected={api.errors_429}, resent after resume={ok_sends - bc['sent']})")
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"peak_rss={rss / 1024:.0f}MB" if sys.platform != "darwin" else f"peak_rss={rss / 2**20:.0f}MB")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=1_000_000)
+    ap.add_argument("--rate", type=float, default=20000.0, help="limiter rate (production uses BROADCAST_RATE)")
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--interrupt", type=float, default=0.0, help="fraction after which to simulate a restart")
+    ap.add_argument("--fault-429", type=float, default=0.0)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    args = ap.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="ellena-bcast-"))
+    _seed(args.users)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
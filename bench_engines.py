@@ -0,0 +1,266 @@
+# bench_engines.py
+"""
+Microbenchmarks for the pure per-message functions, with a regression gate.
+
+  python bench_engines.py [--repeat 5] [--only infer,vibe] [--threshold 0.35]
+                          [--baseline bench_engines.json] [--update]
+
+Runs every function over a fixed-seed corpus (short, long, emoji-heavy,
+multilingual messages and training blocks) and prints ns/op and bytes
+allocated per op (tracemalloc peak during the call; CPython has no cheap
+allocation counter). Timings are also given relative to a pure-Python
+reference loop, so a baseline recorded on one machine still means something
+on another.
+
+Compares against the baseline file and exits 1 if any function got slower
+(relative time) or allocates more than --threshold over it. --update rewrites
+the baseline with this run. The analysis cache is off: this measures the
+functions themselves, not cache hits.
+"""
+import argparse
+import copy
+import gc
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+SEED = 1234
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_engines.json")
+
+# -------------------------
+# Corpus
+# -------------------------
+SHORT = ["hi", "lol", "ok", "?", "gm", "wyd", "hey u", "sup", "nah", "yh", "😂", "k", "hmm", "fr?", "omg"]
+WORDS = (
+    "i you we they work school boss exam family mum love baby miss tired sad angry happy "
+    "today tomorrow night call text later really so very just maybe why how what when "
+    "lonely stressed hate cute sweet honey bored hungry sleep movie music game weekend"
+).split()
+EMOJI = ["😂", "🥺", "😭", "😏", "❤️", "🔥", "😡", "🙄", "😘", "🤣", "💀", "✨", "👀", "🙏"]
+MULTILINGUAL = [
+    "hola cómo estás hoy? te extraño mucho",
+    "je suis fatigué, la journée était longue",
+    "tudo bem? estou com saudade de você",
+    "wie geht's dir? ich vermisse dich",
+    "как дела? я очень устал сегодня",
+    "आज मैं बहुत थक गया हूँ",
+    "كيف حالك اليوم؟ اشتقت لك",
+    "你今天怎么样？我好想你",
+    "how far? i dey tire o, work no easy",
+    "ẹ kú àárọ̀, ṣé dáadáa ni?",
+    "今日は疲れたよ、電話して",
+    "잘 지내? 보고 싶어",
+]
+
+
+def build_corpus(rnd: random.Random, n: int = 400):
+    msgs = []
+    for i in range(n):
+        kind = i % 5
+        if kind == 0:
+            msgs.append(rnd.choice(SHORT))
+        elif kind == 1:
+            msgs.append(" ".join(rnd.choice(WORDS) for _ in range(rnd.randint(5, 14))) + rnd.choice(["", "?", "!", "!!"]))
+        elif kind == 2:
+            msgs.append(" ".join(rnd.choice(WORDS) for _ in range(rnd.randint(40, 120))) + ".")
+        elif kind == 3:
+            parts = [rnd.choice(WORDS + EMOJI * 2) for _ in range(rnd.randint(4, 16))]
+            msgs.append(" ".join(parts) + "".join(rnd.choice(EMOJI) for _ in range(rnd.randint(1, 6))))
+        else:
+            msgs.append(rnd.choice(MULTILINGUAL))
+    return msgs
+
+
+def build_blocks(rnd: random.Random, msgs, n: int = 60):
+    blocks = []
+    for _ in range(n):
+        lines = []
+        for _ in range(rnd.randint(2, 20)):
+            lines.append(f"u: {rnd.choice(msgs)}")
+            lines.append(f"me: {rnd.choice(msgs)}")
+            if rnd.random() < 0.2:
+                lines.append("")
+        blocks.append("\n".join(lines))
+    return blocks
+
+
+# -------------------------
+# Cases
+# -------------------------
+def build_cases(msgs, blocks):
+    import analysis_cache
+    import bot_db
+    import delay_engine
+    import emotion_engine
+    import main
+    import safety_engine
+    import style_engine
+
+    analysis_cache.ANALYSIS_CACHE_SIZE = 0
+    state = copy.deepcopy(bot_db.DEFAULT_STATE)
+    state["mood_vector"] = emotion_engine._default_mood()
+    profile = bot_db.get_profile()
+    topics = {"work": 0.8, "family": 0.3}
+    signals = [emotion_engine.infer_emotion(m, state) for m in msgs]
+    safeties = [safety_engine.evaluate_safety(m, state, s) for m, s in zip(msgs, signals)]
+
+    return {
+        "infer_emotion": (emotion_engine.infer_emotion, [(m, state) for m in msgs]),
+        "update_mood_vector": (emotion_engine.update_mood_vector, [(state, s, z) for s, z in zip(signals, safeties)]),
+        "evaluate_safety": (safety_engine.evaluate_safety, [(m, state, s) for m, s in zip(msgs, signals)]),
+        "apply_style": (style_engine.apply_style, [(m,) for m in msgs]),
+        "emoji_count": (delay_engine._emoji_count, [(m,) for m in msgs]),
+        "detect_vibe": (main.detect_vibe, [(m,) for m in msgs]),
+        "generate_reply": (main.generate_reply, [(m, state, profile, topics) for m in msgs]),
+        "parse_training_block": (main.parse_training_block, [(b,) for b in blocks]),
+    }
+
+
+# -------------------------
+# Measurement
+# -------------------------
+def _reference_ns() -> float:
+    """Fixed pure-Python workload; the unit the relative timings are expressed in."""
+    t0 = time.perf_counter_ns()
+    d = {}
+    for i in range(20000):
+        d[i & 255] = d.get(i & 255, 0) + len(str(i))
+    return (time.perf_counter_ns() - t0) / 20000
+
+
+def _pass_ns(fn, args, min_pass_s: float = 0.1) -> float:
+    """One pass: loop the corpus for at least min_pass_s, GC off (like timeit)."""
+    random.seed(SEED)
+    gc_was = gc.isenabled()
+    gc.disable()
+    try:
+        n = 0
+        t0 = time.perf_counter_ns()
+        while True:
+            for a in args:
+                fn(*a)
+            n += len(args)
+            dt = time.perf_counter_ns() - t0
+            if dt >= min_pass_s * 1e9:
+                return dt / n
+    finally:
+        if gc_was:
+            gc.enable()
+
+
+def _alloc_bytes(fn, args) -> float:
+    random.seed(SEED)
+    total = 0
+    tracemalloc.start()
+    try:
+        for a in args:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            fn(*a)
+            total += tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+    return total / len(args)
+
+
+def run(cases, repeat: int):
+    """
+    Each pass of a function is paired with a reference pass right after it;
+    `rel` is the median of the per-pair ratios, so a noisy neighbour or a
+    clock change slows both sides of a pair and mostly cancels out.
+    """
+    out = {}
+    refs = []
+    for name, (fn, args) in cases.items():
+        _pass_ns(fn, args, 0)   # warm up (lexicons, regex cache, index)
+        times, ratios = [], []
+        for _ in range(repeat):
+            ns = _pass_ns(fn, args)
+            ref = _reference_ns()
+            times.append(ns)
+            ratios.append(ns / ref)
+            refs.append(ref)
+        out[name] = {
+            "ns_op": round(min(times), 1),
+            "rel": round(statistics.median(ratios), 3),
+            "alloc_b_op": round(_alloc_bytes(fn, args), 1),
+        }
+    return statistics.median(refs), out
+
+
+def compare(results, baseline, threshold: float):
+    """Returns a list of (name, what, now, before) regressions."""
+    bad = []
+    for name, r in results.items():
+        b = baseline.get("results", {}).get(name)
+        if not b:
+            continue
+        if r["rel"] > b["rel"] * (1.0 + threshold):
+            bad.append((name, "time", r["rel"], b["rel"]))
+        # small absolute slack: tracemalloc peaks wobble by a few blocks
+        if r["alloc_b_op"] > b["alloc_b_op"] * (1.0 + threshold) + 64:
+            bad.append((name, "alloc", r["alloc_b_op"], b["alloc_b_op"]))
+    return bad
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=5, help="timed passes per function (min ns/op, median rel)")
+    ap.add_argument("--only", default="", help="comma-separated substrings of function names")
+    ap.add_argument("--baseline", default=BASELINE)
+    ap.add_argument("--threshold", type=float, default=0.35, help="allowed slowdown / extra allocation (0.25 = 25%%)")
+    ap.add_argument("--update", action="store_true", help="write this run as the new baseline")
+    args = ap.parse_args()
+
+    rnd = random.Random(SEED)
+    msgs = build_corpus(rnd)
+    blocks = build_blocks(rnd, msgs)
+
+    # generate_reply looks up learned pairs: give it an empty throwaway DB
+    os.chdir(tempfile.mkdtemp(prefix="ellena-bench-"))
+    import bot_db
+    bot_db.init_db()
+
+    cases = build_cases(msgs, blocks)
+    if args.only:
+        keys = [k.strip() for k in args.only.split(",") if k.strip()]
+        cases = {n: c for n, c in cases.items() if any(k in n for k in keys)}
+
+    ref, results = run(cases, args.repeat)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    base = baseline.get("results", {})
+
+    print(f"reference loop: {ref:.1f} ns/iter   corpus: {len(msgs)} msgs, {len(blocks)} blocks (seed {SEED})")
+    print(f"{'function':<22} {'ns/op':>10} {'rel':>8} {'alloc_B/op':>11} {'vs base':>9}")
+    for name, r in results.items():
+        b = base.get(name)
+        delta = f"{(r['rel'] / b['rel'] - 1.0) * 100:+.0f}%" if b and b.get("rel") else "-"
+        print(f"{name:<22} {r['ns_op']:>10.1f} {r['rel']:>8.2f} {r['alloc_b_op']:>11.1f} {delta:>9}")
+
+    if args.update:
+        merged = dict(base)
+        merged.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"seed": SEED, "python": sys.version.split()[0], "reference_ns": round(ref, 2), "results": merged},
+                      f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"baseline written: {args.baseline}")
+        return
+
+    bad = compare(results, baseline, args.threshold)
+    for name, what, now, before in bad:
+        print(f"REGRESSION {name} {what}: {now:.2f} vs baseline {before:.2f} (> {args.threshold:.0%})")
+    if bad:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
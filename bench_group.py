@@ -0,0 +1,118 @@
+# bench_group.py
+"""
+Simulated busy group: one supergroup, many members, most messages not for the bot.
+
+  python bench_group.py [--members 500] [--messages 3000] [--rate 200]
+                        [--mention 0.05] [--reply 0.03] [--no-filter]
+
+Runs the real handlers against fake_bot_api and reports how many messages
+went through the full pipeline, state writes, and reply latency. With
+--no-filter every group message is processed (the old behaviour).
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from fake_bot_api import FakeBotAPI, BOT_USER, SAMPLE_TEXTS
+
+GROUP_ID = -100123
+
+
+async def run(args) -> dict:
+    import bot_db
+    import delay_engine
+    import group_mode
+    from loadtest import build_app
+
+    delay_engine.DELAY_SCALE = 0
+    bot_db.init_db()
+    bot_db.warm_pair_index()
+    if args.no_filter:
+        def _all(message, bot_id, bot_username):
+            group_mode._stats["seen"] += 1
+            group_mode._stats["all"] += 1
+            return "all"
+        group_mode.relevance = _all
+
+    api = FakeBotAPI(rate=0)
+    await api.start()
+    app = build_app(api)
+    rnd = random.Random(args.seed)
+    mention = "@" + BOT_USER["username"]
+
+    async with app:
+        await app.post_init(app)
+        await app.start()
+        await app.updater.start_polling(poll_interval=0.0, timeout=5)
+
+        t0 = time.time()
+        interval = 1.0 / args.rate
+        expected = 0
+        for i in range(args.messages):
+            uid = 5000 + rnd.randrange(args.members)
+            text = rnd.choice(SAMPLE_TEXTS)
+            roll = rnd.random()
+            is_mention = roll < args.mention
+            is_reply = not is_mention and roll < args.mention + args.reply
+            if is_mention:
+                text = f"{mention} {text}"
+            expect = args.no_filter or is_mention or is_reply
+            expected += expect
+            api.push_text(GROUP_ID, text, user_id=uid, chat_type="supergroup",
+                          reply_to_bot=is_reply, expect_reply=expect)
+            delay = t0 + (i + 1) * interval - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        t1 = time.time()
+
+        deadline = t1 + args.drain
+        while len(api.replies) < expected and time.time() < deadline:
+            await asyncio.sleep(0.1)
+        t2 = time.time()
+
+        await app.updater.stop()
+        await app.stop()
+        await app.post_shutdown(app)
+    await api.stop()
+
+    members = bot_db._db().execute("SELECT COUNT(*) FROM group_members").fetchone()[0]
+    return {
+        "messages": args.messages,
+        "expected_replies": expected,
+        "replied": len(api.replies),
+        "filter": group_mode.stats(),
+        "state_writes": bot_db.write_stats(),
+        "member_rows": members,
+        "elapsed_s": t2 - t0,
+        "latency": api.latency_report(),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--members", type=int, default=500)
+    ap.add_argument("--messages", type=int, default=3000)
+    ap.add_argument("--rate", type=float, default=200.0, help="group messages per second")
+    ap.add_argument("--mention", type=float, default=0.05, help="share that @mention the bot")
+    ap.add_argument("--reply", type=float, default=0.03, help="share that reply to the bot")
+    ap.add_argument("--drain", type=float, default=30.0)
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--no-filter", action="store_true", help="process every group message")
+    args = ap.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="ellena-group-"))
+    r = asyncio.run(run(args))
+    lat = r["latency"]
+    print(f"messages={r['messages']} expected_replies={r['expected_replies']} replied={r['replied']} "
+          f"elapsed={r['elapsed_s']:.1f}s member_rows={r['member_rows']}")
+    print(f"filter={r['filter']}")
+    print(f"state_writes={r['state_writes']}")
+    if lat.get("count"):
+        print(f"latency p50={lat['p50_ms']:.0f}ms p90={lat['p90_ms']:.0f}ms p99={lat['p99_ms']:.0f}ms max={lat['max_ms']:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# bench_personas.py
+"""
+Memory: N personas in one process vs N separate single-bot processes.
+
+  python bench_personas.py [--bots 4] [--messages 50]
+
+Both setups run the real handlers against one fake_bot_api (every bot
+polls the same synthetic updates, so each bot handles --messages). After
+the traffic is answered, RSS and PSS (shared pages split fairly) of the
+bot processes are summed.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from fake_bot_api import FakeBotAPI
+
+
+def _mem_kb(pid: int) -> dict:
+    out = {"rss": 0, "pss": 0}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    out["rss"] = int(line.split()[1])
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    out["pss"] = int(line.split()[1])
+    except OSError:
+        pass
+    return out
+
+
+# -------------------------
+# Child: one process serving --bots personas
+# -------------------------
+async def _child(args):
+    from telegram.ext import ApplicationBuilder
+
+    import bot_db
+    import delay_engine
+    import main
+    import personas
+
+    delay_engine.DELAY_SCALE = 0
+    bots = [
+        personas.Persona(f"p{args.first + i}", f"{100000 + args.first + i}:FAKE", 1, "" if i == 0 else f"p{args.first + i}")
+        for i in range(args.bots)
+    ]
+    personas.configure(bots)
+    bot_db.init_db()
+    bot_db.load_live_stats()
+    apps = [
+        main.build_app(p, builder=ApplicationBuilder().base_url(args.base_url).base_file_url(args.base_url.replace("/bot", "/file/bot")))
+        for p in bots
+    ]
+    await main.serve_all(apps)
+
+
+# -------------------------
+# Parent
+# -------------------------
+async def _run(bots: int, procs: int, messages: int) -> dict:
+    api = FakeBotAPI(rate=0, record=False)
+    await api.start()
+    per_proc = bots // procs
+    children = []
+    for i in range(procs):
+        workdir = tempfile.mkdtemp(prefix="ellena-persona-")
+        children.append(await asyncio.create_subprocess_exec(
+            sys.executable, os.path.abspath(__file__), "--child",
+            "--bots", str(per_proc), "--first", str(i * per_proc), "--base-url", api.base_url,
+            cwd=workdir, env=dict(os.environ, PYTHONPATH=os.pathsep.join([os.path.dirname(os.path.abspath(__file__))] + sys.path)),
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL,
+        ))
+
+    # every bot polling?
+    deadline = time.time() + 60
+    while api.method_counts.get("deleteWebhook", 0) < bots and time.time() < deadline:
+        await asyncio.sleep(0.1)
+    await asyncio.sleep(1.0)
+
+    t0 = time.time()
+    for i in range(messages):
+        api.push_text(5000 + i, api.texts[i % len(api.texts)])
+        await asyncio.sleep(0.01)
+    while api.method_counts.get("sendMessage", 0) < bots * messages and time.time() - t0 < 120:
+        await asyncio.sleep(0.1)
+    elapsed = time.time() - t0
+
+    mem = {"rss": 0, "pss": 0}
+    for c in children:
+        m = _mem_kb(c.pid)
+        mem["rss"] += m["rss"]
+        mem["pss"] += m["pss"]
+    for c in children:
+        c.terminate()
+    for c in children:
+        await c.wait()
+    await api.stop()
+    return {"procs": procs, "bots": bots, "replies": api.method_counts.get("sendMessage", 0),
+            "elapsed_s": elapsed, "rss_mb": mem["rss"] / 1024.0, "pss_mb": mem["pss"] / 1024.0}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--bots", type=int, default=4)
+    ap.add_argument("--messages", type=int, default=50, help="updates each bot handles")
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    ap.add_argument("--first", type=int, default=0, help=argparse.SUPPRESS)
+    ap.add_argument("--base-url", default="", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        asyncio.run(_child(args))
+        return
+
+    for procs in (args.bots, 1):
+        r = asyncio.run(_run(args.bots, procs, args.messages))
+        label = "separate processes" if procs > 1 else "one process"
+        print(f"{label:>18}: bots={r['bots']} procs={r['procs']} replies={r['replies']} "
+              f"rss={r['rss_mb']:.1f}MB pss={r['pss_mb']:.1f}MB ({r['pss_mb'] / r['bots']:.1f}MB/bot) "
+              f"in {r['elapsed_s']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# bench_safety.py
+"""
+Safety matcher cost vs wordlist size.
+
+  python bench_safety.py [--sizes 100,1000,10000,50000] [--messages 2000]
+
+Compares the compiled automaton (safety_lexicon) with the old approach of
+one regex per word per message. The automaton's per-message cost should
+stay flat as the list grows; the regex loop grows linearly (it is skipped
+above --regex-max words).
+"""
+import argparse
+import random
+import re
+import string
+import time
+
+import safety_lexicon
+
+MESSAGES = [
+    "hey how are you doing today",
+    "i missed you so much 😂😂",
+    "lol that's crazy!!! tell me more",
+    "ugh work was sooo stressful, my boss is annoying",
+    "what are you up to tonight?",
+    "n u d e s pls",
+    "you're such a b1tch lol",
+    "j'ai passé une bonne journée, et toi ?",
+    "hola, ¿qué tal? 😊",
+    "f​uck this traffic",
+]
+
+
+def _fake_words(rnd: random.Random, n: int):
+    words = set()
+    while len(words) < n:
+        w = "".join(rnd.choice(string.ascii_lowercase) for _ in range(rnd.randint(4, 10)))
+        if rnd.random() < 0.15:
+            w += " " + "".join(rnd.choice(string.ascii_lowercase) for _ in range(rnd.randint(3, 8)))
+        words.add(w)
+    return list(words)
+
+
+def _regex_has_any(text: str, words) -> bool:
+    raw = (text or "").lower()
+    for w in words:
+        if re.search(rf"\b{re.escape(w)}\b", raw):
+            return True
+    return False
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="100,1000,10000,50000")
+    ap.add_argument("--messages", type=int, default=2000)
+    ap.add_argument("--regex-max", type=int, default=10000)
+    args = ap.parse_args()
+
+    rnd = random.Random(42)
+    msgs = [rnd.choice(MESSAGES) for _ in range(args.messages)]
+
+    print(f"{'terms':>8} {'build_ms':>9} {'automaton_us/msg':>17} {'regex_us/msg':>13}")
+    for size in [int(x) for x in args.sizes.split(",")]:
+        words = _fake_words(rnd, size) + ["fuck", "nude", "nudes", "bitch"]
+
+        t0 = time.perf_counter()
+        lex = safety_lexicon.Lexicon({"explicit": words[: size // 2] + ["fuck", "nudes"], "harass": words[size // 2:] + ["bitch"]})
+        build_ms = (time.perf_counter() - t0) * 1000
+
+        t0 = time.perf_counter()
+        for m in msgs:
+            lex.scan(safety_lexicon.normalize(m))
+        auto_us = (time.perf_counter() - t0) / len(msgs) * 1e6
+
+        regex_us = float("nan")
+        if size <= args.regex_max:
+            sample = msgs[: max(20, len(msgs) // 20)]
+            t0 = time.perf_counter()
+            for m in sample:
+                _regex_has_any(m, words)
+            regex_us = (time.perf_counter() - t0) / len(sample) * 1e6
+
+        print(f"{size:>8} {build_ms:>9.1f} {auto_us:>17.1f} {regex_us:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# bench_startup.py
+"""
+Cold-start benchmark: process start -> first reply.
+
+  python bench_startup.py [--pairs 50000] [--runs 3]
+
+Seeds a temp dir with N learned pairs, then spawns fresh interpreters that
+import main, init the DB, kick off the pair index warm-up in the background
+(same as post_init) and answer one synthetic message via handle_message.
+First run has no snapshot (rebuild), the rest map the snapshot it wrote.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+CHILD = r"""
+import asyncio, json, sys, threading, time
+t_spawn = float(sys.argv[1])
+t0 = time.time()
+sys.path.insert(0, sys.argv[2])
+
+import main, bot_db, delay_engine
+t_import = time.time()
+delay_engine.DELAY_SCALE = 0.0
+
+class _User:
+    id = 42
+    username = "bench"
+
+class _Chat:
+    id = 42
+    type = "private"
+
+class _Msg:
+    text = "hey how was your day"
+    def __init__(self):
+        self.replies = []
+    async def reply_text(self, text, **kw):
+        self.replies.append(text)
+
+class _Update:
+    update_id = 1
+
+    def __init__(self):
+        self.message = _Msg()
+        self.effective_chat = _Chat()
+        self.effective_user = _User()
+
+class _Bot:
+    id = 1
+
+    async def send_chat_action(self, *a, **kw):
+        pass
+
+class _Ctx:
+    bot = _Bot()
+    application = None
+    args = []
+
+bot_db.init_db()
+warm = threading.Thread(target=bot_db.warm_pair_index, daemon=True)
+warm.start()
+
+u = _Update()
+asyncio.run(main.handle_message(u, _Ctx()))
+t_reply = time.time()
+warm.join()
+t_ready = time.time()
+
+print(json.dumps({
+    "interp_ms": (t0 - t_spawn) * 1000,
+    "import_ms": (t_import - t0) * 1000,
+    "first_reply_ms": (t_reply - t_spawn) * 1000,
+    "index_ready_ms": (t_ready - t_spawn) * 1000,
+    "index_source": __import__("pair_index").stats()["source"],
+    "replied": bool(u.message.replies),
+}))
+"""
+
+
+def _seed(workdir: str, n_pairs: int):
+    sys.path.insert(0, HERE)
+    import bot_db
+
+    bot_db.DB_PATH = os.path.join(workdir, "bot.db")
+    bot_db.init_db()
+    rnd = random.Random(1234)
+    words = ["hello", "there", "missed", "you", "work", "today", "movie", "tired", "coffee", "music",
+             "weekend", "school", "sleep", "dinner", "game", "rain", "beach", "phone", "friend", "song"]
+    rows = []
+    for i in range(n_pairs):
+        key = " ".join(rnd.sample(words, rnd.randint(1, 3))) + f" {i}"
+        rows.append((key, f"reply {i}", time.time()))
+    bot_db._db().executemany("INSERT INTO learned_pairs (key, response, created_at) VALUES (?,?,?)", rows)
+    bot_db._db().commit()
+    bot_db._db().close()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pairs", type=int, default=50000)
+    ap.add_argument("--runs", type=int, default=3)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        _seed(workdir, args.pairs)
+        print(f"pairs={args.pairs}")
+        for i in range(args.runs):
+            t_spawn = time.time()
+            out = subprocess.run(
+                [sys.executable, "-c", CHILD, repr(t_spawn), HERE],
+                cwd=workdir, capture_output=True, text=True, check=True,
+            )
+            r = json.loads(out.stdout.strip().splitlines()[-1])
+            print(
+                f"run {i + 1}: interp={r['interp_ms']:.0f}ms import={r['import_ms']:.0f}ms "
+                f"first_reply={r['first_reply_ms']:.0f}ms index_ready={r['index_ready_ms']:.0f}ms "
+                f"({r['index_source']}) replied={r['replied']}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# bench_transcript.py
+"""
+Transcript store: size on disk and cost of reading the last N turns.
+
+  python bench_transcript.py [--chats 200] [--turns 1000] [--n 10,40,200]
+
+Fills a throwaway memory.db with --chats chats of --turns turns each (both
+sides, fixed seed), flushes and compacts like the maintenance jobs do, then
+reports bytes per turn (vs the same turns as JSON) and last(chat, n) time
+for a chat with a short history and one with a full one. Every read is
+checked against what was written.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from fake_bot_api import SAMPLE_TEXTS
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--chats", type=int, default=200)
+    ap.add_argument("--turns", type=int, default=1000, help="exchanges per chat (x2 turns)")
+    ap.add_argument("--n", default="10,40,200")
+    ap.add_argument("--reads", type=int, default=2000)
+    args = ap.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="ellena-transcript-"))
+    import config
+    config.TRANSCRIPT_KEEP_TURNS = 10 ** 9   # keep everything: this measures size, not retention
+    import memory
+    import transcript
+    transcript.TRANSCRIPT_KEEP_TURNS = config.TRANSCRIPT_KEEP_TURNS
+
+    rnd = random.Random(7)
+    written = {}
+    json_bytes = 0
+    t0 = time.perf_counter()
+    ts = int(time.time()) - args.turns * 60
+    for chat_id in range(1, args.chats + 1):
+        turns = args.turns if chat_id > 1 else 5   # chat 1: short history
+        log = written.setdefault(chat_id, [])
+        for i in range(turns):
+            u = rnd.choice(SAMPLE_TEXTS)
+            r = " ".join(rnd.choice(SAMPLE_TEXTS) for _ in range(rnd.randint(1, 3)))
+            transcript.add(chat_id, u, r, ts=ts + i * 60)
+            log += [u, r]
+            json_bytes += len(json.dumps({"ts": ts + i * 60, "side": 0, "text": u}, ensure_ascii=False))
+            json_bytes += len(json.dumps({"ts": ts + i * 60, "side": 1, "text": r}, ensure_ascii=False))
+        if chat_id % 50 == 0:
+            transcript.flush()
+    transcript.flush()
+    write_s = time.perf_counter() - t0
+
+    def size():
+        row = memory._db().execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(body)), 0) FROM transcript").fetchone()
+        return int(row[0]), int(row[1])
+
+    rows0, bytes0 = size()
+    t0 = time.perf_counter()
+    for chat_id in range(1, args.chats + 1):
+        transcript.compact_chat(chat_id)
+    compact_s = time.perf_counter() - t0
+    rows1, bytes1 = size()
+    memory._db().execute("VACUUM")
+    file_mb = os.path.getsize(memory.DB_PATH) / 1e6
+
+    total_turns = sum(len(v) for v in written.values())
+    print(f"{args.chats} chats, {total_turns} turns written in {write_s:.1f}s")
+    print(f"as JSON:            {json_bytes / total_turns:6.1f} B/turn")
+    print(f"one row per turn:   {bytes0 / total_turns:6.1f} B/turn body, {rows0} rows")
+    print(f"after compaction:   {bytes1 / total_turns:6.1f} B/turn body, {rows1} rows "
+          f"(compacted in {compact_s:.1f}s), memory.db {file_mb:.1f} MB")
+
+    print(f"{'n':>5} {'short_us':>9} {'full_us':>9}")
+    for n in [int(x) for x in args.n.split(",")]:
+        res = []
+        for chat_id in (1, 2):
+            expect = written[chat_id][-n:]
+            got = [t.text for t in transcript.last(chat_id, n)]
+            assert got == expect, (chat_id, n)
+            t0 = time.perf_counter()
+            for _ in range(args.reads):
+                transcript.last(chat_id, n)
+            res.append((time.perf_counter() - t0) / args.reads * 1e6)
+        print(f"{n:>5} {res[0]:>9.1f} {res[1]:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
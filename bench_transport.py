@@ -0,0 +1,80 @@
+# bench_transport.py
+"""
+Bot API transport settings under a reply burst, against the local fake Bot API.
+
+  python bench_transport.py [--pools 1,4,16,64] [--chats 200] [--rounds 5]
+                            [--latency-ms 40] [--keepalive 30]
+
+Each round, --chats replies go out at once (sendChatAction + sendMessage,
+like handle_message does). Per pool size this prints throughput, sendMessage
+latency, time spent waiting for a pooled connection and how many TCP
+connections were opened. --keepalive 0 shows the cost of reconnecting.
+The stand-in speaks HTTP/1.1 only, so HTTP/2 isn't covered here.
+"""
+import argparse
+import asyncio
+import time
+
+from telegram import Bot
+from telegram.constants import ChatAction
+
+import transport
+from fake_bot_api import FakeBotAPI
+
+
+async def run(pool: int, args) -> dict:
+    api = FakeBotAPI(rate=0, latency_ms=args.latency_ms, latency_jitter_ms=args.latency_ms / 4, record=False)
+    await api.start()
+    bot = Bot(
+        "123456:FAKE", base_url=api.base_url,
+        request=transport.build_request(pool_size=pool, http_version="1.1", keepalive_s=args.keepalive,
+                                        pool_timeout_s=120, read_timeout_s=120, trace=True),
+    )
+    await bot.initialize()
+    transport.reset()
+
+    async def reply(chat_id: int):
+        await bot.send_chat_action(chat_id, ChatAction.TYPING)
+        await bot.send_message(chat_id, "hey 😂")
+
+    t0 = time.perf_counter()
+    for _ in range(args.rounds):
+        await asyncio.gather(*(reply(1000 + i) for i in range(args.chats)))
+        if args.keepalive:
+            continue
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - t0
+
+    s = transport.stats().get("sendMessage", {})
+    await bot.shutdown()
+    await api.stop()
+    return {
+        "pool": pool,
+        "replies_per_s": args.chats * args.rounds / elapsed,
+        "p50_ms": s.get("p50_ms", 0.0),
+        "p99_ms": s.get("p99_ms", 0.0),
+        "wait_p99_ms": s.get("wait_p99_ms", 0.0),
+        "conns": api.connections,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pools", default="1,4,16,64")
+    ap.add_argument("--chats", type=int, default=200, help="replies in flight at once")
+    ap.add_argument("--rounds", type=int, default=5)
+    ap.add_argument("--latency-ms", type=float, default=40, help="fake API time per call")
+    ap.add_argument("--keepalive", type=float, default=30, help="keep-alive expiry (s); 0 = reconnect every call")
+    args = ap.parse_args()
+
+    print(f"{args.chats} concurrent replies x {args.rounds} rounds, api latency {args.latency_ms:.0f}ms, "
+          f"keepalive {args.keepalive:g}s")
+    print(f"{'pool':>5} {'replies/s':>10} {'p50_ms':>8} {'p99_ms':>8} {'wait_p99':>9} {'tcp_conns':>10}")
+    for pool in [int(x) for x in args.pools.split(",")]:
+        r = asyncio.run(run(pool, args))
+        print(f"{r['pool']:>5} {r['replies_per_s']:>10.1f} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} "
+              f"{r['wait_p99_ms']:>9.1f} {r['conns']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+# broadcast.py
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from telegram.error import BadRequest, ChatMigrated, Forbidden, NetworkError, RetryAfter, TelegramError, TimedOut
+
+import bot_db
+from config import BROADCAST_RATE, BROADCAST_CONCURRENCY, BROADCAST_BATCH, SEND_RATE_PER_BOT
+from ratelimit import RateLimiter
+
+MAX_NET_TRIES = 4       # timeouts / network errors per chat
+MAX_RETRY_AFTER = 20    # 429s per chat before giving up
+PROGRESS_EVERY_S = 5.0
+REPLY_HEADROOM = 0.2    # share of the per-bot send rate a broadcast leaves for live replies
+
+log = logging.getLogger(__name__)
+
+_tasks: Dict[int, asyncio.Task] = {}
+_live: Dict[int, Dict[str, Any]] = {}   # bc_id -> this run's counters (rate/eta)
+
+
+def _retry_after_s(e: RetryAfter) -> float:
+    ra = e.retry_after
+    return float(ra.total_seconds() if hasattr(ra, "total_seconds") else ra)
+
+
+async def _send_one(bot, limiter: RateLimiter, chat_id: int, text: str) -> str:
+    """
+    sent | blocked | failed. 429s pause the shared limiter (everyone waits),
+    network errors back off exponentially for this chat only. Any other
+    Telegram error fails this chat, never the whole run.
+    """
+    backoff = 1.0
+    net_tries = 0
+    ra_tries = 0
+    migrated = False
+    while True:
+        await limiter.acquire()
+        try:
+            await bot.send_message(chat_id, text)
+            return "sent"
+        except RetryAfter as e:
+            ra_tries += 1
+            if ra_tries > MAX_RETRY_AFTER:
+                return "failed"
+            limiter.pause(_retry_after_s(e))
+        except Forbidden:
+            return "blocked"  # user blocked the bot / kicked from group
+        except BadRequest:
+            return "failed"   # chat not found, etc.
+        except (TimedOut, NetworkError):
+            net_tries += 1
+            if net_tries >= MAX_NET_TRIES:
+                return "failed"
+            await asyncio.sleep(backoff)
+            backoff *= 2
+        except ChatMigrated as e:
+            if migrated:
+                return "failed"
+            migrated = True
+            chat_id = e.new_chat_id  # group became a supergroup: one retry at its new id
+        except TelegramError:
+            return "failed"   # Conflict, InvalidToken, EndPointNotFound, ...
+
+
+async def _send_batch(bot, limiter: RateLimiter, chat_ids: List[int], text: str, concurrency: int) -> Counter:
+    res: Counter = Counter()
+    it = iter(chat_ids)
+
+    async def worker():
+        for chat_id in it:  # shared iterator: each id goes to exactly one worker
+            res[await _send_one(bot, limiter, chat_id, text)] += 1
+
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    return res
+
+
+def format_progress(bc: Dict[str, Any]) -> str:
+    done = bc["sent"] + bc["failed"] + bc["blocked"]
+    total = max(bc["total"] or 0, done)
+    pct = (100.0 * done / total) if total else 100.0
+    live = _live.get(bc["id"])
+    rate = ""
+    if live and bc["status"] == "running":
+        elapsed = max(1e-6, time.time() - live["started"])
+        r = live["done"] / elapsed
+        eta = (total - done) / r if r > 0 else 0
+        rate = f"\nrate={r:.1f}/s eta={int(eta // 60)}m{int(eta % 60):02d}s"
+    return (
+        f"Broadcast #{bc['id']} {bc['status'].upper()} ✅\n"
+        f"progress={done}/{total} ({pct:.1f}%)\n"
+        f"sent={bc['sent']} failed={bc['failed']} blocked={bc['blocked']}"
+        + rate
+    )
+
+
+async def _report(bot, bc: Dict[str, Any]):
+    if not bc.get("admin_chat_id") or not bc.get("progress_msg_id"):
+        return
+    try:
+        await bot.edit_message_text(format_progress(bc), chat_id=bc["admin_chat_id"], message_id=bc["progress_msg_id"])
+    except (BadRequest, RetryAfter, NetworkError):
+        pass  # "message is not modified", throttled edits, ... progress is best-effort
+
+
+async def run(bot, bc_id: int, limiter: Optional[RateLimiter] = None, batch: int = BROADCAST_BATCH, concurrency: int = BROADCAST_CONCURRENCY):
+    """
+    Streams chat_ids in keyset pages and checkpoints the cursor after each
+    page, so a restart resends at most one page. An unexpected error marks
+    the broadcast failed (cursor kept) instead of leaving it "running".
+    """
+    bc = bot_db.get_broadcast(bc_id)
+    if not bc or bc["status"] != "running":
+        return
+    try:
+        await _run(bot, bc, limiter, batch, concurrency)
+    except Exception:
+        log.exception("broadcast #%s failed", bc_id)
+        bc["status"] = "failed"
+        try:
+            bot_db.update_broadcast(bc_id, status="failed")
+        except Exception:
+            log.exception("broadcast #%s: could not record the failure", bc_id)
+        await _report(bot, bc)
+    finally:
+        _live.pop(bc_id, None)
+
+
+async def _run(bot, bc: Dict[str, Any], limiter: Optional[RateLimiter], batch: int, concurrency: int):
+    bc_id = bc["id"]
+    rate = min(BROADCAST_RATE, SEND_RATE_PER_BOT * (1 - REPLY_HEADROOM)) if SEND_RATE_PER_BOT > 0 else BROADCAST_RATE
+    limiter = limiter or RateLimiter(rate, burst=max(1, concurrency))
+    live = _live[bc_id] = {"started": time.time(), "done": 0}
+    last_report = 0.0
+
+    while True:
+        ids = bot_db.iter_chat_ids(bc["cursor"], batch)
+        if not ids:
+            break
+        res = await _send_batch(bot, limiter, ids, bc["text"], concurrency)
+
+        bc["cursor"] = ids[-1]
+        bc["sent"] += res["sent"]
+        bc["failed"] += res["failed"]
+        bc["blocked"] += res["blocked"]
+        live["done"] += len(ids)
+        bot_db.update_broadcast(bc_id, cursor=bc["cursor"], sent=bc["sent"], failed=bc["failed"], blocked=bc["blocked"])
+
+        if time.time() - last_report >= PROGRESS_EVERY_S:
+            last_report = time.time()
+            await _report(bot, bc)
+
+    bc["status"] = "done"
+    bot_db.update_broadcast(bc_id, status="done")
+    await _report(bot, bc)
+
+
+def start(bot, bc_id: int, **kw) -> asyncio.Task:
+    task = asyncio.get_running_loop().create_task(run(bot, bc_id, **kw), name=f"broadcast:{bc_id}")
+    _tasks[bc_id] = task
+    task.add_done_callback(lambda _t: _tasks.pop(bc_id, None))
+    return task
+
+
+def is_running() -> bool:
+    return any(not t.done() for t in _tasks.values())
+
+
+def resume_all(bot) -> int:
+    """Restart broadcasts that were still running when the process died."""
+    n = 0
+    for bc in bot_db.running_broadcasts():
+        if bc["id"] not in _tasks:
+            start(bot, bc["id"])
+            n += 1
+    return n
+
+
+def cancel(bc_id: int) -> bool:
+    bot_db.update_broadcast(bc_id, status="cancelled")
+    task = _tasks.get(bc_id)
+    if task:
+        task.cancel()
+        return True
+    return False
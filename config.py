@@ -1,4 +1,5 @@
 import os
+import socket
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -6,7 +7,170 @@ load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN", "").strip()
 ADMIN_ID = int(os.getenv("ADMIN_ID", "0").strip() or "0")
 
-if not BOT_TOKEN:
-    raise RuntimeError("BOT_TOKEN missing. Put it in .env")
-if not ADMIN_ID:
-    raise RuntimeError("ADMIN_ID missing. Put it in .env")
+
+def check_required():
+    """
+    Called from main() rather than at import, so tools and benchmarks
+    can import the bot modules without a real token.
+    (Skipped when a personas file provides the tokens.)
+    """
+    if not BOT_TOKEN:
+        raise RuntimeError("BOT_TOKEN missing. Put it in .env")
+    if not ADMIN_ID:
+        raise RuntimeError("ADMIN_ID missing. Put it in .env")
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, "").strip() or default)
+    except ValueError:
+        return float(default)
+
+
+# -------------------------
+# Maintenance (seconds between runs; 0 disables a job)
+# -------------------------
+MAINT_FLUSH_S = _env_float("MAINT_FLUSH_S", 30)
+MAINT_CHECKPOINT_S = _env_float("MAINT_CHECKPOINT_S", 300)
+MAINT_VACUUM_S = _env_float("MAINT_VACUUM_S", 3600)
+MAINT_PRUNE_S = _env_float("MAINT_PRUNE_S", 3600)
+MAINT_PAIRS_S = _env_float("MAINT_PAIRS_S", 1800)
+MAINT_ARCHIVE_S = _env_float("MAINT_ARCHIVE_S", 3600)
+MAINT_MIGRATE_S = _env_float("MAINT_MIGRATE_S", 600)
+MAINT_TRANSCRIPT_S = _env_float("MAINT_TRANSCRIPT_S", 120)
+
+MAINT_SLICE_MS = _env_float("MAINT_SLICE_MS", 4)     # max time per batch before yielding
+MAINT_BUDGET_S = _env_float("MAINT_BUDGET_S", 2)     # max total time per job run
+PRUNE_IDLE_DAYS = _env_float("PRUNE_IDLE_DAYS", 180)  # 0 = never prune
+ARCHIVE_IDLE_DAYS = _env_float("ARCHIVE_IDLE_DAYS", 30)  # idle chats move to the cold tier; 0 = never
+
+# -------------------------
+# Broadcast (Bot API allows ~30 msg/s overall)
+# -------------------------
+BROADCAST_RATE = _env_float("BROADCAST_RATE", 20)              # messages per second (capped at 80% of SEND_RATE_PER_BOT)
+BROADCAST_CONCURRENCY = int(_env_float("BROADCAST_CONCURRENCY", 8))
+BROADCAST_BATCH = int(_env_float("BROADCAST_BATCH", 500))      # chat_ids per keyset page / checkpoint
+
+# -------------------------
+# Conversation summaries (background, see summarizer.py)
+# -------------------------
+SUMMARY_EVERY_EVENTS = int(_env_float("SUMMARY_EVERY_EVENTS", 6))  # new events since last summary
+SUMMARY_EVERY_S = _env_float("SUMMARY_EVERY_S", 1800)              # or this long since last summary
+SUMMARY_QUEUE_MAX = int(_env_float("SUMMARY_QUEUE_MAX", 256))      # full queue -> retry on next event
+SUMMARY_WORKERS = int(_env_float("SUMMARY_WORKERS", 2))
+SUMMARY_POOL = os.getenv("SUMMARY_POOL", "thread").strip().lower()  # thread | process
+
+# -------------------------
+# Personas: several bots in one process (see personas.py)
+# -------------------------
+PERSONAS_FILE = os.getenv("PERSONAS_FILE", "personas.json").strip()
+SEND_RATE_PER_BOT = _env_float("SEND_RATE_PER_BOT", 25)   # outbound send*/edit* calls per second, per bot
+SEND_RATE_GLOBAL = _env_float("SEND_RATE_GLOBAL", 0)      # across all bots in the process; 0 = no cap
+
+# -------------------------
+# Bot API transport (see transport.py)
+# -------------------------
+HTTP_VERSION = os.getenv("HTTP_VERSION", "1.1").strip()            # "1.1" | "2" (needs python-telegram-bot[http2])
+HTTP_POOL_SIZE = int(_env_float("HTTP_POOL_SIZE", 16))             # connections for send*/edit*/... calls, per bot (see bench_transport.py)
+HTTP_UPDATES_POOL_SIZE = int(_env_float("HTTP_UPDATES_POOL_SIZE", 1))  # getUpdates has its own client
+HTTP_KEEPALIVE_S = _env_float("HTTP_KEEPALIVE_S", 30)              # idle connections are closed after this
+HTTP_CONNECT_TIMEOUT_S = _env_float("HTTP_CONNECT_TIMEOUT_S", 5)
+HTTP_READ_TIMEOUT_S = _env_float("HTTP_READ_TIMEOUT_S", 5)
+HTTP_WRITE_TIMEOUT_S = _env_float("HTTP_WRITE_TIMEOUT_S", 5)
+HTTP_POOL_TIMEOUT_S = _env_float("HTTP_POOL_TIMEOUT_S", 3)         # waiting for a free connection
+HTTP_TRACE = os.getenv("HTTP_TRACE", "1").strip().lower() not in ("0", "false", "no", "off")
+
+# -------------------------
+# Restarts (see outbox.py)
+# -------------------------
+OUTBOX_MAX_AGE_S = _env_float("OUTBOX_MAX_AGE_S", 900)   # queued replies older than this are dropped, not sent
+
+# -------------------------
+# Replicas (see leases.py)
+# -------------------------
+REPLICA_ID = os.getenv("REPLICA_ID", "").strip() or f"{socket.gethostname()}-{os.getpid()}"
+LEASE_STORE = os.getenv("LEASE_STORE", "off").strip().lower()     # off | sqlite | redis
+LEASE_SQLITE_PATH = os.getenv("LEASE_SQLITE_PATH", "leases.db").strip()
+LEASE_REDIS_URL = os.getenv("LEASE_REDIS_URL", "redis://127.0.0.1:6379/0").strip()
+LEASE_TTL_S = _env_float("LEASE_TTL_S", 15)     # renewed every ttl/3 while a reply is pending
+LEASE_WAIT_S = _env_float("LEASE_WAIT_S", 10)   # give up on a chat another replica holds this long
+# updates handled concurrently in one process (0 = one at a time); state
+# writes are compare-and-swap, so no per-chat lock is needed
+CONCURRENT_UPDATES = int(_env_float("CONCURRENT_UPDATES", 0))
+
+# -------------------------
+# Load shedding (see load_shed.py)
+# -------------------------
+def _env_steps(name: str, default: str):
+    try:
+        return tuple(float(x) for x in (os.getenv(name, "").strip() or default).split(","))
+    except ValueError:
+        return tuple(float(x) for x in default.split(","))
+
+
+SHED_ENABLED = _env_float("SHED_ENABLED", 1) > 0
+# thresholds for levels 1..5 (fast, no_typing, lean, shed_low, shed); the worst signal wins
+SHED_DEPTH_STEPS = _env_steps("SHED_DEPTH_STEPS", "25,50,100,200,400")     # updates queued + in flight
+SHED_LAG_STEPS_MS = _env_steps("SHED_LAG_STEPS_MS", "50,100,200,400,800")  # event-loop lag
+SHED_AGE_STEPS_S = _env_steps("SHED_AGE_STEPS_S", "1,2,3,5,10")           # time since the update arrived, when picked up
+SHED_COOLDOWN_S = _env_float("SHED_COOLDOWN_S", 5)                          # calm time per step down
+SHED_MAX_AGE_S = _env_float("SHED_MAX_AGE_S", 3)   # shed_low: private messages older than this are dropped
+
+# -------------------------
+# Group chats (see group_mode.py)
+# -------------------------
+# a group message is handled only if it mentions the bot, replies to it,
+# contains one of these words, or wins the sampling roll
+GROUP_KEYWORDS = [w.strip().lower() for w in os.getenv("GROUP_KEYWORDS", "ellena").split(",") if w.strip()]
+GROUP_SAMPLE_RATE = _env_float("GROUP_SAMPLE_RATE", 0.0)   # 0..1 of the remaining messages
+GROUP_MOOD_ALPHA = _env_float("GROUP_MOOD_ALPHA", 0.2)     # weight of each member in the group mood
+
+# -------------------------
+# Transcript (see transcript.py)
+# -------------------------
+TRANSCRIPT_KEEP_TURNS = int(_env_float("TRANSCRIPT_KEEP_TURNS", 500))       # per chat ring, both sides
+TRANSCRIPT_HOT_TURNS = int(_env_float("TRANSCRIPT_HOT_TURNS", 40))          # newest turns kept one row each
+TRANSCRIPT_SEGMENT_TURNS = int(_env_float("TRANSCRIPT_SEGMENT_TURNS", 64))  # older turns packed this many per row
+TRANSCRIPT_MAX_CHARS = int(_env_float("TRANSCRIPT_MAX_CHARS", 2000))        # longer messages are cut
+TRANSCRIPT_CONTEXT_TURNS = int(_env_float("TRANSCRIPT_CONTEXT_TURNS", 40))  # turns checked for repeated replies
+
+# -------------------------
+# Profiling (see profiler.py, /cpuprof /memprof)
+# -------------------------
+PROF_DEFAULT_S = _env_float("PROF_DEFAULT_S", 30)           # window when the command gives none
+PROF_MAX_S = _env_float("PROF_MAX_S", 300)                  # longest CPU window
+PROF_MEM_MAX_S = _env_float("PROF_MEM_MAX_S", 120)          # longest tracemalloc window (slows allocations)
+PROF_INTERVAL_MS = _env_float("PROF_INTERVAL_MS", 10)       # CPU sampling period
+PROF_MAX_OVERHEAD = _env_float("PROF_MAX_OVERHEAD", 0.02)   # sampler backs off above this share of wall time
+PROF_MEM_FRAMES = int(_env_float("PROF_MEM_FRAMES", 1))     # traceback depth per allocation (>1 costs more)
+PROF_SHED_LEVEL = int(_env_float("PROF_SHED_LEVEL", 3))     # a profile ends early at this load_shed level ("lean")
+PROF_TOP = int(_env_float("PROF_TOP", 15))                  # rows per table in the chat summary
+
+# -------------------------
+# Analysis cache (see analysis_cache.py)
+# -------------------------
+ANALYSIS_CACHE_SIZE = int(_env_float("ANALYSIS_CACHE_SIZE", 4096))    # distinct texts; 0 = off
+ANALYSIS_CACHE_MAX_LEN = int(_env_float("ANALYSIS_CACHE_MAX_LEN", 32))  # longer texts aren't cached
+
+# -------------------------
+# Topic tracking (see topics.py)
+# -------------------------
+TOPIC_HALF_LIFE_S = _env_float("TOPIC_HALF_LIFE_S", 3 * 86400)  # per-chat topic weights fade
+TOPIC_TOP_K = int(_env_float("TOPIC_TOP_K", 8))                   # topics kept per chat
+TOPIC_CACHE_MAX = int(_env_float("TOPIC_CACHE_MAX", 20000))       # chats kept in memory
+
+# -------------------------
+# Lexicons
+# -------------------------
+# one <category>.txt wordlist per safety category
+SAFETY_LEXICON_DIR = os.getenv("SAFETY_LEXICON_DIR", "").strip() or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "lexicon", "safety"
+)
+# weighted terms/bigrams -> mood deltas, tension, intent (emotion_engine)
+EMOTION_LEXICON_PATH = os.getenv("EMOTION_LEXICON_PATH", "").strip() or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "lexicon", "emotion.tsv"
+)
+# "topic: keyword, keyword, ..." per line (topics.py)
+TOPIC_LEXICON_PATH = os.getenv("TOPIC_LEXICON_PATH", "").strip() or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "lexicon", "topics.txt"
+)
@@ -3,12 +3,15 @@ import asyncio
 import random
 import re
 
+# global multiplier (benchmarks / load tests set 0 to skip the sleep)
+DELAY_SCALE = 1.0
+
 def _emoji_count(s: str) -> int:
     return len(re.findall(r"[\U0001F300-\U0001FAFF]", s or ""))
 
-async def human_delay(user_text: str, reply_text: str = "", pace: str = "normal"):
+def delay_for(user_text: str, reply_text: str = "", pace: str = "normal", scale: float = 1.0) -> float:
     """
-    Human-ish delay based on:
+    Seconds to wait before replying; human-ish, based on:
     - user message length
     - reply length
     - emojis
@@ -19,6 +22,8 @@ async def human_delay(user_text: str, reply_text: str = "", pace: str = "normal"
       - "fast": quicker replies (joy/playful)
       - "normal": default
       - "slow": measured replies (sad/tension/thoughtful)
+
+    scale: extra multiplier (load shedding shrinks delays under backpressure)
     """
     u = user_text or ""
     r = reply_text or ""
@@ -47,5 +52,10 @@ async def human_delay(user_text: str, reply_text: str = "", pace: str = "normal"
         delay *= 1.35
 
     # clamp
-    delay = max(0.25, min(delay, 7.5))
-    await asyncio.sleep(delay)
+    return max(0.25, min(delay, 7.5)) * DELAY_SCALE * scale
+
+
+async def human_delay(user_text: str, reply_text: str = "", pace: str = "normal", scale: float = 1.0):
+    delay = delay_for(user_text, reply_text, pace, scale)
+    if delay > 0:
+        await asyncio.sleep(delay)
@@ -1,12 +1,12 @@
 # emotion_engine.py
 import re
+import math
 import time
-from typing import Dict, Any
+import threading
+from array import array
+from typing import Dict, Any, List, Iterable, Optional, Tuple
 
-SAD_WORDS = {"sad", "tired", "lonely", "depressed", "cry", "hurt", "stress", "stressed", "down", "broken"}
-ANGRY_WORDS = {"angry", "mad", "annoyed", "pissed", "hate"}
-SWEET_WORDS = {"miss", "missed", "love", "baby", "babe", "sweet", "honey", "darling", "cute"}
-ANX_WORDS = {"anxious", "anxiety", "worried", "scared", "panic", "overthinking"}
+from config import EMOTION_LEXICON_PATH
 
 def _clamp01(x: float) -> float:
     return max(0.0, min(1.0, x))
@@ -24,44 +24,222 @@ def _default_mood() -> Dict[str, float]:
         "jealousy": 0.00,
     }
 
+# fixed column order for array/batch paths
+MOOD_KEYS = tuple(_default_mood().keys())
+
+# mood drifts halfway back to baseline every 6h of silence
+MOOD_HALF_LIFE_S = 6 * 3600.0
+
+def decay_mood(mood: Dict[str, float], elapsed_s: float, half_life_s: float = MOOD_HALF_LIFE_S) -> Dict[str, float]:
+    """
+    Closed-form exponential decay toward _default_mood() over elapsed seconds.
+    Same result as decaying step by step, without touching the row in between.
+    """
+    base = _default_mood()
+    if elapsed_s <= 0 or half_life_s <= 0:
+        return {k: _clamp01(float(mood.get(k, base[k]))) for k in base}
+
+    keep = math.pow(0.5, elapsed_s / half_life_s)
+    return {k: _clamp01(base[k] + (float(mood.get(k, base[k])) - base[k]) * keep) for k in base}
+
+def apply_time_decay(state: Dict[str, Any], now: float = None) -> Dict[str, Any]:
+    """
+    Lazy decay: call when a chat's state is loaded.
+    Uses state["mood_ts"] (last mood update) so idle chats never need a cron.
+    """
+    mood = state.get("mood_vector")
+    last = float(state.get("mood_ts") or 0.0)
+    if mood is None or last <= 0 or state.get("mood_locked", False):
+        return state
+
+    now = time.time() if now is None else now
+    if now <= last:
+        return state
+
+    state["mood_vector"] = decay_mood(mood, now - last)
+    state["mood_ts"] = now
+    return state
+
+def decay_mood_batch(moods, elapsed_s, half_life_s: float = MOOD_HALF_LIFE_S):
+    """
+    Vectorized decay for analytics / bulk recompute.
+    moods: (n, len(MOOD_KEYS)) array in MOOD_KEYS column order
+    elapsed_s: scalar or (n,) seconds since each row's mood_ts
+    """
+    import numpy as np  # analytics-only dependency, keep it off the import path
+
+    m = np.asarray(moods, dtype=np.float64)
+    base = np.array([_default_mood()[k] for k in MOOD_KEYS], dtype=np.float64)
+    elapsed = np.maximum(np.asarray(elapsed_s, dtype=np.float64), 0.0)
+    keep = np.power(0.5, elapsed / half_life_s)
+    if keep.ndim == 1:
+        keep = keep[:, None]
+    return np.clip(base + (m - base) * keep, 0.0, 1.0)
+
+def moods_to_array(moods: List[Dict[str, float]]):
+    import numpy as np
+
+    base = _default_mood()
+    return np.array(
+        [[float((m or base).get(k, base[k])) for k in MOOD_KEYS] for m in moods],
+        dtype=np.float64,
+    ).reshape(len(moods), len(MOOD_KEYS))
+
+def array_to_moods(arr) -> List[Dict[str, float]]:
+    return [{k: float(v) for k, v in zip(MOOD_KEYS, row)} for row in arr]
+
+# -------------------------
+# Weighted lexicon (lexicon/emotion.tsv)
+# -------------------------
+INTENTS = ("affection", "support", "tension")  # tie order: earlier wins
+BASE_TENSION = 0.15
+MAX_DELTA = 0.45  # per-dimension saturation for one message
+
+# column layout of every score vector
+COLUMNS = MOOD_KEYS + ("tension",) + tuple(f"intent:{i}" for i in INTENTS)
+_COL = {c: i for i, c in enumerate(COLUMNS)}
+_TENSION = _COL["tension"]
+_INTENT0 = _COL[f"intent:{INTENTS[0]}"]
+
+_TOKEN_RE = re.compile(r"[a-z']+")
+_STRETCH_RE = re.compile(r"(.)\1{2,}")
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN_RE.findall(_STRETCH_RE.sub(r"\1", (text or "").lower()))
+
+class EmotionIndex:
+    """
+    term -> sparse weight row, CSR style:
+      vocab[term] = row, weights of row r are cols/vals[ptr[r]:ptr[r+1]]
+    Flat typed arrays: thousands of terms cost a few hundred KB.
+    """
+    __slots__ = ("vocab", "ptr", "cols", "vals", "_dense")
+
+    def __init__(self, entries: Dict[str, Dict[str, float]]):
+        self.vocab: Dict[str, int] = {}
+        self.ptr = array("I", [0])
+        self.cols = array("B")
+        self.vals = array("f")
+        self._dense = None
+        for term, weights in entries.items():
+            self.vocab[term] = len(self.vocab)
+            for col, w in sorted(weights.items()):
+                if w:
+                    self.cols.append(_COL[col])
+                    self.vals.append(w)
+            self.ptr.append(len(self.cols))
+
+    def __len__(self) -> int:
+        return len(self.vocab)
+
+    def rows(self, text: str) -> List[int]:
+        """Matched rows for unigrams + bigrams, one per occurrence."""
+        vocab = self.vocab
+        toks = _tokens(text)
+        out = [vocab[t] for t in toks if t in vocab]
+        for i in range(len(toks) - 1):
+            r = vocab.get(toks[i] + " " + toks[i + 1])
+            if r is not None:
+                out.append(r)
+        return out
+
+    def score(self, text: str) -> List[float]:
+        """Sparse dot product: sum of matched rows, len(COLUMNS) floats."""
+        acc = [0.0] * len(COLUMNS)
+        ptr, cols, vals = self.ptr, self.cols, self.vals
+        for r in self.rows(text):
+            for j in range(ptr[r], ptr[r + 1]):
+                acc[cols[j]] += vals[j]
+        return acc
+
+    def dense(self):
+        """(len(vocab), len(COLUMNS)) float32 weight matrix (batch / recalibration)."""
+        if self._dense is None:
+            import numpy as np
+
+            w = np.zeros((len(self.vocab), len(COLUMNS)), dtype=np.float32)
+            ptr = np.frombuffer(self.ptr, dtype=np.uint32).astype(np.int64)
+            row_of = np.repeat(np.arange(len(self.vocab)), np.diff(ptr))
+            w[row_of, np.frombuffer(self.cols, dtype=np.uint8)] = np.frombuffer(self.vals, dtype=np.float32)
+            self._dense = w
+        return self._dense
+
+def parse_lexicon(lines: Iterable[str]) -> Dict[str, Dict[str, float]]:
+    entries: Dict[str, Dict[str, float]] = {}
+    for n, line in enumerate(lines, 1):
+        line = line.split("#", 1)[0].rstrip()
+        if not line.strip():
+            continue
+        term, _, spec = line.partition("\t")
+        term = " ".join(_tokens(term))
+        if not term or not spec.strip():
+            continue
+        weights = entries.setdefault(term, {})
+        for kv in spec.split():
+            key, _, val = kv.partition("=")
+            if key not in _COL:
+                raise ValueError(f"emotion lexicon line {n}: unknown key {key!r}")
+            weights[key] = weights.get(key, 0.0) + float(val)
+    return entries
+
+_lex_lock = threading.Lock()
+_index: Optional[EmotionIndex] = None
+lexicon_version = 0  # bumps on (re)load (cache invalidation)
+
+def load_lexicon(path: str = None) -> EmotionIndex:
+    global _index, lexicon_version
+    with open(path or EMOTION_LEXICON_PATH, encoding="utf-8") as f:
+        idx = EmotionIndex(parse_lexicon(f))
+    with _lex_lock:
+        _index = idx
+        lexicon_version += 1
+    return idx
+
+def get_index() -> EmotionIndex:
+    if _index is None:
+        load_lexicon()
+    return _index
+
+def _intent_from_scores(scores) -> Tuple[Optional[str], float]:
+    """
+    Best intent and a 0..1 confidence: its share of all intent mass,
+    times how much evidence there is (1 - e^-total).
+    """
+    vals = [max(0.0, float(scores[_INTENT0 + i])) for i in range(len(INTENTS))]
+    total = sum(vals)
+    if total <= 0:
+        return None, 0.0
+    best = max(range(len(INTENTS)), key=lambda i: (vals[i], -i))
+    return INTENTS[best], (vals[best] / total) * (1.0 - math.exp(-total))
+
+def score_batch(texts: List[str]):
+    """
+    Scores many messages at once for offline recalibration.
+    Returns an (n, len(COLUMNS)) float32 array of raw (unsaturated) scores.
+    """
+    import numpy as np
+
+    idx = get_index()
+    doc, rows = [], []
+    for i, t in enumerate(texts):
+        r = idx.rows(t)
+        doc.extend([i] * len(r))
+        rows.extend(r)
+    out = np.zeros((len(texts), len(COLUMNS)), dtype=np.float32)
+    if rows:
+        np.add.at(out, np.asarray(doc, dtype=np.int64), idx.dense()[np.asarray(rows, dtype=np.int64)])
+    return out
+
 def infer_emotion(user_text: str, state: Dict[str, Any]) -> Dict[str, Any]:
     raw = (user_text or "").strip()
-    t = raw.lower()
-    words = set(re.findall(r"[a-z']+", t))
-
-    # Intent + tension (simple heuristic; swap to LLM later if you want)
-    intent = "info" if "?" in raw else "banter"
-    tension = 0.15
-
-    delta = {k: 0.0 for k in _default_mood().keys()}
-
-    if words & SAD_WORDS:
-        intent = "support"
-        tension = 0.25
-        delta["warmth"] += 0.20
-        delta["vulnerability"] += 0.15
-        delta["playful"] -= 0.10
-        delta["calm"] += 0.05
-
-    if words & ANGRY_WORDS:
-        intent = "tension"
-        tension = 0.70
-        delta["irritation"] += 0.25
-        delta["calm"] -= 0.20
-        delta["playful"] -= 0.15
-
-    if words & ANX_WORDS:
-        intent = "support"
-        tension = max(tension, 0.45)
-        delta["anxiety"] += 0.20
-        delta["calm"] -= 0.10
-        delta["warmth"] += 0.10
-
-    if words & SWEET_WORDS:
-        intent = "affection"
-        tension = min(tension, 0.20)
-        delta["warmth"] += 0.15
-        delta["playful"] += 0.10
+    scores = get_index().score(raw)
+
+    delta = {k: max(-MAX_DELTA, min(MAX_DELTA, scores[i])) for i, k in enumerate(MOOD_KEYS)}
+    tension = _clamp01(BASE_TENSION + scores[_TENSION])
+
+    intent, intent_conf = _intent_from_scores(scores)
+    if intent is None:
+        intent = "info" if "?" in raw else "banter"
 
     # Energy hint (affects speed + emoji budget)
     energy = 0.45 + min(0.25, raw.count("!") * 0.06) + (0.10 if len(raw) <= 7 else 0.0)
@@ -81,6 +259,7 @@ def infer_emotion(user_text: str, state: Dict[str, Any]) -> Dict[str, Any]:
 
     return {
         "intent": intent,
+        "intent_conf": intent_conf,
         "tension": tension,
         "energy": energy,
         "delta": delta,
@@ -112,11 +291,7 @@ def update_mood_vector(state: Dict[str, Any], signal: Dict[str, Any], safety: Di
         target = _clamp01(v + float(delta.get(k, 0.0)))
         mood[k] = _clamp01((1.0 - alpha) * v + alpha * target)
 
-    # Decay toward baseline slowly
-    base = _default_mood()
-    decay = 0.02  # per message; can be time-based later
-    for k in mood.keys():
-        mood[k] = _clamp01(mood[k] * (1.0 - decay) + base[k] * decay)
+    # Decay toward baseline is time-based: see apply_time_decay (runs on load)
 
     # Optional: disable certain emotions
     disabled = set(state.get("disabled_emotions", []) or [])
@@ -124,4 +299,5 @@ def update_mood_vector(state: Dict[str, Any], signal: Dict[str, Any], safety: Di
         mood["jealousy"] = 0.0
 
     state["mood_vector"] = mood
+    state["mood_ts"] = float(signal.get("ts") or time.time())
     return state
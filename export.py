@@ -0,0 +1,221 @@
+# export.py
+"""
+Streaming export for offline analysis.
+
+  python export.py users|pairs|events [--format jsonl|csv|columnar] [--out FILE|-] [--gzip] [--ns NS]
+
+Rows are read with a cursor and written as they arrive (constant memory).
+"columnar" writes one JSON row group per chunk: {"rows": n, "columns": {...}}
+after a schema header line, i.e. Parquet-style column blocks in plain JSON.
+ns limits the tables in SCOPED (pairs) to one persona's namespace ("" =
+the default persona). Users and events aren't split by persona.
+"""
+import argparse
+import csv
+import gzip
+import heapq
+import io
+import json
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Tuple
+
+import bot_db
+import memory
+from emotion_engine import MOOD_KEYS
+
+FORMATS = ("jsonl", "csv", "columnar")
+CHUNK = 1000
+
+USER_COLUMNS = [
+    "chat_id", "tier", "username", "first_seen", "last_seen", "interaction_count",
+    "relationship", "mode", "last_mode", "flirt", "mood_locked", "teach_on",
+    "negative_loop_score", "emotional_sensitivity", "disabled_emotions", "mood_ts",
+] + [f"mood_{k}" for k in MOOD_KEYS]
+
+PAIR_COLUMNS = ["id", "key", "response", "created_at"]
+EVENT_COLUMNS = ["chat_id", "ts", "label", "intent", "outcome", "note"]
+
+
+def _state_fields(state_json: str) -> Dict[str, Any]:
+    try:
+        st = json.loads(state_json or "{}")
+    except Exception:
+        st = {}
+    if not isinstance(st, dict):
+        st = {}
+    mood = st.get("mood_vector") or {}
+    out = {
+        "relationship": st.get("relationship"),
+        "mode": st.get("mode"),
+        "last_mode": st.get("last_mode"),
+        "flirt": st.get("flirt"),
+        "mood_locked": st.get("mood_locked"),
+        "teach_on": st.get("teach_on"),
+        "negative_loop_score": st.get("negative_loop_score"),
+        "emotional_sensitivity": st.get("emotional_sensitivity"),
+        "disabled_emotions": ",".join(st.get("disabled_emotions") or []),
+        "mood_ts": st.get("mood_ts"),
+    }
+    for k in MOOD_KEYS:
+        out[f"mood_{k}"] = mood.get(k) if isinstance(mood, dict) else None
+    return out
+
+
+def _iter_tier(conn, tier: str, chunk: int) -> Iterator[Dict[str, Any]]:
+    if tier == "hot":
+        sql = "SELECT chat_id, username, first_seen, last_seen, interaction_count, state_json FROM users ORDER BY chat_id"
+    else:
+        sql = "SELECT chat_id, username, first_seen, last_seen, interaction_count, codec, state_z FROM users_cold ORDER BY chat_id"
+    cur = conn.execute(sql)
+    while True:
+        rows = cur.fetchmany(chunk)
+        if not rows:
+            break
+        for r in rows:
+            row = {k: r[k] for k in ("chat_id", "username", "first_seen", "last_seen", "interaction_count")}
+            row["tier"] = tier
+            state_json = r["state_json"] if tier == "hot" else bot_db.decompress_state(r["state_z"], r["codec"])
+            row.update(_state_fields(state_json))
+            yield row
+
+
+def iter_users(chunk: int = CHUNK) -> Iterator[Dict[str, Any]]:
+    # both tiers, merged in chat_id order (two cursors, still streaming)
+    hot, cold = bot_db.reader(), bot_db.reader()
+    try:
+        yield from heapq.merge(
+            _iter_tier(hot, "hot", chunk), _iter_tier(cold, "cold", chunk), key=lambda row: row["chat_id"]
+        )
+    finally:
+        hot.close()
+        cold.close()
+
+
+def iter_pairs(chunk: int = CHUNK, ns: str = None) -> Iterator[Dict[str, Any]]:
+    conn = bot_db.reader()
+    try:
+        if ns is None:
+            cur = conn.execute("SELECT id, key, response, created_at FROM learned_pairs ORDER BY id")
+        else:
+            cur = conn.execute(
+                "SELECT id, key, response, created_at FROM learned_pairs WHERE ns=? ORDER BY id", (ns,)
+            )
+        while True:
+            rows = cur.fetchmany(chunk)
+            if not rows:
+                break
+            for r in rows:
+                yield {k: r[k] for k in PAIR_COLUMNS}
+    finally:
+        conn.close()
+
+
+def iter_events(chunk: int = CHUNK) -> Iterator[Dict[str, Any]]:
+    conn = memory.reader()
+    try:
+        cur = conn.execute("SELECT chat_id, user_state FROM users ORDER BY chat_id")
+        while True:
+            rows = cur.fetchmany(chunk)
+            if not rows:
+                break
+            for r in rows:
+                st = memory._safe_json_load(r["user_state"], {})
+                for ev in (st.get("recent_events") or []) if isinstance(st, dict) else []:
+                    if isinstance(ev, dict):
+                        yield {"chat_id": r["chat_id"], **{k: ev.get(k) for k in EVENT_COLUMNS[1:]}}
+    finally:
+        conn.close()
+
+
+TABLES = {
+    "users": (USER_COLUMNS, iter_users),
+    "pairs": (PAIR_COLUMNS, iter_pairs),
+    "events": (EVENT_COLUMNS, iter_events),
+}
+SCOPED = ("pairs",)   # tables with a per-persona namespace
+
+
+def write(table: str, fmt: str, out: io.TextIOBase, chunk: int = CHUNK, ns: str = None) -> int:
+    """
+    Streams one table into `out`. Returns rows written.
+    """
+    columns, it = TABLES[table]
+    rows = (lambda c: it(c, ns)) if table in SCOPED and ns is not None else it
+    n = 0
+
+    if fmt == "jsonl":
+        for row in rows(chunk):
+            out.write(json.dumps(row, ensure_ascii=False))
+            out.write("\n")
+            n += 1
+
+    elif fmt == "csv":
+        w = csv.DictWriter(out, fieldnames=columns, extrasaction="ignore")
+        w.writeheader()
+        for row in rows(chunk):
+            w.writerow(row)
+            n += 1
+
+    elif fmt == "columnar":
+        out.write(json.dumps({"format": "ellena-columnar/1", "table": table, "schema": columns}) + "\n")
+        group: Dict[str, List[Any]] = {c: [] for c in columns}
+        g = 0
+        for row in rows(chunk):
+            for c in columns:
+                group[c].append(row.get(c))
+            g += 1
+            n += 1
+            if g >= chunk:
+                out.write(json.dumps({"rows": g, "columns": group}, ensure_ascii=False) + "\n")
+                group = {c: [] for c in columns}
+                g = 0
+        if g:
+            out.write(json.dumps({"rows": g, "columns": group}, ensure_ascii=False) + "\n")
+
+    else:
+        raise ValueError(f"unknown format {fmt!r}")
+
+    return n
+
+
+def export_file(table: str, fmt: str, path: str, compress: bool = False, chunk: int = CHUNK,
+                ns: str = None) -> Tuple[int, float]:
+    """
+    Writes to `path` (gzip if compress). Returns (rows, seconds).
+    Safe to call from a worker thread: uses its own DB connections.
+    """
+    t0 = time.perf_counter()
+    opener = gzip.open if compress else open
+    with opener(path, "wt", encoding="utf-8", newline="") as f:
+        n = write(table, fmt, f, chunk, ns)
+    return n, time.perf_counter() - t0
+
+
+def filename(table: str, fmt: str, compress: bool) -> str:
+    ext = {"jsonl": "jsonl", "csv": "csv", "columnar": "col.jsonl"}[fmt]
+    return f"{table}-{time.strftime('%Y%m%d-%H%M%S')}.{ext}" + (".gz" if compress else "")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("table", choices=sorted(TABLES))
+    ap.add_argument("--format", choices=FORMATS, default="jsonl")
+    ap.add_argument("--out", default="", help="file path, '-' for stdout (default: auto-named file)")
+    ap.add_argument("--gzip", action="store_true")
+    ap.add_argument("--chunk", type=int, default=CHUNK)
+    ap.add_argument("--ns", default=None, help="pairs: one persona's namespace only")
+    args = ap.parse_args()
+
+    if args.out == "-":
+        n = write(args.table, args.format, sys.stdout, args.chunk, args.ns)
+        print(f"{n} rows", file=sys.stderr)
+        return
+
+    path = args.out or filename(args.table, args.format, args.gzip)
+    n, secs = export_file(args.table, args.format, path, args.gzip, args.chunk, args.ns)
+    print(f"{path}: {n} rows in {secs:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+# fake_bot_api.py
+"""
+Local stand-in for the Telegram Bot API (load testing, no token/network).
+
+- serves synthetic text updates over getUpdates at a target rate
+- answers sendMessage / sendChatAction / sendDocument / editMessageText / getMe ...
+- records every outbound call with a timestamp
+- optional faults: 429 + retry_after, added latency
+
+Point PTB at it with ApplicationBuilder().base_url(server.base_url).
+"""
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+BOT_USER = {
+    "id": 777000111,
+    "is_bot": True,
+    "first_name": "Ellena",
+    "username": "ellena_fake_bot",
+    "can_join_groups": True,
+    "can_read_all_group_messages": False,
+    "supports_inline_queries": False,
+}
+
+
+
+def bot_user(token: str = "") -> Dict[str, Any]:
+    """getMe for a token: like Telegram, the bot id is the token's numeric prefix."""
+    prefix = (token or "").split(":", 1)[0]
+    return dict(BOT_USER, id=int(prefix)) if prefix.isdigit() else dict(BOT_USER)
+
+
+SAMPLE_TEXTS = [
+    "hi", "hey", "lol", "ok", "hmm", "?", "how are you", "i missed you",
+    "i'm so tired today", "work was stressful", "what are you doing?",
+    "can i tell you something", "you're cute", "i'm angry at my boss",
+    "haha 😂😂", "good night", "did you eat?", "i feel lonely", "tell me a story",
+    "omg that's crazy!!", "bonjour", "hola que tal", "i'm anxious about tomorrow",
+]
+
+
+class FakeBotAPI:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        rate: float = 50.0,
+        chats: int = 200,
+        total: int = 0,
+        fault_429: float = 0.0,
+        retry_after: int = 1,
+        latency_ms: float = 0.0,
+        latency_jitter_ms: float = 0.0,
+        texts: Optional[List[str]] = None,
+        seed: int = 1234,
+        record: bool = True,
+    ):
+        self.host = host
+        self.port = port
+        self.rate = float(rate)            # synthetic updates per second (0 = none)
+        self.chats = max(1, int(chats))
+        self.total = int(total)            # stop after this many updates (0 = unlimited)
+        self.fault_429 = float(fault_429)  # probability a send* call gets 429
+        self.retry_after = int(retry_after)
+        self.latency_ms = float(latency_ms)
+        self.latency_jitter_ms = float(latency_jitter_ms)
+        self.texts = texts or SAMPLE_TEXTS
+        self._rnd = random.Random(seed)
+        self.record = record                # False: only count calls (1M-chat runs)
+
+        self.calls: List[Tuple[float, str, Any]] = []   # (ts, method, chat_id)
+        self.method_counts: Dict[str, int] = defaultdict(int)
+        self.replies: List[Tuple[int, float, float]] = []  # (chat_id, ts, latency_s) for matched sendMessage
+        self.errors_429 = 0
+        self.connections = 0                # TCP connections accepted (keep-alive reuse shows here)
+        self.generated = 0
+
+        self._updates: Deque[Dict[str, Any]] = deque()
+        self._next_update_id = 1
+        self._confirmed: Dict[str, int] = {}   # bot token -> offset (several bots may poll)
+        self._tokens: Dict[str, None] = {}      # tokens seen on getMe, in order
+        self._next_msg_id = 1
+        self._pending: Dict[int, Deque[float]] = defaultdict(deque)  # chat_id -> update timestamps
+        self._new_updates = asyncio.Event()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._gen_task: Optional[asyncio.Task] = None
+
+    # -------------------------
+    # lifecycle
+    # -------------------------
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/bot"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_conn, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        if self.rate > 0:
+            self._gen_task = asyncio.create_task(self._generate())
+
+    async def stop(self):
+        if self._gen_task:
+            self._gen_task.cancel()
+        self._new_updates.set()  # release pending long polls
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def stop_generating(self):
+        if self._gen_task:
+            self._gen_task.cancel()
+
+    # -------------------------
+    # synthetic traffic
+    # -------------------------
+    def push_text(self, chat_id: int, text: str, user_id: int = None, chat_type: str = "private",
+                  reply_to_bot: bool = False, expect_reply: bool = True):
+        """expect_reply=False: the bot should ignore it (group chatter), so no latency is tracked."""
+        uid = user_id or chat_id
+        now = time.time()
+        msg = {
+            "message_id": self._next_msg_id,
+            "date": int(now),
+            "chat": {"id": chat_id, "type": chat_type, "first_name": f"U{uid}"},
+            "from": {"id": uid, "is_bot": False, "first_name": f"U{uid}", "username": f"user{uid}"},
+            "text": text,
+        }
+        if chat_type != "private":
+            msg["chat"] = {"id": chat_id, "type": chat_type, "title": f"G{-chat_id}"}
+        if reply_to_bot:
+            msg["reply_to_message"] = {
+                "message_id": max(1, self._next_msg_id - 1),
+                "date": int(now),
+                "chat": msg["chat"],
+                "from": self._reply_bot(),
+                "text": "...",
+            }
+        self._updates.append({"update_id": self._next_update_id, "message": msg})
+        self._next_update_id += 1
+        self._next_msg_id += 1
+        if expect_reply:
+            self._pending[chat_id].append(now)
+        self.generated += 1
+        self._new_updates.set()
+
+    async def _generate(self):
+        interval = 1.0 / self.rate
+        start = time.perf_counter()
+        i = 0
+        while not self.total or i < self.total:
+            # spread chats so per-chat anti-spam doesn't eat the load
+            chat_id = 1000 + (i % self.chats)
+            self.push_text(chat_id, self._rnd.choice(self.texts))
+            i += 1
+            delay = start + i * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elif i % 64 == 0:
+                await asyncio.sleep(0)
+
+    # -------------------------
+    # HTTP plumbing (HTTP/1.1 keep-alive, just enough for httpx)
+    # -------------------------
+    async def _handle_conn(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode("latin-1").split("\r\n")
+                _method, path, _ver = lines[0].split(" ", 2)
+                headers = {}
+                for ln in lines[1:]:
+                    if ":" in ln:
+                        k, v = ln.split(":", 1)
+                        headers[k.strip().lower()] = v.strip()
+                body = b""
+                n = int(headers.get("content-length", "0") or 0)
+                if n:
+                    body = await reader.readexactly(n)
+
+                status, payload = await self._dispatch(path, headers.get("content-type", ""), body)
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                    f"Connection: keep-alive\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.LimitOverrunError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _parse_params(ctype: str, body: bytes) -> Dict[str, Any]:
+        if not body:
+            return {}
+        if ctype.startswith("application/json"):
+            return json.loads(body)
+        if ctype.startswith("multipart/form-data"):
+            params = {}
+            boundary = ctype.split("boundary=", 1)[-1].strip('"').encode()
+            for part in body.split(b"--" + boundary):
+                head, _, val = part.partition(b"\r\n\r\n")
+                if b'name="' not in head or b"filename=" in head:
+                    continue
+                name = head.split(b'name="', 1)[1].split(b'"', 1)[0].decode()
+                params[name] = val.rstrip(b"\r\n").decode("utf-8", "replace")
+            return params
+        return dict(parse_qsl(body.decode("utf-8"), keep_blank_values=True))
+
+    @staticmethod
+    def _val(v):
+        # PTB sends non-str params JSON-encoded inside the form
+        if isinstance(v, str):
+            try:
+                return json.loads(v)
+            except ValueError:
+                return v
+        return v
+
+    async def _dispatch(self, path: str, ctype: str, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        method = path.rstrip("/").rsplit("/", 1)[-1].split("?", 1)[0]
+        params = {
+            k: (v if k in ("text", "caption") else self._val(v))
+            for k, v in self._parse_params(ctype, body).items()
+        }
+        now = time.time()
+        chat_id = params.get("chat_id")
+        self.method_counts[method] += 1
+        if self.record:
+            self.calls.append((now, method, chat_id))
+
+        token = path.split("/bot", 1)[-1].split("/", 1)[0]
+        if method == "getUpdates":
+            return 200, {"ok": True, "result": await self._get_updates(params, token)}
+
+        if self.latency_ms or self.latency_jitter_ms:
+            await asyncio.sleep(max(0.0, self.latency_ms + self._rnd.uniform(-1, 1) * self.latency_jitter_ms) / 1000.0)
+
+        if method.startswith("send") and self.fault_429 and self._rnd.random() < self.fault_429:
+            self.errors_429 += 1
+            return 429, {
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }
+
+        if method == "getMe":
+            self._tokens.setdefault(token, None)
+            return 200, {"ok": True, "result": bot_user(token)}
+        if method in ("sendMessage", "sendDocument", "editMessageText"):
+            if method == "sendMessage" and chat_id is not None:
+                q = self._pending.get(int(chat_id))
+                if q:
+                    t = time.time()
+                    self.replies.append((int(chat_id), t, t - q.popleft()))
+            return 200, {"ok": True, "result": self._message(chat_id, params.get("text") or "", token)}
+        # sendChatAction, deleteWebhook, setMyCommands, close, ...
+        return 200, {"ok": True, "result": True}
+
+    def _reply_bot(self) -> Dict[str, Any]:
+        # reply_to_bot targets the first bot that asked getMe (single-bot tools)
+        return bot_user(next(iter(self._tokens), ""))
+
+    def _message(self, chat_id, text: str, token: str = "") -> Dict[str, Any]:
+        self._next_msg_id += 1
+        return {
+            "message_id": self._next_msg_id,
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id or 0), "type": "private"},
+            "from": bot_user(token),
+            "text": text,
+        }
+
+    async def _get_updates(self, params: Dict[str, Any], token: str = "") -> List[Dict[str, Any]]:
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+
+        # confirm (drop) everything below offset, like Telegram does; with
+        # several bots polling, every one of them sees every update
+        self._confirmed[token] = max(offset, self._confirmed.get(token, 0))
+        low = min(self._confirmed.values())
+        while self._updates and self._updates[0]["update_id"] < low:
+            self._updates.popleft()
+
+        if not (self._updates and self._updates[-1]["update_id"] >= offset) and timeout > 0:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        out = []
+        for u in self._updates:
+            if u["update_id"] >= offset:
+                out.append(u)
+                if len(out) >= limit:
+                    break
+        return out
+
+    # -------------------------
+    # reporting
+    # -------------------------
+    def calls_by_method(self) -> Dict[str, int]:
+        return dict(self.method_counts)
+
+    def latency_report(self) -> Dict[str, float]:
+        lat = sorted(l for _, _, l in self.replies)
+        if not lat:
+            return {"count": 0}
+
+        def pct(p: float) -> float:
+            return lat[min(len(lat) - 1, int(p * len(lat)))] * 1000.0
+
+        return {
+            "count": len(lat),
+            "p50_ms": pct(0.50),
+            "p90_ms": pct(0.90),
+            "p99_ms": pct(0.99),
+            "max_ms": lat[-1] * 1000.0,
+        }
@@ -0,0 +1,165 @@
+# fake_redis.py
+"""
+Tiny in-process Redis stand-in (RESP2 over TCP) for trying leases.py
+without a Redis server.
+
+  python fake_redis.py [--port 6379]
+
+Supports PING, AUTH, SELECT, GET, SET (NX/XX, PX/EX), DEL, PEXPIRE, PTTL
+and EVAL of the scripts leases.py sends. Keys expire lazily on access.
+"""
+import argparse
+import socketserver
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import leases
+
+
+class FakeRedis:
+    def __init__(self):
+        self._data: Dict[str, Tuple[str, Optional[float]]] = {}  # key -> (value, expires_at)
+        self._lock = threading.Lock()   # one command at a time, like the real thing
+        self.commands = 0
+
+    # --- storage ---
+    def _get(self, key: str) -> Optional[str]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, exp = item
+        if exp is not None and exp <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def _pexpire(self, key: str, ms: int) -> int:
+        if self._get(key) is None:
+            return 0
+        self._data[key] = (self._data[key][0], time.monotonic() + ms / 1000.0)
+        return 1
+
+    def _del(self, *keys: str) -> int:
+        n = 0
+        for k in keys:
+            if self._get(k) is not None:
+                del self._data[k]
+                n += 1
+        return n
+
+    # --- commands ---
+    def execute(self, args) -> Any:
+        with self._lock:
+            self.commands += 1
+            cmd = args[0].upper()
+            a = args[1:]
+            if cmd == "PING":
+                return "PONG"
+            if cmd in ("AUTH", "SELECT"):
+                return "OK"
+            if cmd == "GET":
+                return self._get(a[0])
+            if cmd == "SET":
+                return self._set(a)
+            if cmd == "DEL":
+                return self._del(*a)
+            if cmd == "PEXPIRE":
+                return self._pexpire(a[0], int(a[1]))
+            if cmd == "PTTL":
+                if self._get(a[0]) is None:
+                    return -2
+                exp = self._data[a[0]][1]
+                return -1 if exp is None else int((exp - time.monotonic()) * 1000)
+            if cmd == "EVAL":
+                return self._eval(a[0], int(a[1]), a[2:])
+            return Exception(f"ERR unknown command '{args[0]}'")
+
+    def _set(self, a) -> Any:
+        key, value, opts = a[0], a[1], [o.upper() for o in a[2:]]
+        exp = None
+        for flag, scale in (("PX", 0.001), ("EX", 1.0)):
+            if flag in opts:
+                exp = time.monotonic() + int(a[2 + opts.index(flag) + 1]) * scale
+        exists = self._get(key) is not None
+        if ("NX" in opts and exists) or ("XX" in opts and not exists):
+            return None
+        self._data[key] = (value, exp)
+        return "OK"
+
+    def _eval(self, script: str, numkeys: int, rest) -> Any:
+        keys, argv = rest[:numkeys], rest[numkeys:]
+        if script == leases.RENEW_SCRIPT:
+            return self._pexpire(keys[0], int(argv[1])) if self._get(keys[0]) == argv[0] else 0
+        if script == leases.RELEASE_SCRIPT:
+            return self._del(keys[0]) if self._get(keys[0]) == argv[0] else 0
+        return Exception("ERR script not supported by fake_redis")
+
+
+# -------------------------
+# RESP server
+# -------------------------
+def _encode(v: Any) -> bytes:
+    if v is None:
+        return b"$-1\r\n"
+    if isinstance(v, Exception):
+        return b"-" + str(v).encode() + b"\r\n"
+    if isinstance(v, int):
+        return b":%d\r\n" % v
+    if v in ("OK", "PONG"):
+        return b"+" + v.encode() + b"\r\n"
+    b = str(v).encode()
+    return b"$%d\r\n%s\r\n" % (len(b), b)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            if not line.startswith(b"*"):
+                continue
+            args = []
+            for _ in range(int(line[1:])):
+                n = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(n + 2)[:-2].decode())
+            self.wfile.write(_encode(self.server.redis.execute(args)))
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), _Handler)
+        self.redis = FakeRedis()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    def start(self) -> "FakeRedisServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=6379)
+    args = ap.parse_args()
+    srv = FakeRedisServer(args.host, args.port)
+    print(f"fake redis on {srv.url}")
+    srv.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# group_mode.py
+# Group chats: a cheap relevance pre-filter (no DB) and the split between
+# per-member state (group_members) and the shared group row (users).
+import random
+import re
+from collections import Counter
+from typing import Any, Dict, Optional
+
+from emotion_engine import MOOD_KEYS, _default_mood
+from config import GROUP_KEYWORDS, GROUP_SAMPLE_RATE, GROUP_MOOD_ALPHA
+
+GROUP_TYPES = {"group", "supergroup"}
+
+# per member: emotional continuity. Everything else (mode, flirt,
+# relationship, last_replies, ...) stays on the group row.
+MEMBER_FIELDS = ("mood_vector", "mood_ts", "negative_loop_score", "last_mode")
+
+_KEYWORD_RE = re.compile(r"\b(" + "|".join(map(re.escape, GROUP_KEYWORDS)) + r")\b", re.IGNORECASE) if GROUP_KEYWORDS else None
+
+_stats: Counter = Counter()   # seen / mention / reply / keyword / sampled / skipped
+
+
+def is_group(chat) -> bool:
+    return bool(chat and chat.type in GROUP_TYPES)
+
+
+def relevance(message, bot_id: int, bot_username: str) -> Optional[str]:
+    """
+    Why the bot should answer this group message, or None.
+    Pure in-memory checks: runs before any DB access.
+    """
+    _stats["seen"] += 1
+    reason = None
+    text = message.text or ""
+
+    reply_to = message.reply_to_message
+    if reply_to and reply_to.from_user and reply_to.from_user.id == bot_id:
+        reason = "reply"
+    elif bot_username and ("@" + bot_username.lower()) in text.lower():
+        reason = "mention"
+    elif any(e.type == "text_mention" and e.user and e.user.id == bot_id for e in (message.entities or ())):
+        reason = "mention"
+    elif _KEYWORD_RE is not None and _KEYWORD_RE.search(text):
+        reason = "keyword"
+    elif GROUP_SAMPLE_RATE > 0 and random.random() < GROUP_SAMPLE_RATE:
+        reason = "sampled"
+
+    _stats[reason or "skipped"] += 1
+    return reason
+
+
+def strip_mention(text: str, bot_username: str) -> str:
+    if not bot_username:
+        return text
+    return re.sub(r"@" + re.escape(bot_username) + r"\b", "", text, flags=re.IGNORECASE).strip() or text
+
+
+def member_view(group_state: Dict[str, Any], member_state: Dict[str, Any]) -> Dict[str, Any]:
+    """Group settings + this member's emotional fields, for the reply pipeline."""
+    view = dict(group_state)
+    for f in MEMBER_FIELDS:
+        view[f] = member_state.get(f)
+    return view
+
+
+def split(view: Dict[str, Any], group_state: Dict[str, Any], member_state: Dict[str, Any]):
+    """Writes the pipeline's results back: member fields to the member, the rest to the group."""
+    for f in MEMBER_FIELDS:
+        member_state[f] = view.get(f)
+    group_state["last_replies"] = view.get("last_replies", [])
+    mood = view.get("mood_vector")
+    if mood:
+        group_state["mood_vector"] = blend_mood(group_state.get("mood_vector"), mood)
+        group_state["mood_ts"] = view.get("mood_ts") or group_state.get("mood_ts", 0.0)
+
+
+def blend_mood(group_mood: Optional[Dict[str, float]], member_mood: Dict[str, float], alpha: float = GROUP_MOOD_ALPHA) -> Dict[str, float]:
+    """Group aggregate: exponential moving average over the members who talk."""
+    base = group_mood or _default_mood()
+    return {k: (1.0 - alpha) * float(base.get(k, 0.0)) + alpha * float(member_mood.get(k, base.get(k, 0.0))) for k in MOOD_KEYS}
+
+
+def stats() -> Dict[str, int]:
+    return dict(_stats)
@@ -0,0 +1,357 @@
+# leases.py
+# Per-chat leases so several replicas never process the same chat at once.
+# A replica takes a time-limited lease on chat_id before handling a message,
+# renews it while the (delayed) reply is pending, and releases it after.
+# Stores: "sqlite" (a file shared by replicas on one host/volume) and
+# "redis" (any RESP server; fake_redis.py is a local stand-in).
+#
+# Each hold has its own owner token (REPLICA_ID:n), so two tasks of one
+# replica (CONCURRENT_UPDATES, personas) contend like two replicas would
+# instead of sharing a lease. Store calls block (SQLite busy wait, Redis
+# socket), so they run on one worker thread, never on the event loop.
+import asyncio
+import itertools
+import logging
+import socket
+import sqlite3
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+from config import REPLICA_ID, LEASE_STORE, LEASE_SQLITE_PATH, LEASE_REDIS_URL, LEASE_TTL_S, LEASE_WAIT_S
+
+log = logging.getLogger(__name__)
+
+
+# -------------------------
+# Store interface
+# -------------------------
+class LeaseStore:
+    """acquire/renew/release are atomic per chat_id; ttl in seconds."""
+
+    def acquire(self, chat_id: int, owner: str, ttl: float) -> bool:
+        raise NotImplementedError
+
+    def renew(self, chat_id: int, owner: str, ttl: float) -> bool:
+        raise NotImplementedError
+
+    def release(self, chat_id: int, owner: str) -> bool:
+        raise NotImplementedError
+
+    def owner(self, chat_id: int) -> Optional[str]:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SQLiteLeaseStore(LeaseStore):
+    def __init__(self, path: str = LEASE_SQLITE_PATH):
+        self.path = path
+        # autocommit: every statement is its own (atomic) transaction
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5.0, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")  # leases are short-lived; no fsync per commit
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS leases (
+            chat_id INTEGER PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires REAL NOT NULL
+        )
+        """)
+
+    def acquire(self, chat_id: int, owner: str, ttl: float) -> bool:
+        now = time.time()
+        cur = self._conn.execute("""
+        INSERT INTO leases (chat_id, owner, expires) VALUES (?, ?, ?)
+        ON CONFLICT(chat_id) DO UPDATE SET owner=excluded.owner, expires=excluded.expires
+        WHERE leases.owner=excluded.owner OR leases.expires < ?
+        """, (chat_id, owner, now + ttl, now))
+        return cur.rowcount > 0
+
+    def renew(self, chat_id: int, owner: str, ttl: float) -> bool:
+        now = time.time()
+        cur = self._conn.execute(
+            "UPDATE leases SET expires=? WHERE chat_id=? AND owner=? AND expires >= ?",
+            (now + ttl, chat_id, owner, now),
+        )
+        return cur.rowcount > 0
+
+    def release(self, chat_id: int, owner: str) -> bool:
+        cur = self._conn.execute("DELETE FROM leases WHERE chat_id=? AND owner=?", (chat_id, owner))
+        return cur.rowcount > 0
+
+    def owner(self, chat_id: int) -> Optional[str]:
+        row = self._conn.execute(
+            "SELECT owner FROM leases WHERE chat_id=? AND expires >= ?", (chat_id, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def close(self):
+        self._conn.close()
+
+
+# compare-and-act scripts (only the owner may renew/release)
+RENEW_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) else return 0 end"
+RELEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisLeaseStore(LeaseStore):
+    """Minimal RESP2 client (no redis-py dependency): SET NX PX + two EVAL scripts."""
+
+    def __init__(self, url: str = LEASE_REDIS_URL, prefix: str = "ellena:lease:"):
+        u = urlparse(url)
+        self.host = u.hostname or "127.0.0.1"
+        self.port = u.port or 6379
+        self.db = int((u.path or "/0").lstrip("/") or 0)
+        self.password = u.password
+        self.prefix = prefix
+        self._sock: Optional[socket.socket] = None
+        self._buf = b""
+
+    # --- RESP ---
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=2.0)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._buf = b""
+        if self.password:
+            self._call("AUTH", self.password)
+        if self.db:
+            self._call("SELECT", self.db)
+
+    def _readline(self) -> bytes:
+        while b"\r\n" not in self._buf:
+            chunk = self._sock.recv(65536)
+            if not chunk:
+                raise ConnectionError("redis connection closed")
+            self._buf += chunk
+        line, self._buf = self._buf.split(b"\r\n", 1)
+        return line
+
+    def _readexact(self, n: int) -> bytes:
+        while len(self._buf) < n + 2:
+            chunk = self._sock.recv(65536)
+            if not chunk:
+                raise ConnectionError("redis connection closed")
+            self._buf += chunk
+        data, self._buf = self._buf[:n], self._buf[n + 2:]
+        return data
+
+    def _read(self) -> Any:
+        line = self._readline()
+        kind, rest = line[:1], line[1:]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RedisError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            n = int(rest)
+            return None if n < 0 else self._readexact(n).decode()
+        if kind == b"*":
+            n = int(rest)
+            return None if n < 0 else [self._read() for _ in range(n)]
+        raise RedisError(f"bad reply: {line!r}")
+
+    def _call(self, *args) -> Any:
+        out = [b"*%d\r\n" % len(args)]
+        for a in args:
+            b = a if isinstance(a, bytes) else str(a).encode()
+            out.append(b"$%d\r\n%s\r\n" % (len(b), b))
+        payload = b"".join(out)
+        for attempt in (0, 1):
+            try:
+                if self._sock is None:
+                    self._connect()
+                self._sock.sendall(payload)
+                return self._read()
+            except (OSError, ConnectionError):
+                self.close()
+                if attempt:
+                    raise
+
+    # --- leases ---
+    def _key(self, chat_id: int) -> str:
+        return f"{self.prefix}{chat_id}"
+
+    def acquire(self, chat_id: int, owner: str, ttl: float) -> bool:
+        ms = max(1, int(ttl * 1000))
+        if self._call("SET", self._key(chat_id), owner, "NX", "PX", ms) == "OK":
+            return True
+        return self.renew(chat_id, owner, ttl)  # already ours
+
+    def renew(self, chat_id: int, owner: str, ttl: float) -> bool:
+        return bool(self._call("EVAL", RENEW_SCRIPT, 1, self._key(chat_id), owner, max(1, int(ttl * 1000))))
+
+    def release(self, chat_id: int, owner: str) -> bool:
+        return bool(self._call("EVAL", RELEASE_SCRIPT, 1, self._key(chat_id), owner))
+
+    def owner(self, chat_id: int) -> Optional[str]:
+        return self._call("GET", self._key(chat_id))
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+
+
+STORES = {
+    "sqlite": SQLiteLeaseStore,
+    "redis": RedisLeaseStore,
+}
+
+
+# -------------------------
+# Replica side
+# -------------------------
+_store: Optional[LeaseStore] = None
+_held: Dict[int, str] = {}    # chat_id -> owner token of our hold
+_seq = itertools.count(1)
+_io: Optional[ThreadPoolExecutor] = None   # one thread: the stores' connections aren't shared across threads
+_stats: Counter = Counter()   # acquired / contended / waited_ms / timeouts / renewed / lost / released / errors
+
+
+def enabled() -> bool:
+    return LEASE_STORE in STORES
+
+
+def store() -> Optional[LeaseStore]:
+    global _store
+    if _store is None and enabled():
+        _store = STORES[LEASE_STORE]()
+    return _store
+
+
+def set_store(s: Optional[LeaseStore]):
+    """Swap the store (tools/benchmarks)."""
+    global _store
+    _store = s
+
+
+class Lease:
+    __slots__ = ("chat_id", "owner", "ok", "lost")
+
+    def __init__(self, chat_id: int):
+        self.chat_id = chat_id
+        self.owner = f"{REPLICA_ID}:{next(_seq)}"
+        self.ok = False     # acquired
+        self.lost = False   # a renewal failed: another replica may own the chat now
+
+
+async def _run(fn, *args):
+    global _io
+    if _io is None:
+        _io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="lease")
+    return await asyncio.get_running_loop().run_in_executor(_io, fn, *args)
+
+
+async def _renew_loop(s: LeaseStore, lease: Lease, ttl: float):
+    while True:
+        await asyncio.sleep(ttl / 3.0)
+        try:
+            if await _run(s.renew, lease.chat_id, lease.owner, ttl):
+                _stats["renewed"] += 1
+                continue
+        except Exception as e:
+            _stats["errors"] += 1
+            log.warning("lease renew failed for %s: %s", lease.chat_id, e)
+        lease.lost = True
+        _stats["lost"] += 1
+        return
+
+
+@asynccontextmanager
+async def hold(chat_id: int, ttl: float = LEASE_TTL_S, wait: float = LEASE_WAIT_S):
+    """
+    async with leases.hold(chat_id) as lease:
+        if not lease.ok: return     # another replica kept it for `wait` seconds
+        ...                          # check lease.lost before writing state
+    No-op (always ok) when LEASE_STORE is off.
+    """
+    lease = Lease(chat_id)
+    s = store()
+    if s is None:
+        lease.ok = True
+        yield lease
+        return
+
+    t0 = time.monotonic()
+    delay = 0.02
+    while True:
+        try:
+            lease.ok = await _run(s.acquire, chat_id, lease.owner, ttl)
+        except Exception as e:
+            # store down: keep serving (single-writer assumption) rather than go silent
+            _stats["errors"] += 1
+            log.warning("lease store unavailable (%s); handling chat %s unleased", e, chat_id)
+            lease.ok = True
+            yield lease
+            return
+        if lease.ok or time.monotonic() - t0 >= wait:
+            break
+        if delay == 0.02:
+            _stats["contended"] += 1
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 0.5)
+
+    waited = time.monotonic() - t0
+    if not lease.ok:
+        _stats["timeouts"] += 1
+        yield lease
+        return
+
+    _stats["acquired"] += 1
+    _stats["waited_ms"] += int(waited * 1000)
+    _held[chat_id] = lease.owner
+    renewer = asyncio.create_task(_renew_loop(s, lease, ttl))
+    try:
+        yield lease
+    finally:
+        renewer.cancel()
+        if _held.get(chat_id) == lease.owner:
+            del _held[chat_id]
+        try:
+            if await _run(s.release, chat_id, lease.owner):
+                _stats["released"] += 1
+        except Exception:
+            _stats["errors"] += 1
+
+
+def release_all() -> int:
+    """Shutdown hand-off: drop every lease this replica still holds."""
+    global _store, _io
+    s, n = _store, 0
+    if s is None:
+        return 0
+    if _io is not None:
+        _io.shutdown(wait=True)   # nothing else touches the store after this
+        _io = None
+    for chat_id, owner in list(_held.items()):
+        try:
+            n += bool(s.release(chat_id, owner))
+        except Exception:
+            _stats["errors"] += 1
+        _held.pop(chat_id, None)
+    s.close()
+    _store = None
+    return n
+
+
+def held() -> List[int]:
+    return sorted(_held)
+
+
+def stats() -> Dict[str, Any]:
+    name = next((k for k, cls in STORES.items() if type(_store) is cls), LEASE_STORE if enabled() else "off")
+    return dict(_stats, store=name, replica=REPLICA_ID, held=len(_held))
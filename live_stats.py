@@ -0,0 +1,165 @@
+# live_stats.py
+# In-memory aggregates kept up to date on every state transition and message,
+# so /stats never scans users. bot_db feeds the chat-level counts (new chat,
+# changed relationship/mode/flirt, reset/prune) and checkpoints snapshot()
+# into meta; handle_message feeds the message windows.
+import time
+from collections import Counter, deque
+from typing import Any, Dict, Optional, Tuple
+
+FIELDS = ("relationship", "mode", "flirt")
+WINDOWS = (60, 300)  # seconds
+
+_counts: Dict[str, Counter] = {f: Counter() for f in FIELDS}
+_safety: Counter = Counter()        # messages by safety mode (since start)
+_totals: Dict[str, int] = {"messages": 0, "pairs": 0}
+_pairs_ns: Counter = Counter()      # pairs per namespace (persona); sums to _totals["pairs"]
+_loaded = False
+_dirty = False
+
+
+def key(state: Dict[str, Any]) -> Tuple[str, str, str]:
+    """Bucket names a chat is counted under."""
+    return (
+        str(state.get("relationship") or "warm"),
+        str(state.get("mode") or "auto"),
+        "on" if state.get("flirt", True) else "off",
+    )
+
+
+def _apply(k: Optional[Tuple[str, ...]], sign: int):
+    global _dirty
+    if k is None:
+        return
+    for f, v in zip(FIELDS, k):
+        c = _counts[f]
+        c[v] += sign
+        if c[v] <= 0:
+            del c[v]
+    _dirty = True
+
+
+def on_add(k: Tuple[str, ...]):
+    _apply(k, +1)
+
+
+def on_remove(k: Tuple[str, ...]):
+    _apply(k, -1)
+
+
+def on_change(old: Tuple[str, ...], new: Tuple[str, ...]):
+    if old != new:
+        _apply(old, -1)
+        _apply(new, +1)
+
+
+def add_pairs(n: int, ns: str = ""):
+    global _dirty
+    _pairs_ns[ns] = max(0, _pairs_ns[ns] + int(n))
+    _totals["pairs"] = sum(_pairs_ns.values())
+    _dirty = True
+
+
+def pairs(ns: Optional[str] = None) -> Optional[int]:
+    """Pair count in one namespace, or all of them (ns=None)."""
+    if not _loaded:
+        return None
+    return _totals["pairs"] if ns is None else _pairs_ns.get(ns, 0)
+
+
+# -------------------------
+# Sliding windows
+# -------------------------
+class _Window:
+    __slots__ = ("span", "events", "chats")
+
+    def __init__(self, span: float):
+        self.span = span
+        self.events: deque = deque()   # (ts, chat_id)
+        self.chats: Counter = Counter()
+
+    def add(self, ts: float, chat_id: int):
+        self.events.append((ts, chat_id))
+        self.chats[chat_id] += 1
+        self.expire(ts)
+
+    def expire(self, now: float):
+        # amortized O(1): every event is popped once
+        cutoff = now - self.span
+        ev, chats = self.events, self.chats
+        while ev and ev[0][0] < cutoff:
+            _, c = ev.popleft()
+            chats[c] -= 1
+            if chats[c] <= 0:
+                del chats[c]
+
+
+_windows = {span: _Window(span) for span in WINDOWS}
+
+
+def on_message(chat_id: int, safety_mode: str = "normal", now: float = None):
+    global _dirty
+    now = time.time() if now is None else now
+    _totals["messages"] += 1
+    _safety[safety_mode or "normal"] += 1
+    for w in _windows.values():
+        w.add(now, chat_id)
+    _dirty = True
+
+
+def rates(now: float = None) -> Dict[int, Dict[str, float]]:
+    now = time.time() if now is None else now
+    out = {}
+    for span, w in _windows.items():
+        w.expire(now)
+        out[span] = {"messages": len(w.events), "chats": len(w.chats), "per_min": len(w.events) * 60.0 / span}
+    return out
+
+
+# -------------------------
+# Checkpoint / restore
+# -------------------------
+def loaded() -> bool:
+    return _loaded
+
+
+def snapshot() -> Dict[str, Any]:
+    return {
+        "counts": {f: dict(c) for f, c in _counts.items()},
+        "safety": dict(_safety),
+        "totals": dict(_totals),
+        "pairs_ns": dict(_pairs_ns),
+        "ts": time.time(),
+    }
+
+
+def restore(snap: Dict[str, Any]):
+    global _loaded, _dirty
+    for f in FIELDS:
+        _counts[f] = Counter({k: int(v) for k, v in (snap.get("counts", {}).get(f) or {}).items() if int(v) > 0})
+    _safety.clear()
+    _safety.update({k: int(v) for k, v in (snap.get("safety") or {}).items()})
+    for k in _totals:
+        _totals[k] = int((snap.get("totals") or {}).get(k, 0))
+    _pairs_ns.clear()
+    # checkpoints from before namespaces: every pair is the default persona's
+    _pairs_ns.update({k: int(v) for k, v in (snap.get("pairs_ns") or {"": _totals["pairs"]}).items()})
+    _loaded = True
+    _dirty = False
+
+
+def take_dirty() -> bool:
+    """True (once) if anything changed since the last checkpoint."""
+    global _dirty
+    d, _dirty = _dirty, False
+    return d
+
+
+def summary() -> Dict[str, Any]:
+    return {
+        "chats": sum(_counts["relationship"].values()),
+        "counts": {f: dict(c) for f, c in _counts.items()},
+        "safety": dict(_safety),
+        "totals": dict(_totals),
+        "rates": rates(),
+    }
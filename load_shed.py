@@ -0,0 +1,211 @@
+# load_shed.py
+# Backpressure-aware degradation. A monitor task samples the update backlog
+# (PTB's update_queue + handlers in flight), event-loop lag and how old
+# messages are when a handler picks them up, and maps the worst of the three
+# to a level. handle_message asks this module what it may still afford.
+#
+#   0 normal     full pipeline
+#   1 fast       human delays shrunk
+#   2 no_typing  no delay, no typing action
+#   3 lean       + skip mood update and event memory/summaries
+#   4 shed_low   + drop group messages, and private ones already older than SHED_MAX_AGE_S
+#   5 shed       + drop every non-admin message
+#
+# Levels go up at once and come down one step at a time after SHED_COOLDOWN_S.
+# With concurrent_updates PTB keeps waiting updates as tasks, not in
+# update_queue, so message age is what catches that backlog.
+#
+# Age is measured on the local clock from when the update reached this
+# process (ReceiptQueue, PTB's update_queue), not from Telegram's message
+# date: that one is whole seconds, carries any host clock skew, and makes
+# a backlog fetched after a restart look old all at once.
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import Any, Dict, Optional, Sequence
+
+from config import (
+    SHED_ENABLED, SHED_DEPTH_STEPS, SHED_LAG_STEPS_MS, SHED_AGE_STEPS_S, SHED_COOLDOWN_S, SHED_MAX_AGE_S,
+)
+
+log = logging.getLogger(__name__)
+
+LEVELS = ("normal", "fast", "no_typing", "lean", "shed_low", "shed")
+DELAY_SCALE = (1.0, 0.3, 0.0, 0.0, 0.0, 0.0)
+
+# priorities: lower is more important
+PRIO_ADMIN, PRIO_PRIVATE, PRIO_GROUP = 0, 1, 2
+
+SAMPLE_S = 0.1
+
+_level = 0
+_since = time.monotonic()
+_calm_since: Optional[float] = None
+_in_flight = 0
+_lag_s = 0.0
+_age_s = 0.0
+_depth = 0
+_task: Optional[asyncio.Task] = None
+_apps: list = []   # every persona's Application (one process can host several)
+
+_transitions: Counter = Counter()   # "a->b"
+_shed: Counter = Counter()          # by priority name
+_time_in: Counter = Counter()       # level name -> seconds
+
+
+def _step(value: float, steps: Sequence[float]) -> int:
+    n = 0
+    for s in steps:
+        if value >= s:
+            n += 1
+    return n
+
+
+def target_level(depth: int, lag_s: float, age_s: float) -> int:
+    return min(len(LEVELS) - 1, max(
+        _step(depth, SHED_DEPTH_STEPS),
+        _step(lag_s * 1000.0, SHED_LAG_STEPS_MS),
+        _step(age_s, SHED_AGE_STEPS_S),
+    ))
+
+
+def _set_level(new: int, now: float, why: str):
+    global _level, _since
+    if new == _level:
+        return
+    _time_in[LEVELS[_level]] += now - _since
+    _transitions[f"{LEVELS[_level]}->{LEVELS[new]}"] += 1
+    log.warning("load level %s -> %s (%s)", LEVELS[_level], LEVELS[new], why)
+    _level, _since = new, now
+
+
+def update(depth: int, lag_s: float, now: float = None):
+    """One monitor tick (also callable directly from tools)."""
+    global _calm_since, _depth, _lag_s, _age_s
+    now = time.monotonic() if now is None else now
+    _depth = depth
+    _lag_s = lag_s
+    want = target_level(depth, lag_s, _age_s)
+    why = f"depth={depth} lag={lag_s * 1000:.0f}ms age={_age_s:.1f}s"
+    if want > _level:
+        _calm_since = None
+        _set_level(want, now, why)
+    elif want < _level:
+        if _calm_since is None:
+            _calm_since = now
+        elif now - _calm_since >= SHED_COOLDOWN_S:
+            _calm_since = now
+            _set_level(_level - 1, now, why)
+    else:
+        _calm_since = None
+    _age_s *= 0.8   # age is only refreshed by incoming messages; let it fade
+
+
+async def _monitor():
+    loop = asyncio.get_running_loop()
+    while True:
+        t0 = loop.time()
+        await asyncio.sleep(SAMPLE_S)
+        lag = max(0.0, loop.time() - t0 - SAMPLE_S)
+        update(sum(a.update_queue.qsize() for a in _apps) + _in_flight, lag)
+
+
+def start(app):
+    global _task
+    if app not in _apps:
+        _apps.append(app)
+    if SHED_ENABLED and _task is None:
+        _task = asyncio.get_running_loop().create_task(_monitor())
+
+
+async def stop():
+    global _task
+    _apps.clear()
+    if _task is not None:
+        _task.cancel()
+        _task = None
+
+
+# -------------------------
+# Handler side
+# -------------------------
+class ReceiptQueue(asyncio.Queue):
+    """update_queue that notes when each update arrived (time.time(), by update_id)."""
+
+    MAX_TRACKED = 10000   # updates nobody asked about (commands, edits) age out
+
+    def __init__(self, maxsize: int = 0):
+        super().__init__(maxsize)
+        self._received: Dict[int, float] = {}
+
+    def put_nowait(self, item):
+        update_id = getattr(item, "update_id", None)
+        if update_id is not None:
+            self._received[update_id] = time.time()
+            if len(self._received) > self.MAX_TRACKED:
+                del self._received[next(iter(self._received))]
+        super().put_nowait(item)
+
+    def received(self, update_id: int) -> Optional[float]:
+        return self._received.pop(update_id, None)
+
+
+def received_at(app, update) -> Optional[float]:
+    """When this process got the update (None if app doesn't use a ReceiptQueue)."""
+    q = getattr(app, "update_queue", None)
+    return q.received(update.update_id) if isinstance(q, ReceiptQueue) else None
+
+
+def admit(prio: int, msg_ts: float = None) -> bool:
+    """False = shed this message. msg_ts: local receipt time. Also feeds the queue-age signal."""
+    global _age_s
+    age = max(0.0, time.time() - msg_ts) if msg_ts else 0.0
+    _age_s = max(_age_s, age)
+    if _level < 4 or prio == PRIO_ADMIN:
+        return True
+    if _level == 4 and prio == PRIO_PRIVATE and age <= SHED_MAX_AGE_S:
+        return True
+    _shed[("admin", "private", "group")[prio]] += 1
+    return False
+
+
+def enter():
+    global _in_flight
+    _in_flight += 1
+
+
+def leave():
+    global _in_flight
+    _in_flight -= 1
+
+
+def level() -> int:
+    return _level
+
+
+def delay_scale() -> float:
+    return DELAY_SCALE[_level]
+
+
+def typing() -> bool:
+    return _level < 2
+
+
+def full_pipeline() -> bool:
+    return _level < 3
+
+
+def stats() -> Dict[str, Any]:
+    time_in = dict(_time_in)
+    time_in[LEVELS[_level]] = time_in.get(LEVELS[_level], 0.0) + time.monotonic() - _since
+    return {
+        "level": LEVELS[_level],
+        "depth": _depth,
+        "in_flight": _in_flight,
+        "lag_ms": round(_lag_s * 1000.0, 1),
+        "age_s": round(_age_s, 1),
+        "transitions": dict(_transitions),
+        "shed": dict(_shed),
+        "time_in": {k: round(v, 1) for k, v in time_in.items()},
+    }
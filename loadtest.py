@@ -0,0 +1,140 @@
+# loadtest.py
+"""
+End-to-end load test: real PTB Application + handlers against fake_bot_api.
+
+  python loadtest.py --rate 50 --duration 20 [--chats 300] [--delay-scale 0]
+                     [--concurrent 0] [--fault-429 0.0] [--latency-ms 0] [--no-shed]
+
+Runs in a throwaway working dir (fresh bot.db / memory.db) and reports
+end-to-end reply latency (update generated -> sendMessage received) and
+sustained replies/sec over the traffic window.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from collections import Counter
+
+from telegram.ext import ApplicationBuilder
+
+from fake_bot_api import FakeBotAPI
+
+
+def build_app(api: FakeBotAPI, concurrent: int = 0, builder: ApplicationBuilder = None):
+    """The production app (HTTP settings, send limiter, post_init/shutdown) pointed at the fake API."""
+    import main
+    import personas
+
+    persona = personas.Persona("loadtest", "123456:FAKE", 1)
+    personas.configure([persona])
+    builder = (
+        (builder or ApplicationBuilder())
+        .base_url(api.base_url)
+        .base_file_url(api.base_url.replace("/bot", "/file/bot"))
+    )
+    if concurrent:
+        builder = builder.concurrent_updates(concurrent)
+    return main.build_app(persona, builder=builder)
+
+
+async def run(args) -> dict:
+    import bot_db
+    import delay_engine
+    import load_shed
+
+    delay_engine.DELAY_SCALE = args.delay_scale
+    load_shed.SHED_ENABLED = not args.no_shed
+    bot_db.init_db()
+    bot_db.warm_pair_index()
+
+    api = FakeBotAPI(
+        rate=args.rate,
+        chats=args.chats,
+        fault_429=args.fault_429,
+        retry_after=args.retry_after,
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_jitter_ms,
+    )
+    await api.start()
+
+    app = build_app(api, args.concurrent)
+    errors = Counter()
+
+    async def on_error(update, context):
+        errors[type(context.error).__name__] += 1
+
+    app.add_error_handler(on_error)
+
+    async with app:
+        await app.post_init(app)   # run_polling would; outbox drainer, load_shed, summarizer
+        await app.start()
+        await app.updater.start_polling(poll_interval=0.0, timeout=5)
+
+        t0 = time.time()
+        await asyncio.sleep(args.duration)
+        api.stop_generating()
+        t1 = time.time()
+
+        deadline = t1 + args.drain
+        while len(api.replies) + sum(load_shed.stats()["shed"].values()) < api.generated and time.time() < deadline:
+            await asyncio.sleep(0.1)
+
+        await app.updater.stop()
+        await app.stop()
+        await app.post_shutdown(app)
+    await api.stop()
+
+    in_window = sum(1 for _, ts, _ in api.replies if ts <= t1)
+    return {
+        "generated": api.generated,
+        "replied": len(api.replies),
+        "sustained_msgs_per_s": in_window / max(1e-9, t1 - t0),
+        "latency": api.latency_report(),
+        "calls": api.calls_by_method(),
+        "injected_429": api.errors_429,
+        "handler_errors": dict(errors),
+        "load": load_shed.stats(),
+    }
+
+
+def print_report(r: dict):
+    lat = r["latency"]
+    print(f"generated={r['generated']} replied={r['replied']} sustained={r['sustained_msgs_per_s']:.1f} msg/s")
+    if lat.get("count"):
+        print(
+            f"latency p50={lat['p50_ms']:.0f}ms p90={lat['p90_ms']:.0f}ms "
+            f"p99={lat['p99_ms']:.0f}ms max={lat['max_ms']:.0f}ms"
+        )
+    print(f"calls={r['calls']}")
+    print(f"injected_429={r['injected_429']} handler_errors={r['handler_errors']}")
+    lo = r["load"]
+    print(f"load: level={lo['level']} shed={lo['shed']} transitions={lo['transitions']} time_in={lo['time_in']}")
+
+
+def add_args(ap: argparse.ArgumentParser):
+    ap.add_argument("--rate", type=float, default=50.0, help="synthetic updates per second")
+    ap.add_argument("--duration", type=float, default=20.0, help="seconds of traffic")
+    ap.add_argument("--drain", type=float, default=15.0, help="max seconds to wait for trailing replies")
+    ap.add_argument("--chats", type=int, default=300)
+    ap.add_argument("--delay-scale", type=float, default=0.0, help="human_delay multiplier (1 = production)")
+    ap.add_argument("--concurrent", type=int, default=0, help="PTB concurrent_updates (0 = sequential)")
+    ap.add_argument("--fault-429", type=float, default=0.0, help="probability a send call gets 429")
+    ap.add_argument("--retry-after", type=int, default=1)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--latency-jitter-ms", type=float, default=0.0)
+    ap.add_argument("--no-shed", action="store_true", help="disable load shedding (degradation levels)")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    add_args(ap)
+    args = ap.parse_args()
+
+    # throwaway DB files for this run
+    os.chdir(tempfile.mkdtemp(prefix="ellena-load-"))
+    print_report(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,61 @@
 # main.py
+import os
 import re
 import time
 import random
+import asyncio
+import tempfile
+import threading
+from signal import SIGINT, SIGTERM
 from collections import defaultdict, deque
 from typing import Dict, Any, List
 
 from telegram import Update
 from telegram.constants import ChatAction
-from telegram.ext import ApplicationBuilder, ContextTypes, MessageHandler, CommandHandler, filters
+from telegram.ext import (
+    ApplicationBuilder, ApplicationHandlerStop, ContextTypes, MessageHandler, CommandHandler, TypeHandler, filters,
+)
 
-from config import BOT_TOKEN, ADMIN_ID
+from config import (
+    CONCURRENT_UPDATES, PERSONAS_FILE, SEND_RATE_PER_BOT, SEND_RATE_GLOBAL, TRANSCRIPT_CONTEXT_TURNS, PROF_DEFAULT_S,
+    check_required,
+)
 from bot_db import (
-    init_db,
+    init_db, warm_pair_index,
     get_profile, set_profile,
     ensure_user, bump_user,
-    get_state, set_state,
+    get_state, set_state, update_state,
+    get_member_state, save_member,
     add_pair, find_pair,
     reset_user,
     clear_pairs, count_pairs,
     DEFAULT_PROFILE,
 )
-from delay_engine import human_delay
+from delay_engine import delay_for
 from style_engine import apply_style
 
 # NEW engines (you will create these files)
-from emotion_engine import infer_emotion, update_mood_vector
+from emotion_engine import update_mood_vector, apply_time_decay
 from relationship_engine import apply_relationship_limits
 from safety_engine import evaluate_safety
+import analysis_cache
+import maintenance
+import broadcast
+import bot_db
+import export
+import memory
+import summarizer
+import topics
+import live_stats
+import group_mode
+import leases
+import load_shed
+import outbox
+import personas
+import profiler
+import transcript
+import transport
+from ratelimit import RateLimiter, BotRateLimiter
 
 # -------------------------
 # Global runtime switches
@@ -42,12 +71,27 @@ SAD_WORDS = {"sad", "tired", "lonely", "depressed", "cry", "hurt", "stress", "st
 SWEET_WORDS = {"miss", "missed", "love", "baby", "babe", "sweet", "honey", "darling", "cute"}
 ANGRY_WORDS = {"angry", "mad", "annoyed", "pissed", "hate"}
 
-# Keep “naughty” suggestive, not explicit
-EXPLICIT_WORDS = {"fuck", "pussy", "dick", "blowjob", "cum", "nude", "naked", "sex"}
+# Callbacks to what the chat keeps talking about (topics.py weights)
+TOPIC_PULLS = {
+    "work": ["How’s work been", "Boss still annoying", "Work treating you okay"],
+    "school": ["How’s school", "Exams going okay", "Studying hard or hardly studying"],
+    "family": ["How’s the family", "Everyone good at home"],
+    "love": ["So how’s the love life", "Any updates on them"],
+    "health": ["You feeling better", "Taking care of yourself"],
+    "sleep": ["You sleeping better", "Did you rest"],
+    "food": ["What you eating today", "Ate yet"],
+    "music": ["What you listening to", "Send me a song"],
+    "games": ["Still gaming", "Won anything lately"],
+    "movies": ["Watched anything good", "What you watching now"],
+}
+TOPIC_PULL_MIN = 1.5  # decayed weight before she brings it up
+
+# Keep “naughty” suggestive, not explicit (wordlist: lexicon/safety/explicit.txt)
 
 
 def is_admin(update: Update) -> bool:
-    return bool(update.effective_user and update.effective_user.id == ADMIN_ID)
+    """Admin of the persona (bot) this update came to."""
+    return bool(update.effective_user and update.effective_user.id == personas.current().admin_id)
 
 
 def clamp01(x: float) -> float:
@@ -90,9 +134,11 @@ def detect_vibe(text: str) -> Dict[str, Any]:
 
 
 def pick_not_repeat(options: List[str], last: List[str]) -> str:
-    last_set = set(last[-10:])
-    pool = [o for o in options if o not in last_set]
-    return random.choice(pool) if pool else random.choice(options)
+    seen = {t: i for i, t in enumerate(last)}  # text -> most recent position
+    pool = [o for o in options if o not in seen]
+    if pool:
+        return random.choice(pool)
+    return min(options, key=lambda o: seen[o])  # all used: the one said longest ago
 
 
 def maybe_emoji(profile: Dict[str, Any], intensity: float = 1.0) -> str:
@@ -130,17 +176,21 @@ def energy_pack(profile: Dict[str, Any], mode: str, relationship: str, flirt: bo
 
 
 def _has_explicit(text: str) -> bool:
-    raw = (text or "").lower()
-    for w in EXPLICIT_WORDS:
-        if re.search(rf"\b{re.escape(w)}\b", raw):
-            return True
-    return False
+    return bool(analysis_cache.safety_hits(text).get("explicit"))
+
 
+def _event_label(signal: Dict[str, Any]) -> str:
+    # strongest mood push of this message, e.g. "vulnerability"
+    delta = signal.get("delta") or {}
+    k = max(delta, key=lambda d: delta[d], default="")
+    return k if k and delta[k] >= 0.05 else "neutral"
 
-def generate_reply(user_text: str, state: Dict[str, Any], profile: Dict[str, Any]) -> str:
+
+def generate_reply(user_text: str, state: Dict[str, Any], profile: Dict[str, Any], topic_weights: Dict[str, float] = None,
+                   recent: List[str] = None) -> str:
     raw = (user_text or "").strip()
     t = raw.lower()
-    last = state.get("last_replies", [])
+    last = recent or state.get("last_replies", [])  # recent: longer history from the transcript
 
     # Explicit handling (keep it “naughty” but not graphic)
     if _has_explicit(t):
@@ -163,7 +213,8 @@ def generate_reply(user_text: str, state: Dict[str, Any], profile: Dict[str, Any
         )
 
     # Learned pair match
-    learned = find_pair(raw)
+    ns = personas.current().ns
+    learned = analysis_cache.cached("pair:" + ns, raw, lambda: find_pair(raw, ns=ns))
     if learned:
         if random.random() < 0.35:
             react = pick_not_repeat(profile.get("fav_reacts", ["Okayyy"]), last)
@@ -171,7 +222,7 @@ def generate_reply(user_text: str, state: Dict[str, Any], profile: Dict[str, Any
         return learned
 
     # Vibe detection + lock
-    dv = detect_vibe(raw)
+    dv = analysis_cache.cached("vibe", raw, lambda: detect_vibe(raw))
     user_vibe = dv["vibe"]
 
     forced_mode = state.get("mode")  # None=auto
@@ -310,6 +361,12 @@ def generate_reply(user_text: str, state: Dict[str, Any], profile: Dict[str, Any
 
     pull = pick_not_repeat(pulls, last)
 
+    # Sometimes circle back to what they talk about most
+    if topic_weights and mode not in ("serious", "soft"):
+        topic, w = max(topic_weights.items(), key=lambda kv: kv[1])
+        if w >= TOPIC_PULL_MIN and topic in TOPIC_PULLS and random.random() < 0.25:
+            pull = pick_not_repeat(TOPIC_PULLS[topic], last) + maybe_emoji(profile, 0.8)
+
     # Extra spice (only if flirt + warm/close)
     if (
         state.get("flirt", True)
@@ -360,29 +417,73 @@ def parse_training_block(block: str) -> List[tuple]:
 # -------------------------
 # Message handler
 # -------------------------
+def _merge_turn(fresh, mine, reply: str):
+    """set_state conflict merge for a reply turn: our fields win, last_replies keeps both turns."""
+    theirs = list(fresh.get("last_replies") or [])
+    merged = bot_db.merge_changes(fresh, mine)
+    merged["last_replies"] = (theirs + [reply])[-10:]
+    return merged
+
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     global PAUSED_GLOBAL
     if not update.message or not update.message.text:
         return
 
     chat_id = update.effective_chat.id
-    username = update.effective_user.username or ""
     text = update.message.text
 
-    # Anti-spam
+    # Groups: decide relevance before touching the DB
+    in_group = group_mode.is_group(update.effective_chat)
+    if in_group:
+        if not group_mode.relevance(update.message, context.bot.id, context.bot.username):
+            return
+        user_id = update.effective_user.id
+        text = group_mode.strip_mention(text, context.bot.username)
+
+    # Under backpressure, drop the least important traffic first
+    prio = load_shed.PRIO_ADMIN if is_admin(update) else (load_shed.PRIO_GROUP if in_group else load_shed.PRIO_PRIVATE)
+    persona = personas.current()
+    persona.metrics["messages"] += 1
+    if not load_shed.admit(prio, load_shed.received_at(context.application, update)):
+        persona.metrics["shed"] += 1
+        return
+
+    # Anti-spam (per member in groups, per bot: a user can talk to several personas)
+    spam_key = (persona.ns, chat_id, user_id) if in_group else (persona.ns, chat_id)
     now = time.time()
-    _burst[chat_id].append(now)
-    if len(_burst[chat_id]) >= 8 and (now - _burst[chat_id][0]) < 7:
+    _burst[spam_key].append(now)
+    if len(_burst[spam_key]) >= 8 and (now - _burst[spam_key][0]) < 7:
         return
-    if now - _last_ts[chat_id] < 0.20:
+    if now - _last_ts[spam_key] < 0.20:
         return
-    _last_ts[chat_id] = now
+    _last_ts[spam_key] = now
 
-    ensure_user(chat_id, username)
-    bump_user(chat_id, username)
+    # One replica per chat at a time (no-op unless LEASE_STORE is set)
+    load_shed.enter()
+    try:
+        async with leases.hold(chat_id) as lease:
+            if not lease.ok:
+                return
+            await _handle_chat_message(update, context, lease, text, in_group)
+    finally:
+        load_shed.leave()
+
+
+async def _handle_chat_message(update: Update, context: ContextTypes.DEFAULT_TYPE, lease, text: str, in_group: bool):
+    chat_id = update.effective_chat.id
+    username = update.effective_user.username or ""
+    user_id = update.effective_user.id
+
+    ensure_user(chat_id, username if not in_group else (update.effective_chat.title or ""))
+    bump_user(chat_id, username if not in_group else "")
 
     state = get_state(chat_id) or {}
-    profile = get_profile()
+    if in_group:
+        group_state = state
+        member_state, _ = get_member_state(chat_id, user_id)
+    persona = personas.current()
+    profile = get_profile(persona.ns, persona.profile)
 
     # Ensure state defaults (keeps continuity stable)
     state.setdefault("relationship", "warm")
@@ -391,11 +492,18 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     state.setdefault("mood_locked", False)
     state.setdefault("last_mode", None)
     state.setdefault("mood_vector", None)
+    state.setdefault("mood_ts", 0.0)
     state.setdefault("negative_loop_score", 0)
     state.setdefault("emotional_sensitivity", 50)
     state.setdefault("disabled_emotions", [])
     state.setdefault("teach_on", False)
 
+    if in_group:
+        state = group_mode.member_view(group_state, member_state)
+
+    # Idle time pulls mood back toward baseline (closed form, no cron)
+    state = apply_time_decay(state)
+
     # Teaching mode (admin only)
     if is_admin(update) and state.get("teach_on", False):
         pairs = parse_training_block(text)
@@ -403,22 +511,25 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         for u, me in pairs:
             key = _make_key_phrase(u)
             if key:
-                add_pair(key, me)
+                add_pair(key, me, ns=persona.ns)
                 learned += 1
         await update.message.reply_text(f"Learned {learned} ✅")
         return
 
-    # Global pause blocks normal replies (admin still can command)
-    if PAUSED_GLOBAL:
+    # Pause (this bot, or every bot) blocks normal replies (admin still can command)
+    if PAUSED_GLOBAL or personas.current().paused:
         return
 
     # -------------------------
     # Emotion/Relationship/Safety pipeline
     # -------------------------
-    signal = infer_emotion(text, state)  # intent/tension/energy/mode_hint/delta
+    signal = analysis_cache.signal(text, state)  # intent/tension/energy/mode_hint/delta (cached infer_emotion)
     _limits = apply_relationship_limits(state)  # currently unused in templates, but ready
     safety = evaluate_safety(text, state, signal)  # sets loop score + pace + no_teasing, etc.
-    state = update_mood_vector(state, signal, safety)
+    full = load_shed.full_pipeline()  # "lean" level and up: no mood/event bookkeeping
+    if full:
+        state = update_mood_vector(state, signal, safety)
+    live_stats.on_message(chat_id, safety.get("mode", "normal"))
 
     # If AUTO mode and not locked: let emotion engine hint drive last_mode
     if not state.get("mode") and not state.get("mood_locked", False):
@@ -427,8 +538,13 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             # map curious -> playful (you can later add a true curious mode)
             state["last_mode"] = "playful" if mh == "curious" else mh
 
-    # Generate reply (still your current generator)
-    reply = generate_reply(text, state, profile)
+    # Topic weights: O(tokens) update, persisted in batches by maintenance
+    topic_weights = topics.observe(chat_id, text)
+
+    # Generate reply (still your current generator); anti-repeat looks
+    # further back than last_replies when the transcript has the turns
+    recent = transcript.recent_replies(chat_id, TRANSCRIPT_CONTEXT_TURNS)
+    reply = generate_reply(text, state, profile, topic_weights, recent=recent)
 
     # Safety post-filter (lightweight guard for now)
     if safety.get("force_concise"):
@@ -441,13 +557,74 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Save last replies + state
     state["last_replies"] = (state.get("last_replies", []) + [reply])[-10:]
-    set_state(chat_id, state)
-
-    # Typing + delay (emotion-aware pace)
-    await context.bot.send_chat_action(chat_id, ChatAction.TYPING)
-    await human_delay(text, reply, pace=safety.get("pace", "normal"))
-
-    await update.message.reply_text(reply)
+    if lease.lost:
+        return  # another replica may have taken the chat; don't overwrite its state
+
+    # Queue the reply first: a restart during the delay sends it from the outbox
+    delay = delay_for(text, reply, pace=safety.get("pace", "normal"), scale=load_shed.delay_scale())
+    out_id = outbox.queue(
+        context.bot.id, chat_id, reply, time.time() + delay,
+        reply_to=update.message.message_id if in_group else None, update_id=update.update_id,
+    )
+    merge = lambda fresh, mine: _merge_turn(fresh, mine, reply)
+    try:
+        if in_group:
+            group_mode.split(state, group_state, member_state)
+            set_state(chat_id, group_state, merge=merge)
+            save_member(chat_id, user_id, username, member_state)
+        else:
+            set_state(chat_id, state, merge=merge)
+    except Exception:
+        outbox.drop(out_id)
+        raise
+    transcript.add(chat_id, text, reply)
+
+    # From here on the reply must still go out: if this handler fails, the
+    # outbox drainer sends it (a cancelled task, i.e. shutdown, leaves the
+    # row for the next start)
+    try:
+        # Event memory; summaries are folded in the background when due
+        if full:
+            memory.bump_user(chat_id, username)
+            mst = memory.add_event(
+                chat_id,
+                label=_event_label(signal),
+                intent=signal.get("intent", ""),
+                note=_make_key_phrase(text),
+                outcome=safety.get("mode", ""),
+            )
+            summarizer.maybe_schedule(chat_id, mst)
+
+        # Typing + delay (emotion-aware pace; shortened/skipped under load)
+        if load_shed.typing():
+            try:
+                await context.bot.send_chat_action(chat_id, ChatAction.TYPING)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass  # best effort; the reply matters, not the indicator
+        if delay > 0:
+            await asyncio.sleep(delay)
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        outbox.release(context.bot.id, out_id)
+        raise
+
+    try:
+        await update.message.reply_text(reply, do_quote=in_group)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        if outbox.transient(e):
+            # RetryAfter / timeout / network: the drainer retries with backoff
+            outbox.release(context.bot.id, out_id, e)
+            persona.metrics["reply_retries"] += 1
+            return
+        outbox.drop(out_id)   # blocked, bad request: won't get better
+        raise
+    outbox.done(out_id)
+    persona.metrics["replies"] += 1
 
 
 # -------------------------
@@ -460,6 +637,14 @@ async def require_admin(update: Update, cmd_name: str) -> bool:
     return False
 
 
+async def require_default(update: Update, what: str) -> bool:
+    """Process-wide commands (shared users/events, every bot) belong to the default persona's admin."""
+    if personas.current() is personas.default():
+        return True
+    await update.message.reply_text(f"{what} runs from the {personas.default().name} bot only 😅")
+    return False
+
+
 # -------------------------
 # Commands (ALL admin-only + always reply)
 # -------------------------
@@ -473,7 +658,13 @@ async def cmd_pause(update: Update, context: ContextTypes.DEFAULT_TYPE):
     global PAUSED_GLOBAL
     if not await require_admin(update, "pause"):
         return
-    PAUSED_GLOBAL = True
+    if context.args and context.args[0].lower() == "all":
+        if not await require_default(update, "/pause all"):
+            return
+        PAUSED_GLOBAL = True
+        await update.message.reply_text("Paused (all bots) ✅")
+        return
+    personas.current().paused = True
     await update.message.reply_text("Paused ✅")
 
 
@@ -481,27 +672,27 @@ async def cmd_resume(update: Update, context: ContextTypes.DEFAULT_TYPE):
     global PAUSED_GLOBAL
     if not await require_admin(update, "resume"):
         return
-    PAUSED_GLOBAL = False
-    await update.message.reply_text("Resumed ✅")
+    if context.args and context.args[0].lower() == "all":
+        if not await require_default(update, "/resume all"):
+            return
+        PAUSED_GLOBAL = False
+        await update.message.reply_text("Resumed (all bots) ✅")
+        return
+    personas.current().paused = False
+    await update.message.reply_text("Resumed ✅" + (" (still paused for all bots: /resume all)" if PAUSED_GLOBAL else ""))
 
 
 async def cmd_teach_on(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await require_admin(update, "teach_on"):
         return
-    chat_id = update.effective_chat.id
-    st = get_state(chat_id) or {}
-    st["teach_on"] = True
-    set_state(chat_id, st)
+    update_state(update.effective_chat.id, lambda st: st.update(teach_on=True))
     await update.message.reply_text("Teaching ON ✅\n\n" + TRAIN_HELP)
 
 
 async def cmd_teach_off(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await require_admin(update, "teach_off"):
         return
-    chat_id = update.effective_chat.id
-    st = get_state(chat_id) or {}
-    st["teach_on"] = False
-    set_state(chat_id, st)
+    update_state(update.effective_chat.id, lambda st: st.update(teach_on=False))
     await update.message.reply_text("Teaching OFF ✅")
 
 
@@ -509,7 +700,6 @@ async def cmd_mode(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await require_admin(update, "mode"):
         return
     chat_id = update.effective_chat.id
-    st = get_state(chat_id) or {}
 
     if not context.args:
         await update.message.reply_text("Use: /mode playful|shy|romantic|soft|serious|auto ✅")
@@ -517,8 +707,7 @@ async def cmd_mode(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     m = context.args[0].strip().lower()
     if m == "auto":
-        st["mode"] = None
-        set_state(chat_id, st)
+        update_state(chat_id, lambda st: st.update(mode=None))
         await update.message.reply_text("Mode: AUTO ✅")
         return
 
@@ -526,28 +715,21 @@ async def cmd_mode(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Mode options: playful, shy, romantic, soft, serious, auto ✅")
         return
 
-    st["mode"] = m
-    set_state(chat_id, st)
+    update_state(chat_id, lambda st: st.update(mode=m))
     await update.message.reply_text(f"Mode: {m.upper()} ✅")
 
 
 async def cmd_flirt_on(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await require_admin(update, "flirt_on"):
         return
-    chat_id = update.effective_chat.id
-    st = get_state(chat_id) or {}
-    st["flirt"] = True
-    set_state(chat_id, st)
+    update_state(update.effective_chat.id, lambda st: st.update(flirt=True))
     await update.message.reply_text("Flirt: ON ✅")
 
 
 async def cmd_flirt_off(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await require_admin(update, "flirt_off"):
         return
-    chat_id = update.effective_chat.id
-    st = get_state(chat_id) or {}
-    st["flirt"] = False
-    set_state(chat_id, st)
+    update_state(update.effective_chat.id, lambda st: st.update(flirt=False))
     await update.message.reply_text("Flirt: OFF ✅")
 
 
@@ -555,7 +737,6 @@ async def cmd_relationship(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await require_admin(update, "relationship"):
         return
     chat_id = update.effective_chat.id
-    st = get_state(chat_id) or {}
 
     if not context.args:
         await update.message.reply_text("Use: /relationship new|warm|close|reset ✅")
@@ -563,8 +744,7 @@ async def cmd_relationship(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     v = context.args[0].strip().lower()
     if v == "reset":
-        st["relationship"] = "warm"
-        set_state(chat_id, st)
+        update_state(chat_id, lambda st: st.update(relationship="warm"))
         await update.message.reply_text("Relationship: reset → WARM ✅")
         return
 
@@ -572,35 +752,29 @@ async def cmd_relationship(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Options: new, warm, close, reset ✅")
         return
 
-    st["relationship"] = v
-    set_state(chat_id, st)
+    update_state(chat_id, lambda st: st.update(relationship=v))
     await update.message.reply_text(f"Relationship: {v.upper()} ✅")
 
 
 async def cmd_lock_mood(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await require_admin(update, "lock_mood"):
         return
-    chat_id = update.effective_chat.id
-    st = get_state(chat_id) or {}
-    st["mood_locked"] = True
-    set_state(chat_id, st)
+    update_state(update.effective_chat.id, lambda st: st.update(mood_locked=True))
     await update.message.reply_text("Mood lock: ON ✅")
 
 
 async def cmd_unlock_mood(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await require_admin(update, "unlock_mood"):
         return
-    chat_id = update.effective_chat.id
-    st = get_state(chat_id) or {}
-    st["mood_locked"] = False
-    set_state(chat_id, st)
+    update_state(update.effective_chat.id, lambda st: st.update(mood_locked=False))
     await update.message.reply_text("Mood lock: OFF ✅")
 
 
 async def cmd_profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await require_admin(update, "profile"):
         return
-    p = get_profile()
+    persona = personas.current()
+    p = get_profile(persona.ns, persona.profile)
     await update.message.reply_text(
         "Profile ✅\n"
         f"emoji_level={p.get('emoji_level')}\n"
@@ -608,7 +782,7 @@ async def cmd_profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"tease_level={p.get('tease_level')}\n"
         f"fav_emojis={' '.join(p.get('fav_emojis', []))}\n"
         f"fav_reacts={', '.join(p.get('fav_reacts', [])[:8])}\n"
-        f"pairs={count_pairs()}"
+        f"pairs={count_pairs(personas.current().ns)}"
     )
 
 
@@ -617,25 +791,54 @@ async def cmd_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     chat_id = update.effective_chat.id
     st = get_state(chat_id) or {}
+    ws = bot_db.write_stats()
+    ss = summarizer.stats()
+    ac = analysis_cache.stats()
+    gs = group_mode.stats()
+    ls = leases.stats()
+    lo = load_shed.stats()
+    ob = outbox.stats()
+    tr = transcript.stats()
     await update.message.reply_text(
         "Status ✅\n"
-        f"paused_global={PAUSED_GLOBAL}\n"
+        f"paused={personas.current().paused} paused_global={PAUSED_GLOBAL}\n"
         f"mode={st.get('mode') or 'auto'}\n"
         f"flirt={'on' if st.get('flirt', True) else 'off'}\n"
         f"relationship={st.get('relationship','warm')}\n"
         f"mood_locked={'yes' if st.get('mood_locked', False) else 'no'}\n"
         f"teach_on={'yes' if st.get('teach_on', False) else 'no'}\n"
-        f"pairs={count_pairs()}\n"
+        f"pairs={count_pairs(personas.current().ns)}\n"
         f"loop_score={st.get('negative_loop_score',0)}\n"
-        f"sensitivity={st.get('emotional_sensitivity',50)}"
+        f"sensitivity={st.get('emotional_sensitivity',50)}\n"
+        f"state_writes={ws['partial'] + ws['full']} (partial={ws['partial']}) skipped={ws['skipped']} "
+        f"conflicts={ws['conflicts']} exhausted={ws['exhausted']}\n"
+        f"analysis_cache={ac['size']} hit_rate={ac['hit_rate'] * 100:.1f}% "
+        f"(hits={ac['hits']} misses={ac['misses']} invalidations={ac['invalidations']})\n"
+        f"summaries={ss['done']} queued={ss['queued']} dropped={ss['dropped']} errors={ss['errors']}\n"
+        f"group_msgs={gs.get('seen', 0)} skipped={gs.get('skipped', 0)} "
+        f"(mention={gs.get('mention', 0)} reply={gs.get('reply', 0)} keyword={gs.get('keyword', 0)} sampled={gs.get('sampled', 0)})\n"
+        f"leases={ls['store']} replica={ls['replica']} held={ls['held']} contended={ls.get('contended', 0)} "
+        f"timeouts={ls.get('timeouts', 0)} lost={ls.get('lost', 0)}\n"
+        f"load={lo['level']} depth={lo['depth']} lag={lo['lag_ms']}ms shed={sum(lo['shed'].values())} "
+        f"transitions={sum(lo['transitions'].values())}\n"
+        f"outbox={ob['pending']} drained={ob.get('drained', 0)} retried={ob.get('retried', 0)} "
+        f"stale={ob.get('dropped_stale', 0)} duplicates_skipped={ob.get('duplicates', 0)}\n"
+        f"transcript turns={tr.get('turns', 0)} buffered={tr['buffered']} segments={tr.get('segments', 0)} "
+        f"trimmed={tr.get('trimmed', 0)}\n"
+        + transport.format_stats()
     )
 
 
 async def cmd_reset_chat(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await require_admin(update, "reset_chat"):
         return
+    if not await require_default(update, "/reset_chat"):
+        return  # chat state, transcript and memory are shared by every bot
     chat_id = update.effective_chat.id
     reset_user(chat_id)  # deletes user row
+    topics.forget(chat_id)
+    transcript.clear(chat_id)
+    memory.reset_memory(chat_id)
     ensure_user(chat_id, update.effective_user.username or "")
     await update.message.reply_text("Chat memory reset ✅")
 
@@ -643,24 +846,228 @@ async def cmd_reset_chat(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def cmd_clear_pairs(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await require_admin(update, "clear_pairs"):
         return
-    clear_pairs()
+    clear_pairs(personas.current().ns)
     await update.message.reply_text("All taught pairs cleared ✅")
 
 
 async def cmd_reset_style(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await require_admin(update, "reset_style"):
         return
-    set_profile(dict(DEFAULT_PROFILE))
+    persona = personas.current()
+    set_profile(dict(DEFAULT_PROFILE, **persona.profile), persona.ns)
     await update.message.reply_text("Style profile reset ✅")
 
 
+async def cmd_maintenance(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await require_admin(update, "maintenance"):
+        return
+    if not await require_default(update, "/maintenance"):
+        return
+
+    if context.args and context.args[0].lower() == "run":
+        name = context.args[1].lower() if len(context.args) > 1 else ""
+        if name not in maintenance.job_stats():
+            await update.message.reply_text("Jobs: " + ", ".join(maintenance.job_stats()) + " ✅")
+            return
+        j = await maintenance.run_job(name)
+        await update.message.reply_text(f"{name}: {j['last_ms']:.1f}ms, items={j['last_items']} ✅")
+        return
+
+    await update.message.reply_text(maintenance.format_stats())
+
+
+async def cmd_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await require_admin(update, "broadcast"):
+        return
+
+    parts = (update.message.text or "").split(None, 1)
+    text = parts[1].strip() if len(parts) > 1 else ""
+    if not text:
+        await update.message.reply_text("Use: /broadcast your message ✅")
+        return
+    if not await require_default(update, "Broadcast"):
+        return  # users aren't split by persona yet
+    if broadcast.is_running():
+        await update.message.reply_text("A broadcast is already running 😅\nTry /broadcast_status")
+        return
+
+    bc_id = bot_db.create_broadcast(text, update.effective_chat.id)
+    msg = await update.message.reply_text(broadcast.format_progress(bot_db.get_broadcast(bc_id)))
+    bot_db.update_broadcast(bc_id, progress_msg_id=msg.message_id)
+    broadcast.start(context.bot, bc_id)
+
+
+async def cmd_broadcast_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await require_admin(update, "broadcast_status"):
+        return
+    bc = bot_db.latest_broadcast()
+    if not bc:
+        await update.message.reply_text("No broadcasts yet ✅")
+        return
+    await update.message.reply_text(broadcast.format_progress(bc))
+
+
+async def cmd_broadcast_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await require_admin(update, "broadcast_cancel"):
+        return
+    bc = bot_db.latest_broadcast()
+    if not bc or bc["status"] != "running":
+        await update.message.reply_text("Nothing running ✅")
+        return
+    broadcast.cancel(bc["id"])
+    await update.message.reply_text(f"Broadcast #{bc['id']} cancelled ✅")
+
+
+async def cmd_export(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await require_admin(update, "export"):
+        return
+
+    args = [a.lower() for a in (context.args or [])]
+    table = args[0] if args else ""
+    fmt = args[1] if len(args) > 1 else "jsonl"
+    if table not in export.TABLES or fmt not in export.FORMATS:
+        await update.message.reply_text(
+            f"Use: /export {'|'.join(export.TABLES)} [{'|'.join(export.FORMATS)}] ✅"
+        )
+        return
+
+    # users/events are shared by every bot; pairs are this bot's namespace
+    if table not in export.SCOPED and not await require_default(update, f"/export {table}"):
+        return
+    ns = personas.current().ns
+
+    # Streams to a gzip temp file in a worker thread, then uploads it
+    name = export.filename(table, fmt, True)
+    path = os.path.join(tempfile.gettempdir(), name)
+    try:
+        n, secs = await asyncio.to_thread(export.export_file, table, fmt, path, True, export.CHUNK, ns)
+        with open(path, "rb") as f:
+            await update.message.reply_document(f, filename=name, caption=f"{table}: {n} rows in {secs:.1f}s ✅")
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+async def cmd_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await require_admin(update, "stats"):
+        return
+    if not await require_default(update, "/stats"):
+        return
+    if context.args and context.args[0].lower() == "rebuild":
+        bot_db.rebuild_live_stats(await asyncio.to_thread(bot_db.count_live_stats))
+    s = live_stats.summary()
+
+    def fmt(counts):
+        return ", ".join(f"{k}={v}" for k, v in sorted(counts.items(), key=lambda kv: -kv[1])) or "-"
+
+    r1, r5 = s["rates"][60], s["rates"][300]
+    await update.message.reply_text(
+        "Stats ✅\n"
+        f"chats={s['chats']} pairs={s['totals']['pairs']}\n"
+        f"relationship: {fmt(s['counts']['relationship'])}\n"
+        f"mode: {fmt(s['counts']['mode'])}\n"
+        f"flirt: {fmt(s['counts']['flirt'])}\n"
+        f"safety (messages): {fmt(s['safety'])}\n"
+        f"messages={s['totals']['messages']}\n"
+        f"last 1m: {r1['messages']} msgs, {r1['chats']} active chats\n"
+        f"last 5m: {r5['per_min']:.1f} msgs/min, {r5['chats']} active chats"
+    )
+
+
+async def cmd_tiers(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await require_admin(update, "tiers"):
+        return
+    if not await require_default(update, "/tiers"):
+        return
+    ts = await asyncio.to_thread(bot_db.tier_stats)
+    await update.message.reply_text(
+        "Storage tiers ✅\n"
+        f"hot: rows={ts['hot_rows']} state={ts['hot_bytes'] / 1024:.0f}KB\n"
+        f"cold: rows={ts['cold_rows']} state={ts['cold_bytes'] / 1024:.0f}KB (zlib)\n"
+        f"lookups: hot={ts['hot_hits']} rehydrated={ts['cold_hits']} new={ts['new']} "
+        f"hit_rate={ts['hot_hit_rate'] * 100:.1f}%\n"
+        f"archived_this_run={ts['archived']}"
+    )
+
+
+async def cmd_topics(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await require_admin(update, "topics"):
+        return
+    chat_id = update.effective_chat.id
+
+    def fmt(items):
+        return "\n".join(f"{k}: {v:.2f}" for k, v in items) or "(none yet)"
+
+    await update.message.reply_text(
+        "Topics ✅\n\n"
+        f"All chats:\n{fmt(topics.top_global(10))}\n\n"
+        f"This chat:\n{fmt(topics.top_chat(chat_id, 5))}\n\n"
+        f"pending_writes={topics.pending()}"
+    )
+
+
+async def cmd_personas(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await require_admin(update, "personas"):
+        return
+    me = personas.current()
+    lines = ["Personas ✅"]
+    for p in personas.all():
+        if me is not personas.default() and p is not me:
+            continue  # only the default bot's admin sees every persona
+        m = p.metrics
+        lines.append(
+            f"{p.name}{' (default)' if p is personas.default() else ''}: "
+            f"updates={m['updates']} messages={m['messages']} replies={m['replies']} shed={m['shed']} "
+            f"sent={m['sent']} retry_after={m['retry_after']} pairs={count_pairs(p.ns)}"
+        )
+    await update.message.reply_text("\n".join(lines))
+
+
+async def _profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE, kind: str):
+    arg = context.args[0].lower() if context.args else ""
+    cur = profiler.running()
+    if arg == "stop":
+        if cur and cur["kind"] == kind and profiler.stop(kind):
+            await update.message.reply_text(f"Stopping {kind} profile, report coming ✅")
+        else:
+            await update.message.reply_text(f"No {kind} profile running ✅")
+        return
+    try:
+        seconds = float(arg) if arg else PROF_DEFAULT_S
+    except ValueError:
+        await update.message.reply_text(f"Use: /{kind}prof [seconds|stop] ✅")
+        return
+    if cur:
+        left = max(0, int(cur["started"] + cur["seconds"] - time.time()))
+        await update.message.reply_text(f"A {cur['kind']} profile is already running (~{left}s left) 😅")
+        return
+    seconds = profiler.start(context.bot, update.effective_chat.id, kind, seconds)
+    await update.message.reply_text(f"{kind} profile running for {seconds:.0f}s ✅\n/{kind}prof stop ends it early")
+
+
+async def cmd_cpuprof(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await require_admin(update, "cpuprof"):
+        return
+    if not await require_default(update, "/cpuprof"):
+        return
+    await _profile_command(update, context, "cpu")
+
+
+async def cmd_memprof(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await require_admin(update, "memprof"):
+        return
+    if not await require_default(update, "/memprof"):
+        return
+    await _profile_command(update, context, "mem")
+
+
 async def cmd_help_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await require_admin(update, "help_admin"):
         return
     await update.message.reply_text(
         "Admin Commands ✅\n\n"
         "/ping - test bot\n"
-        "/pause /resume\n"
+        "/pause /resume [all] - this bot (all: every bot)\n"
         "/teach_on /teach_off\n"
         "/mode playful|shy|romantic|soft|serious|auto\n"
         "/flirt_on /flirt_off\n"
@@ -670,6 +1077,16 @@ async def cmd_help_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "/reset_chat - reset this chat memory\n"
         "/clear_pairs - delete all taught pairs\n"
         "/reset_style - reset learned style profile\n"
+        "/maintenance [run <job>] - background job stats\n"
+        "/broadcast <text> - message every user\n"
+        "/broadcast_status /broadcast_cancel\n"
+        "/export users|pairs|events [jsonl|csv|columnar]\n"
+        "/topics - top topics (all chats + this chat)\n"
+        "/tiers - hot/cold storage sizes + hit rate\n"
+        "/stats [rebuild] - live chat/message aggregates\n"
+        "/personas - bots served by this process\n"
+        "/cpuprof [seconds|stop] - sample where CPU time goes\n"
+        "/memprof [seconds|stop] - top allocation sites + growth\n"
         "\n" + TRAIN_HELP
     )
 
@@ -681,10 +1098,77 @@ async def unknown_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Not allowed 😏")
 
 
-def main():
-    init_db()
+_live_apps = 0  # persona apps started in this process
+
+
+async def _post_init(app):
+    global _live_apps
+    persona = app.bot_data["persona"]
+
+    # Pair index loads (snapshot) or builds in the background while polling
+    # starts; find_pair falls back to a plain SQL scan until it's ready.
+    threading.Thread(target=warm_pair_index, args=(persona.ns,), name=f"pair-index-{persona.name}", daemon=True).start()
+
+    # Broadcasts interrupted by a restart continue from their checkpoint
+    if persona is personas.default():
+        broadcast.resume_all(app.bot)
+
+    # Backpressure monitor (degradation levels, see load_shed.py)
+    load_shed.start(app)
+
+    # Restart recovery: skip redelivered updates, send replies a crash left queued
+    outbox.load(app.bot.id)
+    outbox.start_drain(app.bot)
+
+    # Shared by every persona: started once
+    _live_apps += 1
+    if _live_apps == 1:
+        # Conversation summaries run in a worker pool, off the reply path
+        summarizer.start()
+
+
+async def _post_shutdown(app):
+    global _live_apps
+    _live_apps -= 1
+    if _live_apps > 0:
+        return  # other personas still running
+    await load_shed.stop()
+    await outbox.stop()
+    await profiler.shutdown()
+    leases.release_all()
+    await summarizer.stop()
+    topics.flush_all()
+    transcript.flush()
+    bot_db.checkpoint_live_stats(clean=True)
 
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+
+async def _bind_persona(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # runs first for every update: later handlers see this app's persona
+    persona = context.bot_data["persona"]
+    personas.use(persona)
+    persona.metrics["updates"] += 1
+
+
+async def _skip_handled(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Telegram redelivers what it sent just before a crash; those are done
+    if outbox.seen(context.bot.id, update.update_id):
+        context.bot_data["persona"].metrics["duplicates"] += 1
+        raise ApplicationHandlerStop
+
+
+async def _mark_handled(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # runs after the handlers; commands are written at once (a redelivered
+    # /broadcast would run twice), everything else by the flush job
+    msg = update.effective_message
+    is_cmd = bool(msg and msg.text and msg.text.startswith("/"))
+    outbox.handled(context.bot.id, update.update_id, persist=is_cmd)
+
+
+def register_handlers(app, persona: "personas.Persona" = None):
+    persona = persona or personas.default()
+    app.bot_data["persona"] = persona
+    app.add_handler(TypeHandler(Update, _bind_persona), group=-100)
+    app.add_handler(TypeHandler(Update, _skip_handled), group=-99)
 
     # Admin-only commands
     app.add_handler(CommandHandler("ping", cmd_ping))
@@ -709,13 +1193,92 @@ def main():
     app.add_handler(CommandHandler("clear_pairs", cmd_clear_pairs))
     app.add_handler(CommandHandler("reset_style", cmd_reset_style))
 
+    app.add_handler(CommandHandler("maintenance", cmd_maintenance))
+    app.add_handler(CommandHandler("broadcast", cmd_broadcast))
+    app.add_handler(CommandHandler("broadcast_status", cmd_broadcast_status))
+    app.add_handler(CommandHandler("broadcast_cancel", cmd_broadcast_cancel))
+    app.add_handler(CommandHandler("export", cmd_export))
+    app.add_handler(CommandHandler("topics", cmd_topics))
+    app.add_handler(CommandHandler("tiers", cmd_tiers))
+    app.add_handler(CommandHandler("stats", cmd_stats))
+    app.add_handler(CommandHandler("personas", cmd_personas))
+    app.add_handler(CommandHandler("cpuprof", cmd_cpuprof))
+    app.add_handler(CommandHandler("memprof", cmd_memprof))
+
     app.add_handler(CommandHandler("help_admin", cmd_help_admin))
 
     # Messages + unknown commands
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
     app.add_handler(MessageHandler(filters.COMMAND, unknown_command))
+    app.add_handler(TypeHandler(Update, _mark_handled), group=100)
+
+    # Background maintenance (flush, checkpoint, vacuum, prune, pairs): once per process
+    if persona is personas.default():
+        maintenance.schedule(app)
 
-    app.run_polling(close_loop=False)
+
+def build_app(persona: "personas.Persona", shared_limiter: RateLimiter = None, builder: ApplicationBuilder = None):
+    """One PTB Application per persona; storage, lexicons and caches are module-level and shared."""
+    limiter = BotRateLimiter(
+        RateLimiter(SEND_RATE_PER_BOT, burst=max(1, int(SEND_RATE_PER_BOT))),
+        shared_limiter,
+        metrics=persona.metrics,
+    )
+    builder = transport.apply(builder or ApplicationBuilder()).token(persona.token).rate_limiter(limiter)
+    builder = builder.post_init(_post_init).post_shutdown(_post_shutdown)
+    builder = builder.update_queue(load_shed.ReceiptQueue())   # receipt time = message age for load_shed
+    if CONCURRENT_UPDATES:
+        builder = builder.concurrent_updates(CONCURRENT_UPDATES)
+    app = builder.build()
+    register_handlers(app, persona)
+    return app
+
+
+async def serve_all(apps):
+    """run_polling for several apps on one event loop; stops on SIGINT/SIGTERM."""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (SIGINT, SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass  # Windows
+
+    started = []
+    try:
+        for app in apps:
+            await app.initialize()
+            started.append(app)
+            if app.post_init:
+                await app.post_init(app)
+            await app.updater.start_polling()
+            await app.start()
+        await stop.wait()
+    finally:
+        for app in reversed(started):
+            if app.updater.running:
+                await app.updater.stop()
+            if app.running:
+                await app.stop()
+            await app.shutdown()
+            if app.post_shutdown:
+                await app.post_shutdown(app)
+
+
+def main():
+    bots = personas.load()
+    if not os.path.exists(PERSONAS_FILE):
+        check_required()  # single bot from .env
+    personas.configure(bots)
+    init_db()
+    bot_db.load_live_stats()  # checkpoint after a clean shutdown, else a recount
+
+    shared = RateLimiter(SEND_RATE_GLOBAL, burst=max(1, int(SEND_RATE_GLOBAL))) if SEND_RATE_GLOBAL > 0 else None
+    apps = [build_app(p, shared) for p in bots]
+    if len(apps) == 1:
+        apps[0].run_polling(close_loop=False)
+    else:
+        asyncio.run(serve_all(apps))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,235 @@
+# maintenance.py
+import asyncio
+import threading
+import time
+from typing import Dict, Any, Callable, List, Tuple
+
+import bot_db
+import memory
+import pair_index
+from config import (
+    MAINT_FLUSH_S, MAINT_CHECKPOINT_S, MAINT_VACUUM_S, MAINT_PRUNE_S, MAINT_PAIRS_S, MAINT_ARCHIVE_S, MAINT_MIGRATE_S,
+    MAINT_SLICE_MS, MAINT_BUDGET_S, PRUNE_IDLE_DAYS, ARCHIVE_IDLE_DAYS, OUTBOX_MAX_AGE_S,
+)
+
+# A step does ONE small batch and returns (items_processed, more_left).
+# The runner sizes batches so a single step stays under MAINT_SLICE_MS,
+# and yields to the event loop between steps.
+Step = Callable[[int], Tuple[int, bool]]
+
+MIN_BATCH = 1
+MAX_BATCH = 5000
+
+_JOBS: Dict[str, Dict[str, Any]] = {}
+
+# name -> fn(limit) -> items flushed (write-behind caches register here)
+_FLUSH_HOOKS: Dict[str, Callable[[int], int]] = {}
+
+
+def register_job(name: str, step: Step, interval_s: float, batch: int = 100):
+    _JOBS[name] = {
+        "step": step,
+        "interval_s": float(interval_s),
+        "batch": int(batch),
+        "runs": 0,
+        "last_run": 0.0,
+        "last_ms": 0.0,
+        "last_items": 0,
+        "max_slice_ms": 0.0,
+        "total_items": 0,
+        "last_error": "",
+        "note": "",
+        "running": False,
+    }
+
+
+def add_flush_hook(name: str, fn: Callable[[int], int]):
+    _FLUSH_HOOKS[name] = fn
+
+
+def job_stats() -> Dict[str, Dict[str, Any]]:
+    return {n: {k: v for k, v in j.items() if k != "step"} for n, j in _JOBS.items()}
+
+
+async def run_job(name: str) -> Dict[str, Any]:
+    job = _JOBS[name]
+    if job["running"]:
+        return job
+    job["running"] = True
+
+    slice_s = MAINT_SLICE_MS / 1000.0
+    started = time.perf_counter()
+    deadline = started + MAINT_BUDGET_S
+    items = 0
+    max_slice = 0.0
+    job["last_error"] = ""
+
+    try:
+        while True:
+            t0 = time.perf_counter()
+            n, more = job["step"](job["batch"])
+            dt = time.perf_counter() - t0
+            items += n
+            max_slice = max(max_slice, dt)
+
+            # adapt batch size to the slice target
+            if dt > slice_s:
+                job["batch"] = max(MIN_BATCH, job["batch"] // 2)
+            elif dt < slice_s / 4:
+                job["batch"] = min(MAX_BATCH, job["batch"] * 2)
+
+            if not more or time.perf_counter() >= deadline:
+                break
+            await asyncio.sleep(0)
+    except Exception as e:
+        job["last_error"] = repr(e)[:200]
+    finally:
+        job["running"] = False
+
+    job["runs"] += 1
+    job["last_run"] = time.time()
+    job["last_ms"] = (time.perf_counter() - started) * 1000.0
+    job["last_items"] = items
+    job["total_items"] += items
+    job["max_slice_ms"] = max(job["max_slice_ms"], max_slice * 1000.0)
+    return job
+
+
+# -------------------------
+# Built-in job steps
+# -------------------------
+def _step_flush(limit: int) -> Tuple[int, bool]:
+    total = 0
+    more = False
+    for fn in list(_FLUSH_HOOKS.values()):
+        n = int(fn(limit) or 0)
+        total += n
+        more = more or n >= limit
+    return total, more
+
+
+# one database per step; PASSIVE copies only what it can without waiting,
+# and autocheckpoint keeps the WAL (so the copy) small between runs
+_CHECKPOINTS = (bot_db.wal_checkpoint, memory.wal_checkpoint)
+_checkpoint_next = 0
+
+
+def _step_checkpoint(limit: int) -> Tuple[int, bool]:
+    global _checkpoint_next
+    fn = _CHECKPOINTS[_checkpoint_next]
+    _checkpoint_next = (_checkpoint_next + 1) % len(_CHECKPOINTS)
+    return fn(), _checkpoint_next != 0
+
+
+def _step_vacuum(limit: int) -> Tuple[int, bool]:
+    if not bot_db.incremental_vacuum_enabled():
+        _JOBS["vacuum"]["note"] = "no-op until the file is converted (bot stopped: python migrate_state.py --vacuum)"
+        return 0, False
+    _JOBS["vacuum"]["note"] = ""
+    return bot_db.incremental_vacuum(limit)
+
+
+def _step_prune(limit: int) -> Tuple[int, bool]:
+    # queued replies nobody will send (bot removed from personas, too old)
+    n = bot_db.prune_outbox(time.time() - OUTBOX_MAX_AGE_S, limit)
+    if PRUNE_IDLE_DAYS > 0:
+        before = time.time() - PRUNE_IDLE_DAYS * 86400.0
+        n += bot_db.prune_idle_users(before, limit)
+        n += bot_db.prune_idle_members(before, limit)
+        n += memory.prune_idle(before, limit)
+    return n, n >= limit
+
+
+def _step_archive(limit: int) -> Tuple[int, bool]:
+    if ARCHIVE_IDLE_DAYS <= 0:
+        return 0, False
+    n = bot_db.archive_idle(time.time() - ARCHIVE_IDLE_DAYS * 86400.0, limit)
+    return n, n >= limit
+
+
+def _step_migrate(limit: int) -> Tuple[int, bool]:
+    return bot_db.migrate_rows(limit)
+
+
+_rebuild_thread = None
+
+
+def _rebuild_pending():
+    for ns, idx in pair_index.indexes().items():
+        if idx.ready() and idx.pending():
+            bot_db.rebuild_pair_index(ns=ns)
+
+
+def _start_pair_rebuild() -> bool:
+    """Folds each index's pending delta back in; builds off the event loop."""
+    global _rebuild_thread
+    if _rebuild_thread is not None and _rebuild_thread.is_alive():
+        return False
+    _rebuild_thread = threading.Thread(target=_rebuild_pending, name="pair-index", daemon=True)
+    _rebuild_thread.start()
+    return True
+
+
+def _step_pairs(limit: int) -> Tuple[int, bool]:
+    n = bot_db.compact_pairs(limit)
+    if n < limit:
+        bot_db.optimize()
+        if any(idx.ready() and idx.pending() for idx in pair_index.indexes().values()):
+            _start_pair_rebuild()
+    return n, n >= limit
+
+
+# live aggregates (/stats) checkpoint into meta alongside the other flushes
+add_flush_hook("live_stats", bot_db.checkpoint_live_stats)
+
+register_job("flush", _step_flush, MAINT_FLUSH_S, batch=200)
+register_job("checkpoint", _step_checkpoint, MAINT_CHECKPOINT_S)
+register_job("vacuum", _step_vacuum, MAINT_VACUUM_S, batch=64)
+register_job("prune", _step_prune, MAINT_PRUNE_S)
+register_job("pairs", _step_pairs, MAINT_PAIRS_S)
+register_job("archive", _step_archive, MAINT_ARCHIVE_S)
+register_job("migrate", _step_migrate, MAINT_MIGRATE_S, batch=200)
+
+
+# -------------------------
+# JobQueue wiring
+# -------------------------
+async def _job_callback(context):
+    await run_job(context.job.data)
+
+
+def schedule(app):
+    """
+    Registers every enabled job on PTB's JobQueue
+    (needs python-telegram-bot[job-queue]).
+    """
+    jq = app.job_queue
+    if jq is None:
+        return
+    for i, (name, job) in enumerate(_JOBS.items()):
+        if job["interval_s"] <= 0:
+            continue
+        # stagger first runs so jobs don't pile up at boot
+        jq.run_repeating(_job_callback, interval=job["interval_s"], first=10 + 5 * i, data=name, name=f"maint:{name}")
+
+
+def format_stats() -> str:
+    lines: List[str] = ["Maintenance ✅"]
+    for name, j in job_stats().items():
+        if j["interval_s"] <= 0:
+            lines.append(f"{name}: off")
+            continue
+        ago = f"{int(time.time() - j['last_run'])}s ago" if j["last_run"] else "never"
+        lines.append(
+            f"{name}: {ago}, {j['last_ms']:.1f}ms, items={j['last_items']} "
+            f"(total {j['total_items']}), runs={j['runs']}, max_slice={j['max_slice_ms']:.1f}ms"
+            + (f"\n  error={j['last_error']}" if j["last_error"] else "")
+            + (f"\n  note={j['note']}" if j["note"] else "")
+        )
+    for ns, idx in sorted(pair_index.indexes().items()):
+        pi = idx.stats()
+        lines.append(
+            f"pair_index{'[' + ns + ']' if ns else ''}: {'ready' if pi['ready'] else 'warming'} ({pi['source']}), "
+            f"entries={pi['entries']}, pending={pi['delta']}, build={pi['build_ms']}ms"
+        )
+    return "\n".join(lines)
@@ -5,16 +5,38 @@ import time
 from typing import Dict, Any, List, Optional
 
 DB_PATH = "memory.db"
-conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-conn.row_factory = sqlite3.Row
+
+# Opened on first use, not at import (keeps cold start cheap)
+_conn: Optional[sqlite3.Connection] = None
+_schema_ready = False
+
+
+def _db() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+        _conn.row_factory = sqlite3.Row
+        _conn.execute("PRAGMA journal_mode=WAL")
+    return _conn
 
 
 def _now() -> float:
     return time.time()
 
 
+def reader() -> sqlite3.Connection:
+    """Separate connection for long scans (exports) off the main one."""
+    ensure_schema()
+    c = sqlite3.connect(DB_PATH, check_same_thread=False)
+    c.row_factory = sqlite3.Row
+    return c
+
+
 def ensure_schema():
-    cur = conn.cursor()
+    global _schema_ready
+    if _schema_ready:
+        return
+    cur = _db().cursor()
     cur.execute("""
     CREATE TABLE IF NOT EXISTS users (
         chat_id INTEGER PRIMARY KEY,
@@ -27,7 +49,22 @@ def ensure_schema():
         summary TEXT
     )
     """)
-    conn.commit()
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_users_last_seen ON users(last_seen)")
+    cur.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    # both sides of every chat (transcript.py): recent turns one row each,
+    # older ones packed into segment rows by the compaction job
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS transcript (
+        chat_id INTEGER NOT NULL,
+        seq INTEGER NOT NULL,      -- turn number in the chat; a segment uses its last turn's
+        kind INTEGER NOT NULL,     -- transcript.USER / BOT / SEGMENT (+ZLIB flag)
+        ts INTEGER NOT NULL,
+        body BLOB NOT NULL,
+        PRIMARY KEY (chat_id, seq)
+    ) WITHOUT ROWID
+    """)
+    _db().commit()
+    _schema_ready = True
 
 
 # -------------------------
@@ -62,7 +99,7 @@ def _safe_json_dump(obj) -> str:
 
 def get_or_create_user(chat_id: int, username: str):
     ensure_schema()
-    cur = conn.cursor()
+    cur = _db().cursor()
     cur.execute("SELECT chat_id FROM users WHERE chat_id=?", (chat_id,))
     row = cur.fetchone()
     if not row:
@@ -80,24 +117,24 @@ def get_or_create_user(chat_id: int, username: str):
                 "",
             ),
         )
-        conn.commit()
+        _db().commit()
 
 
 def bump_user(chat_id: int, username: str):
     get_or_create_user(chat_id, username)
-    cur = conn.cursor()
+    cur = _db().cursor()
     cur.execute("""
     UPDATE users
     SET last_seen=?, interaction_count=interaction_count+1,
         username=COALESCE(NULLIF(?, ''), username)
     WHERE chat_id=?
     """, (_now(), username or "", chat_id))
-    conn.commit()
+    _db().commit()
 
 
 def get_user_state(chat_id: int) -> Dict[str, Any]:
     ensure_schema()
-    cur = conn.cursor()
+    cur = _db().cursor()
     cur.execute("SELECT user_state FROM users WHERE chat_id=?", (chat_id,))
     row = cur.fetchone()
     if not row:
@@ -112,21 +149,25 @@ def get_user_state(chat_id: int) -> Dict[str, Any]:
     return st
 
 
-def set_user_state(chat_id: int, state: Dict[str, Any]):
-    ensure_schema()
+def _fixed_user_state(state: Dict[str, Any]) -> Dict[str, Any]:
     # ensure defaults
     fixed = dict(DEFAULT_USER_STATE)
     fixed.update(state or {})
     if not isinstance(fixed.get("recent_events"), list):
         fixed["recent_events"] = []
-    cur = conn.cursor()
-    cur.execute("UPDATE users SET user_state=? WHERE chat_id=?", (_safe_json_dump(fixed), chat_id))
-    conn.commit()
+    return fixed
+
+
+def set_user_state(chat_id: int, state: Dict[str, Any]):
+    ensure_schema()
+    cur = _db().cursor()
+    cur.execute("UPDATE users SET user_state=? WHERE chat_id=?", (_safe_json_dump(_fixed_user_state(state)), chat_id))
+    _db().commit()
 
 
 def get_topic_weights(chat_id: int) -> Dict[str, float]:
     ensure_schema()
-    cur = conn.cursor()
+    cur = _db().cursor()
     cur.execute("SELECT topic_weights FROM users WHERE chat_id=?", (chat_id,))
     row = cur.fetchone()
     if not row:
@@ -137,14 +178,39 @@ def get_topic_weights(chat_id: int) -> Dict[str, float]:
 
 def set_topic_weights(chat_id: int, weights: Dict[str, float]):
     ensure_schema()
-    cur = conn.cursor()
+    cur = _db().cursor()
     cur.execute("UPDATE users SET topic_weights=? WHERE chat_id=?", (_safe_json_dump(weights or {}), chat_id))
-    conn.commit()
+    _db().commit()
+
+
+def set_topic_weights_many(rows: List[tuple], meta: Dict[str, Any] = None):
+    """
+    Batch write: rows of (chat_id, weights) plus optional meta keys,
+    one transaction.
+    """
+    ensure_schema()
+    db = _db()
+    with db:
+        db.executemany(
+            "UPDATE users SET topic_weights=? WHERE chat_id=?",
+            [(_safe_json_dump(w or {}), chat_id) for chat_id, w in rows],
+        )
+        for k, v in (meta or {}).items():
+            db.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+                (k, _safe_json_dump(v)),
+            )
+
+
+def get_meta(key: str, fallback=None):
+    ensure_schema()
+    row = _db().execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+    return _safe_json_load(row["value"], fallback) if row else fallback
 
 
 def get_summary(chat_id: int) -> str:
     ensure_schema()
-    cur = conn.cursor()
+    cur = _db().cursor()
     cur.execute("SELECT summary FROM users WHERE chat_id=?", (chat_id,))
     row = cur.fetchone()
     return (row["summary"] if row and row["summary"] else "") or ""
@@ -152,9 +218,9 @@ def get_summary(chat_id: int) -> str:
 
 def set_summary(chat_id: int, summary: str):
     ensure_schema()
-    cur = conn.cursor()
+    cur = _db().cursor()
     cur.execute("UPDATE users SET summary=? WHERE chat_id=?", ((summary or "").strip(), chat_id))
-    conn.commit()
+    _db().commit()
 
 
 # -------------------------
@@ -184,6 +250,29 @@ def add_event(
     st["last_user_intent"] = intent
     st["last_user_emotion"] = label
     set_user_state(chat_id, st)
+    return st
+
+
+def pending_events(st: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Events not yet folded into the summary."""
+    since = float(st.get("last_summary_ts") or 0.0)
+    return [ev for ev in st.get("recent_events", []) if isinstance(ev, dict) and float(ev.get("ts") or 0) > since]
+
+
+def mark_summarized(chat_id: int, summary: str, upto_ts: float):
+    """
+    Writes the summary and moves last_summary_ts in one UPDATE (one
+    commit), so a crash can't keep the folded summary with the old
+    timestamp, and events added meanwhile (ts > upto_ts) stay pending.
+    """
+    st = get_user_state(chat_id)
+    st["last_summary_ts"] = max(float(st.get("last_summary_ts") or 0.0), float(upto_ts))
+    cur = _db().cursor()
+    cur.execute(
+        "UPDATE users SET summary=?, user_state=? WHERE chat_id=?",
+        ((summary or "").strip(), _safe_json_dump(_fixed_user_state(st)), chat_id),
+    )
+    _db().commit()
 
 
 def get_recent_events(chat_id: int, limit: int = 5) -> List[Dict[str, Any]]:
@@ -203,10 +292,89 @@ def reset_memory(chat_id: int):
     (Does NOT touch bot.db taught pairs or style profile.)
     """
     ensure_schema()
-    cur = conn.cursor()
+    cur = _db().cursor()
     cur.execute("""
     UPDATE users
     SET user_state=?, topic_weights=?, summary=?
     WHERE chat_id=?
     """, (_safe_json_dump(dict(DEFAULT_USER_STATE)), _safe_json_dump({}), "", chat_id))
-    conn.commit()
+    cur.execute("DELETE FROM transcript WHERE chat_id=?", (chat_id,))
+    _db().commit()
+
+
+# -------------------------
+# Maintenance
+# -------------------------
+def wal_checkpoint() -> int:
+    row = _db().execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+    return int(row[2]) if row and row[2] and row[2] > 0 else 0
+
+
+def prune_idle(before_ts: float, limit: int) -> int:
+    ensure_schema()
+    ids = [(r[0],) for r in _db().execute(
+        "SELECT chat_id FROM users WHERE last_seen < ? LIMIT ?", (before_ts, max(1, int(limit)))
+    )]
+    db = _db()
+    with db:
+        db.executemany("DELETE FROM transcript WHERE chat_id=?", ids)
+        db.executemany("DELETE FROM users WHERE chat_id=?", ids)
+    return len(ids)
+
+
+# -------------------------
+# Transcript rows (encoding and compaction live in transcript.py)
+# -------------------------
+def append_turns(rows: List[tuple]):
+    """rows of (chat_id, ts, kind, body), one transaction; seq = chat's last + 1."""
+    ensure_schema()
+    db = _db()
+    with db:
+        db.executemany("""
+        INSERT INTO transcript (chat_id, seq, kind, ts, body)
+        SELECT ?, COALESCE(MAX(seq), 0) + 1, ?, ?, ? FROM transcript WHERE chat_id=?
+        """, [(chat_id, kind, ts, body, chat_id) for chat_id, ts, kind, body in rows])
+
+
+def read_turns(chat_id: int, limit: int) -> List[sqlite3.Row]:
+    """Newest rows first (a segment row counts as one); a range scan on the primary key."""
+    ensure_schema()
+    return _db().execute(
+        "SELECT seq, kind, ts, body FROM transcript WHERE chat_id=? ORDER BY seq DESC LIMIT ?",
+        (chat_id, max(1, int(limit))),
+    ).fetchall()
+
+
+def oldest_single_turns(chat_id: int, segment_kind: int, keep: int, limit: int) -> List[sqlite3.Row]:
+    """Up to `limit` oldest one-turn rows, if more than `keep` + `limit` of them exist."""
+    ensure_schema()
+    n = _db().execute(
+        "SELECT COUNT(*) FROM transcript WHERE chat_id=? AND kind & ? = 0", (chat_id, segment_kind)
+    ).fetchone()[0]
+    if n < keep + limit:
+        return []
+    return _db().execute(
+        "SELECT seq, kind, ts, body FROM transcript WHERE chat_id=? AND kind & ? = 0 ORDER BY seq LIMIT ?",
+        (chat_id, segment_kind, limit),
+    ).fetchall()
+
+
+def replace_with_segment(chat_id: int, seqs: List[int], seq: int, kind: int, ts: int, body: bytes):
+    db = _db()
+    with db:
+        db.executemany("DELETE FROM transcript WHERE chat_id=? AND seq=?", [(chat_id, s) for s in seqs])
+        db.execute("INSERT INTO transcript (chat_id, seq, kind, ts, body) VALUES (?, ?, ?, ?, ?)",
+                   (chat_id, seq, kind, ts, body))
+
+
+def trim_turns(chat_id: int, keep_turns: int) -> int:
+    """Ring retention: drops rows whose seq is more than keep_turns behind the newest."""
+    ensure_schema()
+    cur = _db().execute("""
+    DELETE FROM transcript WHERE chat_id=? AND seq <= (
+        SELECT MAX(seq) FROM transcript WHERE chat_id=?
+    ) - ?
+    """, (chat_id, chat_id, max(1, int(keep_turns))))
+    _db().commit()
+    return cur.rowcount or 0
+
@@ -0,0 +1,47 @@
+# migrate_state.py
+"""
+Offline state migration: upgrades every users row to bot_db.STATE_VERSION.
+
+  python migrate_state.py [--batch 1000] [--vacuum]
+
+Same batches as the "migrate" maintenance job, without the time budget.
+Safe to run while the bot is up (each batch is one short transaction).
+Cold-tier rows are upgraded when they're rehydrated.
+
+--vacuum also switches a database created before auto_vacuum=INCREMENTAL
+(the vacuum job is a no-op until then). That rewrites the whole file:
+stop the bot first.
+"""
+import argparse
+import sys
+import time
+
+import bot_db
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--batch", type=int, default=1000)
+    ap.add_argument("--vacuum", action="store_true", help="one-time full VACUUM to enable incremental vacuum")
+    args = ap.parse_args()
+
+    bot_db.init_db()
+    if args.vacuum:
+        t0 = time.perf_counter()
+        done = bot_db.vacuum_full()
+        print(f"vacuum: {'converted' if done else 'already incremental'} in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+    behind = bot_db.rows_behind()
+    print(f"state_version={bot_db.STATE_VERSION} rows_behind={behind}", file=sys.stderr)
+
+    t0 = time.perf_counter()
+    done = 0
+    more = behind > 0
+    while more:
+        n, more = bot_db.migrate_rows(args.batch)
+        done += n
+        print(f"\r{done}/{behind}", end="", file=sys.stderr)
+    print(f"\nmigrated {done} rows in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+# outbox.py
+# Crash-safe restarts.
+#
+# Replies: handle_message queues the reply (with its due time) before the
+# chat state is written and deletes it once Telegram has it. If the worker
+# dies while the reply sleeps in human_delay, drain() sends it on the next
+# start instead of the user never getting an answer. A crash between queue
+# and state write sends a reply whose turn wasn't saved: harmless.
+#
+# A row queued by a live handler is that handler's until it's sent. If the
+# send fails with a transient error (RetryAfter, timeout, network) or the
+# handler fails before it, the row goes to the per-bot drainer, which keeps
+# running and retries with backoff until OUTBOX_MAX_AGE_S. Only a success
+# or a permanent error (blocked, bad request) removes the row.
+#
+# Duplicates: Telegram redelivers updates that were fetched but not yet
+# confirmed when the worker died. The last handled update_id per bot is
+# kept in meta (written together with the queued reply, so a reply and
+# its update can't both come back), and skip() drops anything at or below
+# it before any handler runs. Telegram only keeps updates for 24h and may
+# restart update_ids after a quiet week, so older marks are ignored.
+# With CONCURRENT_UPDATES the mark is the highest id handled, not a
+# contiguous prefix: an update still in flight below it is not redone.
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import Any, Dict, Optional
+
+from telegram.error import BadRequest, NetworkError, RetryAfter
+
+import bot_db
+import maintenance
+from config import OUTBOX_MAX_AGE_S
+
+log = logging.getLogger(__name__)
+
+REDELIVERY_S = 86400   # Telegram keeps unconfirmed updates this long
+RETRY_MAX_S = 60       # backoff cap between attempts of one reply
+IDLE_POLL_S = 60       # drainer re-checks the table this often when idle
+
+_marks: Dict[int, int] = {}    # bot_id -> last handled update_id
+_dirty: Dict[int, int] = {}    # marks not written yet (flush hook)
+_drains: Dict[int, asyncio.Task] = {}
+_wake: Dict[int, asyncio.Event] = {}   # bot_id -> set when a row is handed to the drainer
+_owned: set = set()            # row ids a live handler is still going to send
+_attempts: Counter = Counter()  # row id -> failed sends
+_stats: Counter = Counter()    # queued / sent / drained / retried / dropped_stale / drain_failed / duplicates
+
+
+# -------------------------
+# Update marks
+# -------------------------
+def load(bot_id: int) -> int:
+    update_id, ts = bot_db.get_update_mark(bot_id)
+    if update_id and time.time() - ts > REDELIVERY_S:
+        update_id = 0
+    _marks[bot_id] = max(_marks.get(bot_id, 0), update_id)
+    return _marks[bot_id]
+
+
+def seen(bot_id: int, update_id: int) -> bool:
+    """True = already handled before a restart; skip it."""
+    if update_id <= _marks.get(bot_id, 0):
+        _stats["duplicates"] += 1
+        return True
+    return False
+
+
+def handled(bot_id: int, update_id: int, persist: bool = False):
+    """Move the mark; written now with persist, else by the maintenance flush."""
+    if update_id <= _marks.get(bot_id, 0):
+        return
+    _marks[bot_id] = update_id
+    if persist:
+        bot_db.set_update_mark(bot_id, update_id)
+        _dirty.pop(bot_id, None)
+    else:
+        _dirty[bot_id] = update_id
+
+
+def flush(limit: int = 0) -> int:
+    n = 0
+    for bot_id, update_id in list(_dirty.items()):
+        bot_db.set_update_mark(bot_id, update_id)
+        _dirty.pop(bot_id, None)
+        n += 1
+    return n
+
+
+# -------------------------
+# Replies
+# -------------------------
+def queue(bot_id: int, chat_id: int, text: str, due_ts: float,
+          reply_to: Optional[int] = None, update_id: Optional[int] = None) -> int:
+    if update_id is not None and update_id > _marks.get(bot_id, 0):
+        _marks[bot_id] = update_id
+        _dirty.pop(bot_id, None)
+    else:
+        update_id = None   # mark is already past it
+    _stats["queued"] += 1
+    msg_id = bot_db.outbox_add(bot_id, chat_id, text, due_ts, reply_to, update_id)
+    _owned.add(msg_id)
+    return msg_id
+
+
+def drop(msg_id: int):
+    """Failed for good (or too old): the row goes unsent."""
+    bot_db.outbox_done(msg_id)
+    _owned.discard(msg_id)
+    _attempts.pop(msg_id, None)
+
+
+def done(msg_id: int):
+    drop(msg_id)
+    _stats["sent"] += 1
+
+
+def transient(e: BaseException) -> bool:
+    # BadRequest is a NetworkError subclass in PTB but won't get better
+    return isinstance(e, RetryAfter) or (isinstance(e, NetworkError) and not isinstance(e, BadRequest))
+
+
+def _backoff(msg_id: int, e: BaseException) -> float:
+    _attempts[msg_id] += 1
+    if isinstance(e, RetryAfter):
+        ra = e.retry_after
+        return float(ra.total_seconds() if hasattr(ra, "total_seconds") else ra) + 0.5
+    return min(RETRY_MAX_S, 2.0 ** _attempts[msg_id])
+
+
+def release(bot_id: int, msg_id: int, e: Optional[BaseException] = None):
+    """The handler won't send it: the drainer does, after a backoff if e says so."""
+    _owned.discard(msg_id)
+    if e is not None:
+        bot_db.outbox_retry(msg_id, time.time() + _backoff(msg_id, e))
+        _stats["retried"] += 1
+    ev = _wake.get(bot_id)
+    if ev is not None:
+        ev.set()
+
+
+async def _send(bot, row: Dict[str, Any]):
+    kw: Dict[str, Any] = {}
+    if row["reply_to"]:
+        kw = {"reply_to_message_id": row["reply_to"], "allow_sending_without_reply": True}
+    await bot.send_message(row["chat_id"], row["text"], **kw)
+
+
+async def drain(bot):
+    """
+    Sends this bot's rows nobody else owns, each at its due time: what a
+    previous run left behind, then whatever handlers hand over. Runs until
+    cancelled.
+    """
+    wake = _wake.setdefault(bot.id, asyncio.Event())
+    while True:
+        wake.clear()
+        now = time.time()
+        rows = [r for r in bot_db.outbox_pending(bot.id) if r["id"] not in _owned]
+        due = [r for r in rows if r["due_ts"] <= now]
+        for row in due:
+            if now - row["created_ts"] > OUTBOX_MAX_AGE_S:
+                drop(row["id"])
+                _stats["dropped_stale"] += 1
+                continue
+            try:
+                await _send(bot, row)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if transient(e):
+                    bot_db.outbox_retry(row["id"], time.time() + _backoff(row["id"], e))
+                    _stats["retried"] += 1
+                    if isinstance(e, RetryAfter):
+                        break   # the whole bot is throttled; re-plan after the wait
+                    continue
+                _stats["drain_failed"] += 1
+                log.warning("outbox: dropping reply to %s: %s", row["chat_id"], e)
+                drop(row["id"])
+                continue
+            done(row["id"])
+            _stats["drained"] += 1
+        if due:
+            continue   # re-plan: due times moved, more may be waiting
+        later = [r["due_ts"] for r in rows]
+        timeout = min(later) - time.time() if later else IDLE_POLL_S
+        try:
+            await asyncio.wait_for(wake.wait(), timeout=max(0.05, min(timeout, IDLE_POLL_S)))
+        except asyncio.TimeoutError:
+            pass
+
+
+def start_drain(bot) -> asyncio.Task:
+    task = asyncio.get_running_loop().create_task(drain(bot), name=f"outbox:{bot.id}")
+    _drains[bot.id] = task
+    task.add_done_callback(lambda _t: _drains.pop(bot.id, None))
+    return task
+
+
+async def stop():
+    """Cancel drains (unsent rows stay for the next start) and write the marks."""
+    for task in list(_drains.values()):
+        task.cancel()
+    _wake.clear()
+    flush()
+
+
+def stats() -> Dict[str, Any]:
+    out = dict(_stats)
+    out["pending"] = bot_db.outbox_count()
+    out["draining"] = len(_drains)
+    return out
+
+
+maintenance.add_flush_hook("outbox", flush)
@@ -0,0 +1,351 @@
+# pair_index.py
+# In-memory matcher for learned pairs.
+#
+# find_pair semantics: the NEWEST pair whose key is a substring of the
+# lowercased user text wins. All keys go into one Aho-Corasick automaton,
+# flattened into int arrays, with the newest reachable pair precomputed per
+# state -> one pass over the text no matter how many pairs exist.
+#
+# The arrays + response blob are saved as a snapshot that boot can mmap and
+# use as-is (no rebuild, no table scan) when its signature matches the DB.
+import array
+import mmap
+import os
+import struct
+import sys
+import threading
+import zlib
+from bisect import bisect_left
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+MAGIC = b"EPIX"
+FORMAT_VERSION = 1
+# magic, version, byteorder, n_states, n_trans, n_entries, sig_gen, sig_max_id, crc32
+_HEADER = struct.Struct("<4sIIIIIqqI")
+_HEADER_SIZE = (_HEADER.size + 7) // 8 * 8
+_LITTLE = 1 if sys.byteorder == "little" else 0
+
+
+class _Automaton:
+    __slots__ = ("start", "chars", "nxt", "fail", "best", "resp_off", "blob", "n_entries", "_mm")
+
+    def __init__(self, start, chars, nxt, fail, best, resp_off, blob, n_entries, mm=None):
+        self.start = start
+        self.chars = chars
+        self.nxt = nxt
+        self.fail = fail
+        self.best = best
+        self.resp_off = resp_off
+        self.blob = blob
+        self.n_entries = n_entries
+        self._mm = mm
+
+    def _goto(self, s: int, c: int) -> int:
+        lo = self.start[s]
+        hi = self.start[s + 1]
+        if lo == hi:
+            return -1
+        i = bisect_left(self.chars, c, lo, hi)
+        if i < hi and self.chars[i] == c:
+            return self.nxt[i]
+        return -1
+
+    def match(self, text: str) -> int:
+        """Entry index of the newest key found in text, or -1."""
+        s = 0
+        found = -1
+        best = self.best
+        for ch in text:
+            c = ord(ch)
+            while True:
+                n = self._goto(s, c)
+                if n >= 0:
+                    s = n
+                    break
+                if s == 0:
+                    break
+                s = self.fail[s]
+            b = best[s]
+            if b > found:
+                found = b
+        return found
+
+    def response(self, entry: int) -> str:
+        a = self.resp_off[entry]
+        b = self.resp_off[entry + 1]
+        return bytes(self.blob[a:b]).decode("utf-8")
+
+
+def _build(rows: Iterable[Tuple[str, str]]) -> _Automaton:
+    """
+    rows: (key, response) oldest -> newest. Later keys shadow earlier ones.
+    Entry indexes are assigned oldest -> newest, so "newest" == max index.
+    """
+    latest: Dict[str, str] = {}
+    for k, r in rows:
+        if k:
+            latest.pop(k, None)
+            latest[k] = r  # re-insert keeps dict order == recency
+
+    goto: List[Dict[int, int]] = [{}]
+    out: List[int] = [-1]
+    blob = bytearray()
+    resp_off = array.array("q", [0])
+
+    for entry, (key, resp) in enumerate(latest.items()):
+        s = 0
+        for ch in key:
+            c = ord(ch)
+            n = goto[s].get(c)
+            if n is None:
+                n = len(goto)
+                goto[s][c] = n
+                goto.append({})
+                out.append(-1)
+            s = n
+        out[s] = entry
+        blob += resp.encode("utf-8")
+        resp_off.append(len(blob))
+
+    n_states = len(goto)
+    fail = array.array("i", [0]) * n_states
+    best = array.array("i", out)
+    q = deque(goto[0].values())
+    while q:
+        s = q.popleft()
+        for c, n in goto[s].items():
+            f = fail[s]
+            while f and c not in goto[f]:
+                f = fail[f]
+            fn = goto[f].get(c, 0)
+            fail[n] = fn if fn != n else 0
+            if best[fail[n]] > best[n]:
+                best[n] = best[fail[n]]
+            q.append(n)
+
+    start = array.array("i", [0])
+    chars = array.array("i")
+    nxt = array.array("i")
+    for s in range(n_states):
+        for c in sorted(goto[s]):
+            chars.append(c)
+            nxt.append(goto[s][c])
+        start.append(len(chars))
+
+    return _Automaton(start, chars, nxt, fail, best, resp_off, bytes(blob), len(latest))
+
+
+_EMPTY = _build(())
+
+
+# -------------------------
+# Snapshot file
+# -------------------------
+def save_snapshot(path: str, auto: _Automaton, signature: Tuple[int, int]):
+    payload = [
+        auto.start.tobytes(), auto.chars.tobytes(), auto.nxt.tobytes(),
+        auto.fail.tobytes(), auto.best.tobytes(), auto.resp_off.tobytes(),
+    ]
+    crc = 0
+    for p in payload:
+        crc = zlib.crc32(p, crc)
+    crc = zlib.crc32(auto.blob, crc)
+
+    header = _HEADER.pack(
+        MAGIC, FORMAT_VERSION, _LITTLE,
+        len(auto.fail), len(auto.chars), auto.n_entries,
+        int(signature[0]), int(signature[1]), crc,
+    ).ljust(_HEADER_SIZE, b"\0")
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        for p in payload:
+            f.write(p)
+            f.write(b"\0" * (-len(p) % 8))  # keep every array 8-byte aligned
+        f.write(auto.blob)
+    os.replace(tmp, path)
+
+
+def load_snapshot(path: str, signature: Tuple[int, int], verify_crc: bool = True) -> Optional[_Automaton]:
+    """
+    Maps the snapshot and returns an automaton whose arrays are views into
+    the mapping (zero-copy). None if missing, stale or damaged: a file cut
+    short is caught by its length, anything else by the CRC (one pass over
+    the file, skip with verify_crc=False only for trusted files).
+    """
+    try:
+        f = open(path, "rb")
+    except OSError:
+        return None
+    with f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            return None
+
+    try:
+        magic, ver, little, n_states, n_trans, n_entries, gen, max_id, crc = _HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or ver != FORMAT_VERSION or little != _LITTLE:
+            raise ValueError("format")
+        if (gen, max_id) != tuple(int(x) for x in signature):
+            raise ValueError("stale")
+
+        view = memoryview(mm)
+        pos = _HEADER_SIZE
+        parts = []
+        for count, code, size in (
+            (n_states + 1, "i", 4), (n_trans, "i", 4), (n_trans, "i", 4),
+            (n_states, "i", 4), (n_states, "i", 4), (n_entries + 1, "q", 8),
+        ):
+            nbytes = count * size
+            if pos + nbytes > len(view):
+                raise ValueError("truncated")
+            parts.append(view[pos:pos + nbytes].cast(code))
+            pos += nbytes + (-nbytes % 8)
+        blob = view[pos:]
+
+        if verify_crc:
+            c = 0
+            p = _HEADER_SIZE
+            for part in parts:
+                c = zlib.crc32(view[p:p + part.nbytes], c)
+                p += part.nbytes + (-part.nbytes % 8)
+            if zlib.crc32(blob, c) != crc:
+                raise ValueError("crc")
+
+        start, chars, nxt, fail, best, resp_off = parts
+        return _Automaton(start, chars, nxt, fail, best, resp_off, blob, n_entries, mm)
+    except Exception:
+        try:
+            mm.close()
+        except BufferError:
+            pass  # views still alive; the mapping goes away with them
+        return None
+
+
+# -------------------------
+# Live index (one per pair namespace; "" is the default persona)
+# -------------------------
+version = 0   # bumps on every change in any namespace (cache invalidation)
+
+
+class LiveIndex:
+    def __init__(self, ns: str = ""):
+        self.ns = ns
+        self._lock = threading.Lock()
+        self._auto: Optional[_Automaton] = None     # None = not ready yet (caller falls back to SQL)
+        self._delta: List[Tuple[int, str, str]] = []  # (pair_id, key, response) added after the build, newest last
+        self._stats: Dict[str, Any] = {"source": "none", "entries": 0, "delta": 0, "build_ms": 0.0}
+        self._epoch = 0                             # bumps on clear (drops in-flight rebuilds)
+
+    def ready(self) -> bool:
+        return self._auto is not None
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self._stats, delta=len(self._delta), ready=self.ready())
+
+    def epoch(self) -> int:
+        return self._epoch
+
+    def install(self, auto: _Automaton, source: str, build_ms: float = 0.0, upto_id: int = None, expect_epoch: int = None) -> bool:
+        """
+        Swap in a new automaton. Delta pairs newer than upto_id (the max pair id
+        the build saw) are kept; None drops the whole delta.
+        A build started before a clear() is discarded (expect_epoch).
+        """
+        global version
+        with self._lock:
+            if expect_epoch is not None and expect_epoch != self._epoch:
+                return False
+            self._auto = auto
+            if upto_id is None:
+                self._delta.clear()
+            else:
+                self._delta[:] = [d for d in self._delta if d[0] > upto_id]
+            version += 1
+            self._stats.update(source=source, entries=auto.n_entries, build_ms=round(build_ms, 1))
+        return True
+
+    def add(self, pair_id: int, key: str, response: str):
+        global version
+        with self._lock:
+            self._delta.append((int(pair_id), key, response))
+            version += 1
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+        self.install(_EMPTY, "empty")
+
+    def match(self, text: str) -> Optional[str]:
+        """
+        None if nothing matched. Only valid when ready().
+        """
+        t = (text or "").lower()
+        with self._lock:
+            for _, k, r in reversed(self._delta):
+                if k in t:
+                    return r
+            auto = self._auto
+        if auto is None:
+            return None
+        e = auto.match(t)
+        return auto.response(e) if e >= 0 else None
+
+    def pending(self) -> int:
+        return len(self._delta)
+
+
+_indexes: Dict[str, LiveIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get(ns: str = "") -> LiveIndex:
+    idx = _indexes.get(ns)
+    if idx is None:
+        with _indexes_lock:
+            idx = _indexes.setdefault(ns, LiveIndex(ns))
+    return idx
+
+
+def indexes() -> Dict[str, LiveIndex]:
+    return dict(_indexes)
+
+
+def build(rows: Iterable[Tuple[str, str]]) -> _Automaton:
+    return _build(rows)
+
+
+# default namespace shortcuts (single-persona callers)
+def ready() -> bool:
+    return get().ready()
+
+
+def stats() -> Dict[str, Any]:
+    return get().stats()
+
+
+def epoch() -> int:
+    return get().epoch()
+
+
+def install(auto: _Automaton, source: str, build_ms: float = 0.0, upto_id: int = None, expect_epoch: int = None) -> bool:
+    return get().install(auto, source, build_ms, upto_id, expect_epoch)
+
+
+def add(pair_id: int, key: str, response: str):
+    get().add(pair_id, key, response)
+
+
+def clear():
+    get().clear()
+
+
+def match(text: str) -> Optional[str]:
+    return get().match(text)
+
+
+def pending() -> int:
+    return get().pending()
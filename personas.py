@@ -0,0 +1,107 @@
+# personas.py
+# Several bots (personas) served by one process. Each has its own token,
+# admin, style profile overrides and pair namespace; everything else
+# (event loop, SQLite connections, lexicons, caches, outbound limiter) is
+# shared. Without a personas file there is one persona built from .env.
+#
+# personas.json:
+#   [
+#     {"name": "ellena", "token": "env:BOT_TOKEN", "admin_id": 123},
+#     {"name": "mira", "token": "env:MIRA_TOKEN", "admin_id": 456,
+#      "profile": {"emoji_level": 0.3, "tease_level": 0.2}}
+#   ]
+# The first entry is the default persona: its pairs/profile are the ones a
+# single-bot install already has (namespace ""). Others use their name.
+import json
+import os
+import re
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from config import BOT_TOKEN, ADMIN_ID, PERSONAS_FILE
+
+
+class Persona:
+    __slots__ = ("name", "token", "admin_id", "ns", "profile", "metrics", "paused")
+
+    def __init__(self, name: str, token: str, admin_id: int, ns: str = "", profile: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.token = token
+        self.admin_id = int(admin_id or 0)
+        self.ns = ns                       # pair / profile namespace
+        self.profile = dict(profile or {})  # DEFAULT_PROFILE overrides
+        self.metrics: Counter = Counter()   # updates / messages / replies / sent / retry_after ...
+        self.paused = False                 # /pause: this bot stops replying (admins can still command)
+
+    def __repr__(self):
+        return f"Persona({self.name!r}, ns={self.ns!r})"
+
+
+_NS_RE = re.compile(r"^[a-z0-9_]{1,32}$")
+
+
+def _token(v: str) -> str:
+    v = (v or "").strip()
+    return os.getenv(v[4:], "").strip() if v.startswith("env:") else v
+
+
+def parse(entries: List[Dict[str, Any]]) -> List[Persona]:
+    out: List[Persona] = []
+    seen = set()
+    for i, e in enumerate(entries):
+        name = str(e.get("name") or f"bot{i}").strip().lower()
+        ns = "" if i == 0 else name
+        if ns and not _NS_RE.match(ns):
+            raise ValueError(f"persona name {name!r}: use a-z, 0-9, _ (max 32)")
+        if name in seen:
+            raise ValueError(f"duplicate persona {name!r}")
+        seen.add(name)
+        token = _token(e.get("token", ""))
+        if not token:
+            raise ValueError(f"persona {name!r} has no token")
+        if not e.get("admin_id"):
+            raise ValueError(f"persona {name!r} has no admin_id")
+        out.append(Persona(name, token, int(e.get("admin_id") or 0), ns, e.get("profile")))
+    return out
+
+
+def load(path: str = PERSONAS_FILE) -> List[Persona]:
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            entries = json.load(f)
+        if not isinstance(entries, list) or not entries:
+            raise ValueError(f"{path}: expected a non-empty list of personas")
+        return parse(entries)
+    return [Persona("default", BOT_TOKEN, ADMIN_ID)]
+
+
+_all: List[Persona] = []
+_current: ContextVar[Optional[Persona]] = ContextVar("persona", default=None)
+
+
+def configure(personas: List[Persona]):
+    _all[:] = personas
+
+
+def all() -> List[Persona]:
+    if not _all:
+        _all.append(Persona("default", BOT_TOKEN, ADMIN_ID))
+    return list(_all)
+
+
+def default() -> Persona:
+    return all()[0]
+
+
+def current() -> Persona:
+    """Persona of the update being handled (set per update by main's bind handler)."""
+    return _current.get() or default()
+
+
+def use(persona: Persona):
+    _current.set(persona)
+
+
+def stats() -> Dict[str, Dict[str, int]]:
+    return {p.name: dict(p.metrics) for p in all()}
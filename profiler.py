@@ -0,0 +1,348 @@
+# profiler.py
+# On-demand profiling for /cpuprof and /memprof, without a redeploy.
+#
+# CPU: a daemon thread wakes every PROF_INTERVAL_MS and reads every other
+# thread's Python stack (sys._current_frames). A sample whose innermost
+# frame is a known wait (selector, Event/Condition, queue) counts as idle
+# and is left out of the tables. The rest give self time (innermost
+# function) and cumulative time (anywhere on the stack), as % of the
+# window's wall time. The uploaded file holds the collapsed stacks
+# ("thread;outer;...;inner count"), which flamegraph.pl / speedscope read.
+# The sampler can only look while it holds the GIL, and by default gets it
+# when the loop blocks in select(), which makes a busy loop look idle; the
+# switch interval is lowered for the window so it gets a fair share. It
+# measures its own CPU time and backs off (doubles the interval) while
+# that is above PROF_MAX_OVERHEAD of the window.
+#
+# Memory: tracemalloc is on only for the window, with PROF_MEM_FRAMES
+# frames per traceback. Every allocation gets slower while it runs (tens
+# of times on allocation-heavy code), so keep windows short. Snapshots at
+# the start and end give the biggest live allocation sites (blocks
+# allocated during the window and still alive) and the sites that grew.
+#
+# One profile runs at a time per process (all personas share it), for at
+# most PROF_MAX_S / PROF_MEM_MAX_S, and ends early once load_shed goes to
+# PROF_SHED_LEVEL or above. The result goes to the chat that asked.
+import asyncio
+import io
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import load_shed
+from config import (
+    PROF_MAX_S, PROF_MEM_MAX_S, PROF_INTERVAL_MS, PROF_MAX_OVERHEAD, PROF_MEM_FRAMES, PROF_TOP, PROF_SHED_LEVEL,
+)
+
+log = logging.getLogger(__name__)
+
+MAX_DEPTH = 64              # frames kept per sampled stack (innermost ones)
+MAX_INTERVAL_S = 1.0        # backoff stops here
+SWITCH_S = 0.0002           # GIL switch interval while sampling (default 0.005)
+FILE_TOP = 200              # rows per table in the uploaded memory report
+
+# (file basename, function) whose frame on top means the thread is waiting
+_IDLE = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+# frames under every sample of their thread; kept in the file, not in the tables
+_SCAFFOLD = {
+    ("base_events.py", "run_forever"),
+    ("base_events.py", "run_until_complete"),
+    ("base_events.py", "_run_once"),
+    ("events.py", "_run"),
+    ("runners.py", "run"),
+    ("threading.py", "_bootstrap"),
+    ("threading.py", "_bootstrap_inner"),
+    ("threading.py", "run"),
+    ("thread.py", "run"),
+    ("thread.py", "_worker"),
+}
+
+_session: Optional[Dict[str, Any]] = None   # kind, started, seconds, chat_id, stop (asyncio.Event), task
+
+
+# -------------------------
+# CPU sampler
+# -------------------------
+class _Sampler(threading.Thread):
+    def __init__(self, interval_s: float):
+        super().__init__(name="cpuprof", daemon=True)
+        self.interval_s = interval_s
+        self.halt = threading.Event()
+        self.stacks: Counter = Counter()    # (thread, outer, ..., inner) -> samples
+        self.idle: Counter = Counter()      # thread -> idle samples
+        self.ticks = 0
+        self.backoffs = 0
+        self.cost_s = 0.0
+        self.elapsed_s = 0.0
+        self.scaffold: set = set()          # labels left out of the tables
+        self._labels: Dict[Any, Tuple[str, bool]] = {}   # code -> (label, is_idle)
+
+    def _label(self, code) -> Tuple[str, bool]:
+        hit = self._labels.get(code)
+        if hit is None:
+            base = os.path.basename(code.co_filename)
+            name = getattr(code, "co_qualname", code.co_name)
+            hit = self._labels[code] = (f"{name} ({base}:{code.co_firstlineno})", (base, code.co_name) in _IDLE)
+            if (base, code.co_name) in _SCAFFOLD or code.co_name == "<module>":
+                self.scaffold.add(hit[0])
+        return hit
+
+    def _sample(self, me: int):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for tid, frame in sys._current_frames().items():
+            if tid == me:
+                continue
+            thread = names.get(tid, f"thread-{tid}")
+            label, idle = self._label(frame.f_code)
+            if idle:
+                self.idle[thread] += 1
+                continue
+            stack = [label]
+            frame = frame.f_back
+            while frame is not None and len(stack) < MAX_DEPTH:
+                stack.append(self._label(frame.f_code)[0])
+                frame = frame.f_back
+            stack.append(thread)
+            stack.reverse()
+            self.stacks[tuple(stack)] += 1
+
+    def run(self):
+        me = threading.get_ident()
+        started = time.perf_counter()
+        while not self.halt.wait(self.interval_s):
+            t0 = time.thread_time()
+            self._sample(me)
+            self.cost_s += time.thread_time() - t0
+            self.ticks += 1
+            now = time.perf_counter()
+            # guardrail: the sampler holds the GIL while it walks stacks
+            if self.cost_s > PROF_MAX_OVERHEAD * (now - started) and self.interval_s < MAX_INTERVAL_S:
+                self.interval_s = min(MAX_INTERVAL_S, self.interval_s * 2)
+                self.backoffs += 1
+        self.elapsed_s = time.perf_counter() - started
+
+
+def _cpu_report(s: _Sampler, top: int = PROF_TOP) -> Tuple[str, bytes]:
+    self_t: Counter = Counter()
+    cum: Counter = Counter()
+    busy: Counter = Counter()
+    for stack, n in s.stacks.items():
+        busy[stack[0]] += n
+        self_t[stack[-1]] += n
+        for label in set(stack[1:]) - s.scaffold:
+            cum[label] += n
+    ticks = max(1, s.ticks)
+
+    def table(c: Counter) -> List[str]:
+        return [f"{n * 100.0 / ticks:5.1f}%  {label}" for label, n in c.most_common(top)] or ["(no busy samples)"]
+
+    overhead = s.cost_s / s.elapsed_s * 100.0 if s.elapsed_s else 0.0
+    threads = ", ".join(
+        f"{t} {busy[t] * 100.0 / ticks:.0f}%" for t in sorted(set(busy) | set(s.idle), key=lambda t: -busy[t])
+    )
+    lines = [
+        f"CPU profile ✅ {s.elapsed_s:.1f}s, {s.ticks} samples, every {s.interval_s * 1000:.0f}ms "
+        f"(overhead {overhead:.1f}%{f', backed off x{s.backoffs}' if s.backoffs else ''})",
+        f"busy: {threads or '-'}",
+        "",
+        "Top self (% of wall time):",
+        *table(self_t),
+        "",
+        "Top cumulative:",
+        *table(cum),
+    ]
+    folded = "".join(f"{';'.join(stack)} {n}\n" for stack, n in s.stacks.most_common())
+    return "\n".join(lines), folded.encode("utf-8")
+
+
+# -------------------------
+# Memory (tracemalloc)
+# -------------------------
+def _snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    ))
+
+
+def _site(frame) -> str:
+    return f"{frame.filename}:{frame.lineno}"
+
+
+def _kb(n: int) -> str:
+    return f"{n / 1024:,.1f}KB"
+
+
+def _mem_report(first: tracemalloc.Snapshot, last: tracemalloc.Snapshot, seconds: float,
+                overhead: int, top: int = PROF_TOP) -> Tuple[str, bytes]:
+    by_size = last.statistics("lineno")
+    growth = [d for d in last.compare_to(first, "lineno") if d.size_diff > 0]
+    growth.sort(key=lambda d: -d.size_diff)
+    total = sum(st.size for st in by_size)
+
+    def size_rows(stats, n):
+        return [f"{_kb(st.size):>11} {st.count:>7} blocks  {_site(st.traceback[0])}" for st in stats[:n]]
+
+    def growth_rows(stats, n):
+        return [
+            f"{'+' + _kb(d.size_diff):>11} {d.count_diff:>+7} blocks  {_site(d.traceback[0])}" for d in stats[:n]
+        ]
+
+    head = (
+        f"Memory profile ✅ {seconds:.1f}s, {_kb(total)} allocated in the window and still alive "
+        f"(tracemalloc itself: {_kb(overhead)})"
+    )
+    summary = "\n".join([
+        head, "",
+        "Top sites by size:", *(size_rows(by_size, top) or ["(none)"]), "",
+        "Top growth:", *(growth_rows(growth, top) or ["(none)"]),
+    ])
+
+    out = io.StringIO()
+    out.write(head + "\n\n")
+    out.write(f"== Top {FILE_TOP} sites by size ==\n")
+    out.write("\n".join(size_rows(by_size, FILE_TOP)) + "\n\n")
+    out.write(f"== Top {FILE_TOP} sites by growth ==\n")
+    out.write("\n".join(growth_rows(growth, FILE_TOP)) + "\n\n")
+    if tracemalloc.get_traceback_limit() > 1:
+        out.write(f"== Top growth by traceback ({tracemalloc.get_traceback_limit()} frames) ==\n")
+        tb_growth = sorted(
+            (d for d in last.compare_to(first, "traceback") if d.size_diff > 0), key=lambda d: -d.size_diff
+        )
+        for d in tb_growth[:top]:
+            out.write(f"\n+{_kb(d.size_diff)} in {d.count_diff:+} blocks\n")
+            out.write("\n".join(d.traceback.format(most_recent_first=True)) + "\n")
+    return summary, out.getvalue().encode("utf-8")
+
+
+# -------------------------
+# Sessions
+# -------------------------
+def _clamp(kind: str, seconds: float) -> float:
+    cap = PROF_MAX_S if kind == "cpu" else PROF_MEM_MAX_S
+    return max(1.0, min(float(seconds), cap))
+
+
+async def _wait(sess: Dict[str, Any]) -> str:
+    """Sleeps out the window; returns why it ended early ("" if it didn't)."""
+    end = time.monotonic() + sess["seconds"]
+    while True:
+        left = end - time.monotonic()
+        if left <= 0:
+            return ""
+        try:
+            await asyncio.wait_for(sess["stop"].wait(), timeout=min(1.0, left))
+            return "stopped"
+        except asyncio.TimeoutError:
+            pass
+        if load_shed.level() >= PROF_SHED_LEVEL:
+            return f"load {load_shed.LEVELS[load_shed.level()]}"
+
+
+async def _profile_cpu(sess: Dict[str, Any]) -> Tuple[str, bytes]:
+    s = _Sampler(max(0.001, PROF_INTERVAL_MS / 1000.0))
+    switch = sys.getswitchinterval()
+    sys.setswitchinterval(min(switch, SWITCH_S))
+    s.start()
+    try:
+        sess["why"] = await _wait(sess)
+    finally:
+        s.halt.set()
+        await asyncio.to_thread(s.join)
+        sys.setswitchinterval(switch)
+    return await asyncio.to_thread(_cpu_report, s)
+
+
+async def _profile_mem(sess: Dict[str, Any]) -> Tuple[str, bytes]:
+    # someone may be tracing already (PYTHONTRACEMALLOC): leave it running then
+    owned = not tracemalloc.is_tracing()
+    if owned:
+        tracemalloc.start(max(1, PROF_MEM_FRAMES))
+    try:
+        t0 = time.perf_counter()
+        first = await asyncio.to_thread(_snapshot)
+        sess["why"] = await _wait(sess)
+        last = await asyncio.to_thread(_snapshot)
+        seconds = time.perf_counter() - t0
+        overhead = tracemalloc.get_tracemalloc_memory()
+    finally:
+        if owned:
+            tracemalloc.stop()
+    return await asyncio.to_thread(_mem_report, first, last, seconds, overhead)
+
+
+async def run(bot, chat_id: int, kind: str, seconds: float):
+    global _session
+    sess = _session
+    try:
+        summary, data = await (_profile_cpu(sess) if kind == "cpu" else _profile_mem(sess))
+        name = time.strftime(f"{kind}prof-%Y%m%d-%H%M%S") + (".folded" if kind == "cpu" else ".txt")
+        if sess.get("why", "").startswith("load"):
+            summary = f"(ended early: {sess['why']})\n{summary}"
+        await bot.send_message(chat_id, summary[:4000])
+        if data:   # Telegram refuses empty files
+            await bot.send_document(chat_id, data, filename=name)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        log.exception("%s profile failed", kind)
+        await bot.send_message(chat_id, f"{kind} profile failed: {e!r} 😅"[:4000])
+    finally:
+        if _session is sess:
+            _session = None
+
+
+def start(bot, chat_id: int, kind: str, seconds: float) -> float:
+    """Starts a profile that reports to chat_id when done; returns the window. Caller checks running()."""
+    global _session
+    seconds = _clamp(kind, seconds)
+    _session = {"kind": kind, "started": time.time(), "seconds": seconds, "chat_id": chat_id,
+                "stop": asyncio.Event()}
+    _session["task"] = asyncio.get_running_loop().create_task(
+        run(bot, chat_id, kind, seconds), name=f"profile:{kind}"
+    )
+    return seconds
+
+
+def running() -> Optional[Dict[str, Any]]:
+    """The active session (kind, started, seconds, chat_id), or None."""
+    if _session is None or _session["task"].done():
+        return None
+    return {k: _session[k] for k in ("kind", "started", "seconds", "chat_id")}
+
+
+def stop(kind: str) -> bool:
+    """Ends the window early; the report is still sent."""
+    if _session is None or _session["kind"] != kind:
+        return False
+    _session["stop"].set()
+    return True
+
+
+async def shutdown():
+    """Drops a running profile without reporting (the bot is going away)."""
+    global _session
+    sess = _session
+    if sess is None:
+        return
+    sess["task"].cancel()
+    try:
+        await sess["task"]
+    except (asyncio.CancelledError, Exception):
+        pass
+    _session = None
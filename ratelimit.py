@@ -0,0 +1,92 @@
+# ratelimit.py
+import asyncio
+import time
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+
+class RateLimiter:
+    """
+    Async token bucket. Waiters are served in arrival order.
+    pause() blocks everyone for a while (e.g. after a 429 / RetryAfter).
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = max(0.001, float(rate))
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        self._blocked_until = max(self._blocked_until, time.monotonic() + float(seconds))
+        self._tokens = 0.0
+
+
+# -------------------------
+# PTB outbound limiter (ApplicationBuilder().rate_limiter(...))
+# -------------------------
+# Bot API calls that count against flood limits
+LIMITED_PREFIXES = ("send", "edit", "copy", "forward")
+
+
+class BotRateLimiter(BaseRateLimiter):
+    """
+    One per bot: its own bucket, plus an optional bucket shared by every
+    bot in the process. On RetryAfter only this bot's bucket is paused and
+    the call is retried (max_retries, or the per-call rate_limit_args).
+    """
+
+    def __init__(self, per_bot: RateLimiter, shared: RateLimiter = None, max_retries: int = 1, metrics=None):
+        self.per_bot = per_bot
+        self.shared = shared
+        self.max_retries = max(0, int(max_retries))
+        self.metrics = metrics  # Counter: sent / retry_after
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        if not endpoint.startswith(LIMITED_PREFIXES):
+            return await callback(*args, **kwargs)
+        retries = rate_limit_args if isinstance(rate_limit_args, int) else self.max_retries
+        attempt = 0
+        while True:
+            if self.shared is not None:
+                await self.shared.acquire()
+            await self.per_bot.acquire()
+            try:
+                result = await callback(*args, **kwargs)
+                if self.metrics is not None:
+                    self.metrics["sent"] += 1
+                return result
+            except RetryAfter as e:
+                if self.metrics is not None:
+                    self.metrics["retry_after"] += 1
+                delay = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else float(e.retry_after)
+                self.per_bot.pause(delay)
+                attempt += 1
+                if attempt > retries:
+                    raise
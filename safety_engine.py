@@ -1,20 +1,9 @@
 # safety_engine.py
-import re
 from typing import Dict, Any
 
-# Same list as main.py (keep consistent)
-EXPLICIT_WORDS = {"fuck", "pussy", "dick", "blowjob", "cum", "nude", "naked", "sex"}
-
-# Optional: extra harassment / aggressive slurs gate (keep small + generic)
-HARASS_WORDS = {"bitch", "slut", "whore"}  # keep minimal; you can expand later
-
-
-def _has_word(text: str, wordset) -> bool:
-    raw = (text or "").lower()
-    for w in wordset:
-        if re.search(rf"\b{re.escape(w)}\b", raw):
-            return True
-    return False
+# Wordlists live in lexicon/safety/<category>.txt (explicit, harass, ...)
+# and are compiled once into a single matcher.
+import analysis_cache
 
 
 def evaluate_safety(user_text: str, state: Dict[str, Any], signal: Dict[str, Any]) -> Dict[str, Any]:
@@ -28,7 +17,6 @@ def evaluate_safety(user_text: str, state: Dict[str, Any], signal: Dict[str, Any
     Also updates state["negative_loop_score"] in-place.
     """
     raw = (user_text or "").strip()
-    t = raw.lower()
 
     tension = float(signal.get("tension", 0.15))
     rel = state.get("relationship", "warm")
@@ -52,8 +40,9 @@ def evaluate_safety(user_text: str, state: Dict[str, Any], signal: Dict[str, Any
     # -------------------------
     # Content gates
     # -------------------------
-    has_explicit = _has_word(t, EXPLICIT_WORDS)
-    has_harass = _has_word(t, HARASS_WORDS)
+    hits = analysis_cache.safety_hits(raw)  # {category: [terms]}, shared: read-only
+    has_explicit = bool(hits.get("explicit"))
+    has_harass = bool(hits.get("harass"))
 
     # -------------------------
     # Decide safety mode
@@ -96,4 +85,5 @@ def evaluate_safety(user_text: str, state: Dict[str, Any], signal: Dict[str, Any
         "pace": pace,                 # fast|normal|slow
         "no_teasing": no_teasing,     # remove 😏 etc.
         "force_concise": force_concise,
+        "hits": hits,                 # per-category lexicon hits
 }
@@ -0,0 +1,163 @@
+# safety_lexicon.py
+# Categorized wordlists (lexicon/safety/<category>.txt) compiled into ONE
+# Aho-Corasick automaton: matching is a single pass over the normalized
+# message, so cost stays flat as the lists grow to tens of thousands of terms.
+import os
+import re
+import threading
+import unicodedata
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import SAFETY_LEXICON_DIR
+
+_LEET = str.maketrans({"0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "8": "b", "@": "a", "$": "s"})
+_TOKEN = re.compile(r"\S+")
+# 3+ repeats are a stretch; the real word had one or two of that letter
+# ("fuuuck" -> "fuck", "pussssy" -> "pussy"), so hits() tries both.
+# Genuine doubles are left alone: "butt" != "but", "ass" != "as".
+_STRETCH = re.compile(r"(.)\1{2,}")
+_SPACES = re.compile(r"\s+")
+
+
+def _leet_token(m: "re.Match") -> str:
+    tok = m.group(0)
+    # only inside words ("h0rny" yes, "i have 3 cats" no)
+    return tok.translate(_LEET) if any(c.isalpha() for c in tok) else tok
+
+
+def _fold(text: str) -> str:
+    t = unicodedata.normalize("NFKC", text or "").casefold()
+    t = "".join(ch for ch in t if unicodedata.category(ch) != "Cf")
+    return _TOKEN.sub(_leet_token, t)
+
+
+def normalize(text: str, stretch: str = r"\1\1") -> str:
+    """
+    NFKC + casefold, drop zero-width/format chars, undo leetspeak inside
+    words, squeeze stretched letters (to two, or to `stretch`), collapse
+    whitespace. Terms and messages go through the same function.
+    """
+    return _SPACES.sub(" ", _STRETCH.sub(stretch, _fold(text))).strip()
+
+
+class Lexicon:
+    __slots__ = ("goto", "fail", "out", "terms", "labels", "cats", "categories")
+
+    def __init__(self, terms_by_category: Dict[str, Iterable[str]]):
+        self.terms: List[str] = []    # normalized, what the automaton matches
+        self.labels: List[str] = []   # as written in the wordlist, what hits report
+        self.cats: List[str] = []
+        self.categories = sorted(terms_by_category)
+        seen = set()
+        for cat in self.categories:
+            for term in terms_by_category[cat]:
+                t = normalize(term)
+                if t and (cat, t) not in seen:
+                    seen.add((cat, t))
+                    self.terms.append(t)
+                    self.labels.append(term.strip())
+                    self.cats.append(cat)
+
+        self.goto: List[Dict[str, int]] = [{}]
+        out: List[List[int]] = [[]]
+        for tid, t in enumerate(self.terms):
+            s = 0
+            for ch in t:
+                n = self.goto[s].get(ch)
+                if n is None:
+                    n = len(self.goto)
+                    self.goto[s][ch] = n
+                    self.goto.append({})
+                    out.append([])
+                s = n
+            out[s].append(tid)
+
+        self.fail = [0] * len(self.goto)
+        q = deque(self.goto[0].values())
+        while q:
+            s = q.popleft()
+            for ch, n in self.goto[s].items():
+                f = self.fail[s]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                fn = self.goto[f].get(ch, 0)
+                self.fail[n] = fn if fn != n else 0
+                out[n] = out[n] + out[self.fail[n]]
+                q.append(n)
+        self.out: List[Tuple[int, ...]] = [tuple(o) for o in out]
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def scan(self, normalized: str) -> Dict[str, List[str]]:
+        """
+        Whole-word hits per category on already-normalized text.
+        """
+        hits: Dict[str, List[str]] = {}
+        goto, fail, out, terms = self.goto, self.fail, self.out, self.terms
+        n = len(normalized)
+        s = 0
+        for i, ch in enumerate(normalized):
+            while s and ch not in goto[s]:
+                s = fail[s]
+            s = goto[s].get(ch, 0)
+            if not out[s]:
+                continue
+            if i + 1 < n and normalized[i + 1].isalnum():
+                continue
+            for tid in out[s]:
+                start = i - len(terms[tid]) + 1
+                if start > 0 and normalized[start - 1].isalnum():
+                    continue
+                found = hits.setdefault(self.cats[tid], [])
+                if self.labels[tid] not in found:
+                    found.append(self.labels[tid])
+        return hits
+
+
+def read_wordlists(path: str) -> Dict[str, List[str]]:
+    lists: Dict[str, List[str]] = {}
+    if not os.path.isdir(path):
+        return lists
+    for name in sorted(os.listdir(path)):
+        if not name.endswith(".txt"):
+            continue
+        with open(os.path.join(path, name), encoding="utf-8") as f:
+            words = [ln.split("#", 1)[0].strip() for ln in f]
+        lists[name[:-4]] = [w for w in words if w]
+    return lists
+
+
+_lock = threading.Lock()
+_lexicon: Optional[Lexicon] = None
+version = 0   # bumps on (re)load (cache invalidation)
+
+
+def load(path: str = None) -> Lexicon:
+    global _lexicon, version
+    lex = Lexicon(read_wordlists(path or SAFETY_LEXICON_DIR))
+    with _lock:
+        _lexicon = lex
+        version += 1
+    return lex
+
+
+def get() -> Lexicon:
+    if _lexicon is None:
+        load()
+    return _lexicon
+
+
+def hits(text: str) -> Dict[str, List[str]]:
+    lex = get()
+    found = lex.scan(normalize(text))
+    if _STRETCH.search(_fold(text)):
+        # stretched letters may stand for a single one: "fuuuck"
+        for cat, terms in lex.scan(normalize(text, r"\1")).items():
+            found.setdefault(cat, []).extend(t for t in terms if t not in found.get(cat, ()))
+    return found
+
+
+def has(text: str, category: str) -> bool:
+    return bool(hits(text).get(category))
@@ -0,0 +1,188 @@
+# summarizer.py
+# Background conversation summaries (memory.users.summary).
+# The reply path only calls maybe_schedule(); folding runs in a worker pool
+# and results go back through memory.set_summary.
+import asyncio
+import logging
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set
+
+import memory
+from config import (
+    SUMMARY_EVERY_EVENTS, SUMMARY_EVERY_S,
+    SUMMARY_QUEUE_MAX, SUMMARY_WORKERS, SUMMARY_POOL,
+)
+
+log = logging.getLogger(__name__)
+
+KEEP_TOP = 5        # feelings / intents kept in the summary
+KEEP_NOTES = 4      # most recent notes kept
+NOTE_CHARS = 60
+DECAY = 0.85        # older counts fade a little on every fold
+
+_queue: Optional[asyncio.Queue] = None
+_queued: Set[int] = set()   # chat_ids waiting or in flight (one job per chat)
+_workers: List[asyncio.Task] = []
+_pool: Optional[Executor] = None
+_stats: Dict[str, Any] = {"scheduled": 0, "done": 0, "dropped": 0, "errors": 0, "last_ms": 0.0}
+
+
+# -------------------------
+# Incremental fold (pure: runs in a thread or a child process)
+# -------------------------
+def _parse_counts(s: str) -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for part in s.split(","):
+        name, _, val = part.strip().rpartition(" ")
+        try:
+            out[name] = float(val)
+        except ValueError:
+            pass
+    return {k: v for k, v in out.items() if k}
+
+
+def parse_summary(summary: str) -> Dict[str, Any]:
+    doc = {"feelings": {}, "intents": {}, "recent": [], "events": 0}
+    for line in (summary or "").splitlines():
+        key, _, val = line.partition(":")
+        key, val = key.strip(), val.strip()
+        if key in ("feelings", "intents"):
+            doc[key] = _parse_counts(val)
+        elif key == "recent":
+            doc["recent"] = [n.strip() for n in val.split(";") if n.strip()]
+        elif key == "events":
+            try:
+                doc["events"] = int(val)
+            except ValueError:
+                pass
+    return doc
+
+
+def _fmt_counts(counts: Dict[str, float]) -> str:
+    top = sorted(counts.items(), key=lambda kv: -kv[1])[:KEEP_TOP]
+    return ", ".join(f"{k} {v:.1f}" for k, v in top if v >= 0.05)
+
+
+def fold(summary: str, events: List[Dict[str, Any]]) -> str:
+    """
+    Folds new events into an existing summary: decays old counts, adds the
+    new ones, keeps the latest notes. Cost depends on len(events) only.
+    """
+    doc = parse_summary(summary)
+    for key in ("feelings", "intents"):
+        doc[key] = {k: v * DECAY for k, v in doc[key].items()}
+
+    for ev in events:
+        label = (ev.get("label") or "").strip()
+        intent = (ev.get("intent") or "").strip()
+        note = (ev.get("note") or "").strip()[:NOTE_CHARS]
+        if label:
+            doc["feelings"][label] = doc["feelings"].get(label, 0.0) + 1.0
+        if intent:
+            doc["intents"][intent] = doc["intents"].get(intent, 0.0) + 1.0
+        if note and note not in doc["recent"][-KEEP_NOTES:]:
+            doc["recent"].append(note.replace(";", ","))
+        doc["events"] += 1
+
+    lines = [
+        f"feelings: {_fmt_counts(doc['feelings'])}",
+        f"intents: {_fmt_counts(doc['intents'])}",
+        f"recent: {'; '.join(doc['recent'][-KEEP_NOTES:])}",
+        f"events: {doc['events']}",
+    ]
+    return "\n".join(lines)
+
+
+# -------------------------
+# Trigger (hot path: no I/O beyond what the caller already loaded)
+# -------------------------
+def due(st: Dict[str, Any], now: float = None) -> bool:
+    pending = memory.pending_events(st)
+    if not pending:
+        return False
+    if len(pending) >= SUMMARY_EVERY_EVENTS:
+        return True
+    now = time.time() if now is None else now
+    since = float(st.get("last_summary_ts") or 0.0) or float(pending[0].get("ts") or now)
+    return now - since >= SUMMARY_EVERY_S
+
+
+def maybe_schedule(chat_id: int, st: Dict[str, Any]) -> bool:
+    """
+    Queues a summary job if the chat is due. Never blocks: when the queue
+    is full the job is dropped and retried on the chat's next event.
+    """
+    if _queue is None or chat_id in _queued or not due(st):
+        return False
+    try:
+        _queue.put_nowait(chat_id)
+    except asyncio.QueueFull:
+        _stats["dropped"] += 1
+        return False
+    _queued.add(chat_id)
+    _stats["scheduled"] += 1
+    return True
+
+
+# -------------------------
+# Workers
+# -------------------------
+async def _summarize(chat_id: int):
+    loop = asyncio.get_running_loop()
+    st = memory.get_user_state(chat_id)
+    events = memory.pending_events(st)
+    if not events:
+        return
+    upto = max(float(ev.get("ts") or 0) for ev in events)
+    summary = memory.get_summary(chat_id)
+
+    t0 = time.perf_counter()
+    new_summary = await loop.run_in_executor(_pool, fold, summary, events)
+    _stats["last_ms"] = (time.perf_counter() - t0) * 1000
+
+    memory.mark_summarized(chat_id, new_summary, upto)
+
+
+async def _worker():
+    while True:
+        chat_id = await _queue.get()
+        try:
+            await _summarize(chat_id)
+            _stats["done"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            _stats["errors"] += 1
+            log.exception("summary failed for chat %s", chat_id)
+        finally:
+            _queued.discard(chat_id)
+            _queue.task_done()
+
+
+def start(workers: int = SUMMARY_WORKERS, queue_max: int = SUMMARY_QUEUE_MAX, pool: str = SUMMARY_POOL):
+    global _queue, _pool
+    if _queue is not None:
+        return
+    n = max(1, int(workers))
+    _pool = ProcessPoolExecutor(n) if pool == "process" else ThreadPoolExecutor(n, thread_name_prefix="summary")
+    _queue = asyncio.Queue(maxsize=max(1, int(queue_max)))
+    loop = asyncio.get_running_loop()
+    _workers.extend(loop.create_task(_worker(), name=f"summary:{i}") for i in range(n))
+
+
+async def stop():
+    global _queue, _pool
+    for t in _workers:
+        t.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    _queued.clear()
+    _queue = None
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def stats() -> Dict[str, Any]:
+    return dict(_stats, queued=_queue.qsize() if _queue is not None else 0)
@@ -0,0 +1,247 @@
+# topics.py
+# Per-chat topic weights (memory.users.topic_weights), exponentially decayed.
+# observe() is O(tokens + K) per message and only touches an in-memory cache;
+# dirty chats are written in batches by the maintenance "flush" job.
+import math
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import maintenance
+import memory
+from config import TOPIC_LEXICON_PATH, TOPIC_HALF_LIFE_S, TOPIC_TOP_K, TOPIC_CACHE_MAX
+
+TS_KEY = "_ts"          # stored weights are "as of" this time
+GLOBAL_META_KEY = "topics_global"
+MIN_WEIGHT = 0.01       # below this a topic is dropped
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+
+# -------------------------
+# Keyword index
+# -------------------------
+def _tokens(text: str) -> List[str]:
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+def load_keywords(path: str = None) -> Dict[str, Tuple[str, ...]]:
+    """keyword (token or "tok tok") -> topics it counts for."""
+    index: Dict[str, List[str]] = {}
+    try:
+        with open(path or TOPIC_LEXICON_PATH, encoding="utf-8") as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return {}
+    for line in lines:
+        line = line.split("#", 1)[0]
+        topic, _, kws = line.partition(":")
+        topic = topic.strip().lower()
+        if not topic or not kws.strip():
+            continue
+        for kw in kws.split(","):
+            key = " ".join(_tokens(kw))
+            if key and topic not in index.setdefault(key, []):
+                index[key].append(topic)
+    return {k: tuple(v) for k, v in index.items()}
+
+
+_KEYWORDS: Optional[Dict[str, Tuple[str, ...]]] = None
+
+
+def keywords() -> Dict[str, Tuple[str, ...]]:
+    global _KEYWORDS
+    if _KEYWORDS is None:
+        _KEYWORDS = load_keywords()
+    return _KEYWORDS
+
+
+def extract(text: str) -> Dict[str, float]:
+    """Topic hits in one message (unigrams + bigrams)."""
+    kw = keywords()
+    toks = _tokens(text)
+    hits: Dict[str, float] = {}
+    for i, tok in enumerate(toks):
+        keys = [tok] if i + 1 == len(toks) else [tok, tok + " " + toks[i + 1]]
+        for key in keys:
+            for topic in kw.get(key, ()):
+                hits[topic] = hits.get(topic, 0.0) + 1.0
+    return hits
+
+
+# -------------------------
+# Decayed weights
+# -------------------------
+def _decay(elapsed_s: float) -> float:
+    if elapsed_s <= 0 or TOPIC_HALF_LIFE_S <= 0:
+        return 1.0
+    return math.pow(0.5, elapsed_s / TOPIC_HALF_LIFE_S)
+
+
+# chat_id -> {"ts": float, "w": {topic: weight as of ts}}
+_cache: "OrderedDict[int, Dict]" = OrderedDict()
+_dirty: set = set()
+
+# sum of every chat's weights, decayed the same way, kept in step with the
+# per-chat changes (so top-N across chats never scans users)
+_global: Dict[str, float] = {}
+_global_ts = 0.0
+_global_loaded = False
+
+
+def _load_global():
+    global _global, _global_ts, _global_loaded
+    if _global_loaded:
+        return
+    _global_loaded = True
+    g = memory.get_meta(GLOBAL_META_KEY, {}) or {}
+    _global_ts = float(g.pop(TS_KEY, 0.0) or 0.0)
+    _global = {k: float(v) for k, v in g.items()}
+
+
+def _global_add(now: float, changes: Dict[str, float]):
+    global _global_ts
+    _load_global()
+    if _global_ts and now > _global_ts:
+        f = _decay(now - _global_ts)
+        for k in _global:
+            _global[k] *= f
+    _global_ts = max(_global_ts, now)
+    for k, d in changes.items():
+        v = _global.get(k, 0.0) + d
+        if v > MIN_WEIGHT:
+            _global[k] = v
+        else:
+            _global.pop(k, None)
+
+
+def _entry(chat_id: int) -> Dict:
+    e = _cache.get(chat_id)
+    if e is None:
+        stored = memory.get_topic_weights(chat_id)
+        ts = float(stored.pop(TS_KEY, 0.0) or 0.0)
+        e = {"ts": ts, "w": {k: float(v) for k, v in stored.items() if isinstance(v, (int, float))}}
+        _cache[chat_id] = e
+        _evict()
+    else:
+        _cache.move_to_end(chat_id)
+    return e
+
+
+def _evict():
+    # drop least-recently used clean chats; dirty ones wait for the flush
+    over = len(_cache) - TOPIC_CACHE_MAX
+    if over <= 0:
+        return
+    for chat_id in list(_cache.keys()):
+        if over <= 0:
+            break
+        if chat_id not in _dirty:
+            del _cache[chat_id]
+            over -= 1
+
+
+def observe(chat_id: int, text: str, now: float = None) -> Dict[str, float]:
+    """
+    Decays the chat's weights to now, adds this message's topic hits,
+    keeps the top-K. Returns the updated weights.
+    """
+    hits = extract(text)
+    e = _entry(chat_id)
+    if not hits:
+        return weights(chat_id, now)
+
+    now = time.time() if now is None else now
+    f = _decay(now - e["ts"]) if e["ts"] else 1.0
+    old = e["w"]
+    new = {k: v * f for k, v in old.items()}
+    for k, n in hits.items():
+        new[k] = new.get(k, 0.0) + n
+
+    top = sorted(new.items(), key=lambda kv: -kv[1])[: max(1, TOPIC_TOP_K)]
+    new = {k: v for k, v in top if v >= MIN_WEIGHT}
+
+    # global changes relative to the old weights decayed to now
+    changes = {k: new.get(k, 0.0) - old.get(k, 0.0) * f for k in set(old) | set(new)}
+    _global_add(now, changes)
+
+    e["ts"] = now
+    e["w"] = new
+    _dirty.add(chat_id)
+    return dict(new)
+
+
+def weights(chat_id: int, now: float = None) -> Dict[str, float]:
+    """Current (decayed) weights for reply generation."""
+    e = _entry(chat_id)
+    if not e["w"]:
+        return {}
+    now = time.time() if now is None else now
+    f = _decay(now - e["ts"]) if e["ts"] else 1.0
+    return {k: v * f for k, v in e["w"].items() if v * f >= MIN_WEIGHT}
+
+
+def top_chat(chat_id: int, n: int = 3) -> List[Tuple[str, float]]:
+    return sorted(weights(chat_id).items(), key=lambda kv: -kv[1])[:n]
+
+
+def top_global(n: int = 10, now: float = None) -> List[Tuple[str, float]]:
+    _load_global()
+    now = time.time() if now is None else now
+    f = _decay(now - _global_ts) if _global_ts else 1.0
+    return sorted(((k, v * f) for k, v in _global.items()), key=lambda kv: -kv[1])[:n]
+
+
+def forget(chat_id: int):
+    """Chat reset: remove its share from the global aggregate too."""
+    e = _entry(chat_id)
+    if e["w"]:
+        now = time.time()
+        f = _decay(now - e["ts"]) if e["ts"] else 1.0
+        _global_add(now, {k: -v * f for k, v in e["w"].items()})
+    e["w"] = {}
+    e["ts"] = 0.0
+    _dirty.discard(chat_id)
+
+
+# -------------------------
+# Persistence (maintenance flush hook)
+# -------------------------
+def _compact(e: Dict) -> Dict[str, float]:
+    out = {k: round(v, 3) for k, v in e["w"].items()}
+    out[TS_KEY] = round(e["ts"], 1)
+    return out
+
+
+def flush(limit: int) -> int:
+    if not _dirty:
+        return 0
+    batch = []
+    for chat_id in list(_dirty)[: max(1, int(limit))]:
+        _dirty.discard(chat_id)
+        e = _cache.get(chat_id)
+        if e is not None:
+            batch.append((chat_id, _compact(e)))
+    g = {k: round(v, 3) for k, v in _global.items()}
+    g[TS_KEY] = _global_ts
+    try:
+        memory.set_topic_weights_many(batch, meta={GLOBAL_META_KEY: g})
+    except Exception:
+        _dirty.update(chat_id for chat_id, _ in batch)  # retry next run
+        raise
+    return len(batch)
+
+
+def flush_all() -> int:
+    n = 0
+    while _dirty:
+        n += flush(1000)
+    return n
+
+
+def pending() -> int:
+    return len(_dirty)
+
+
+maintenance.add_flush_hook("topics", flush)
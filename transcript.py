@@ -0,0 +1,223 @@
+# transcript.py
+# Both sides of every chat, append-only, in memory.db's transcript table.
+#
+# add() only buffers; the maintenance flush writes the buffer in one
+# transaction. The newest turns are one row each (kind USER/BOT, UTF-8
+# text, zlib'd if long enough to win). The "transcript" job packs older
+# ones into SEGMENT rows, each holding many turns as a compact zlib'd
+# varint record list. It also drops turns more than TRANSCRIPT_KEEP_TURNS
+# behind the newest (per-chat ring).
+#
+# last(chat_id, n) reads at most n rows newest-first along the primary key
+# (chat_id, seq), so it is O(n) plus at most the segments it reaches. It
+# never touches other chats or state JSON.
+import time
+import zlib
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import maintenance
+import memory
+from config import (
+    TRANSCRIPT_KEEP_TURNS, TRANSCRIPT_HOT_TURNS, TRANSCRIPT_SEGMENT_TURNS, TRANSCRIPT_MAX_CHARS, MAINT_TRANSCRIPT_S,
+)
+
+USER, BOT, SEGMENT = 0, 1, 2
+ZLIB = 4                # flag on kind: body is zlib-compressed
+COMPRESS_MIN = 120      # shorter texts don't shrink under zlib
+
+
+class Turn(NamedTuple):
+    seq: int            # 0 while still buffered
+    ts: int
+    side: int           # USER | BOT
+    text: str
+
+
+_pending: Dict[int, List[Tuple[int, int, str]]] = {}   # chat_id -> [(ts, side, text)] not written yet
+_to_compact: set = set()                                # chats written since their last compaction
+_stats: Counter = Counter()                             # turns / flushed / packed / segments / trimmed / reads
+
+
+# -------------------------
+# Encoding
+# -------------------------
+def _varint(n: int, out: bytearray):
+    n = max(0, int(n))
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(b: bytes, i: int) -> Tuple[int, int]:
+    n = shift = 0
+    while True:
+        c = b[i]
+        i += 1
+        n |= (c & 0x7F) << shift
+        if c < 0x80:
+            return n, i
+        shift += 7
+
+
+def encode_turn(side: int, text: str) -> Tuple[int, bytes]:
+    raw = text.encode("utf-8")
+    if len(raw) >= COMPRESS_MIN:
+        z = zlib.compress(raw, 6)
+        if len(z) < len(raw):
+            return side | ZLIB, z
+    return side, raw
+
+
+def decode_turn(kind: int, body: bytes) -> str:
+    return (zlib.decompress(body) if kind & ZLIB else bytes(body)).decode("utf-8", "replace")
+
+
+def encode_segment(turns: List[Turn]) -> bytes:
+    """[count][base_ts] then per turn [seq delta][ts delta][side][len][utf-8]; zlib'd as a whole."""
+    out = bytearray()
+    _varint(len(turns), out)
+    _varint(turns[0].ts, out)
+    prev_seq, prev_ts = turns[0].seq - 1, turns[0].ts
+    for t in turns:
+        raw = t.text.encode("utf-8")
+        _varint(t.seq - prev_seq, out)
+        _varint(t.ts - prev_ts, out)   # clamped at 0 if clocks went backwards
+        out.append(t.side)
+        _varint(len(raw), out)
+        out += raw
+        prev_seq, prev_ts = t.seq, max(prev_ts, t.ts)
+    return zlib.compress(bytes(out), 6)
+
+
+def decode_segment(last_seq: int, body: bytes) -> List[Turn]:
+    b = zlib.decompress(body)
+    count, i = _read_varint(b, 0)
+    ts, i = _read_varint(b, i)
+    turns = []
+    seq = None
+    for _ in range(count):
+        d_seq, i = _read_varint(b, i)
+        d_ts, i = _read_varint(b, i)
+        side = b[i]
+        n, i = _read_varint(b, i + 1)
+        text = b[i:i + n].decode("utf-8", "replace")
+        i += n
+        seq = d_seq if seq is None else seq + d_seq
+        ts += d_ts
+        turns.append(Turn(seq, ts, side, text))
+    # seqs were stored relative to the first; anchor them on the row's seq
+    shift = last_seq - turns[-1].seq if turns else 0
+    return [t._replace(seq=t.seq + shift) for t in turns]
+
+
+# -------------------------
+# Write path
+# -------------------------
+def add(chat_id: int, user_text: str, reply: Optional[str] = None, ts: float = None):
+    """One exchange (reply may be None); buffered until the next flush."""
+    ts = int(ts if ts is not None else time.time())
+    buf = _pending.setdefault(chat_id, [])
+    buf.append((ts, USER, (user_text or "")[:TRANSCRIPT_MAX_CHARS]))
+    if reply is not None:
+        buf.append((ts, BOT, reply[:TRANSCRIPT_MAX_CHARS]))
+    _stats["turns"] += 2 if reply is not None else 1
+
+
+def flush(limit: int = 0) -> int:
+    if not _pending:
+        return 0
+    chats = list(_pending)[: max(1, int(limit))] if limit else list(_pending)
+    rows, taken = [], {}
+    for chat_id in chats:
+        taken[chat_id] = _pending.pop(chat_id)
+        for ts, side, text in taken[chat_id]:
+            kind, body = encode_turn(side, text)
+            rows.append((chat_id, ts, kind, body))
+    try:
+        memory.append_turns(rows)
+    except Exception:
+        for chat_id, buf in taken.items():   # retry next run, keeping order
+            _pending[chat_id] = buf + _pending.get(chat_id, [])
+        raise
+    _to_compact.update(taken)
+    _stats["flushed"] += len(rows)
+    return len(chats)
+
+
+def clear(chat_id: int):
+    """Drops buffered turns (the rows go with memory.reset_memory)."""
+    _pending.pop(chat_id, None)
+    _to_compact.discard(chat_id)
+
+
+# -------------------------
+# Read path
+# -------------------------
+def last(chat_id: int, n: int = 20) -> List[Turn]:
+    """The chat's last n turns, oldest first (buffered ones included)."""
+    if n <= 0:
+        return []
+    _stats["reads"] += 1
+    out = [Turn(0, ts, side, text) for ts, side, text in reversed(_pending.get(chat_id, []))][:n]
+    if len(out) < n:
+        for row in memory.read_turns(chat_id, n - len(out)):
+            kind = row["kind"]
+            if kind & SEGMENT:
+                seg = decode_segment(row["seq"], row["body"])
+                out.extend(reversed(seg))
+            else:
+                out.append(Turn(row["seq"], row["ts"], kind & 1, decode_turn(kind, row["body"])))
+            if len(out) >= n:
+                break
+    out = out[:n]
+    out.reverse()
+    return out
+
+
+def recent_replies(chat_id: int, n: int = 30) -> List[str]:
+    """The bot's side of the last n turns, oldest first (anti-repeat)."""
+    return [t.text for t in last(chat_id, n) if t.side == BOT]
+
+
+# -------------------------
+# Compaction (maintenance job)
+# -------------------------
+def compact_chat(chat_id: int) -> int:
+    """Packs the oldest one-row turns past the hot window, then applies the ring. Returns rows removed."""
+    removed = 0
+    while True:
+        rows = memory.oldest_single_turns(chat_id, SEGMENT, TRANSCRIPT_HOT_TURNS, TRANSCRIPT_SEGMENT_TURNS)
+        if not rows:
+            break
+        turns = [Turn(r["seq"], r["ts"], r["kind"] & 1, decode_turn(r["kind"], r["body"])) for r in rows]
+        memory.replace_with_segment(
+            chat_id, [t.seq for t in turns], turns[-1].seq, SEGMENT | ZLIB, turns[-1].ts, encode_segment(turns)
+        )
+        _stats["packed"] += len(turns)
+        _stats["segments"] += 1
+        removed += len(turns) - 1
+    n = memory.trim_turns(chat_id, TRANSCRIPT_KEEP_TURNS)
+    _stats["trimmed"] += n
+    return removed + n
+
+
+def _step_compact(limit: int) -> Tuple[int, bool]:
+    n = 0
+    for chat_id in list(_to_compact)[: max(1, int(limit))]:
+        _to_compact.discard(chat_id)
+        compact_chat(chat_id)
+        n += 1
+    return n, bool(_to_compact)
+
+
+def stats() -> Dict[str, int]:
+    out = dict(_stats)
+    out["buffered"] = sum(len(v) for v in _pending.values())
+    out["to_compact"] = len(_to_compact)
+    return out
+
+
+maintenance.add_flush_hook("transcript", flush)
+maintenance.register_job("transcript", _step_compact, MAINT_TRANSCRIPT_S, batch=20)
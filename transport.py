@@ -0,0 +1,163 @@
+# transport.py
+# Bot API HTTP clients built from config (HTTP_*), and per-method tracing.
+#
+# Sends (sendMessage, sendChatAction, ...) and getUpdates get separate
+# clients, so a long poll never holds a connection a reply is waiting for.
+# Every call is timed from the moment httpx takes it to the response
+# headers; "pool wait" is the part before it got a connection (fresh TCP
+# connect or a kept-alive one). Both are kept per Bot API method.
+import time
+from collections import Counter, defaultdict, deque
+from typing import Any, Deque, Dict
+
+import httpx
+from telegram.error import TimedOut
+from telegram.ext import ApplicationBuilder
+from telegram.request import HTTPXRequest
+
+from config import (
+    HTTP_VERSION, HTTP_POOL_SIZE, HTTP_KEEPALIVE_S, HTTP_CONNECT_TIMEOUT_S, HTTP_READ_TIMEOUT_S,
+    HTTP_WRITE_TIMEOUT_S, HTTP_POOL_TIMEOUT_S, HTTP_UPDATES_POOL_SIZE, HTTP_TRACE,
+)
+
+SAMPLES = 512   # recent calls kept per method for percentiles
+
+_calls: Counter = Counter()                     # method -> calls
+_errors: Counter = Counter()                    # "method:kind" -> count
+_new_conns: Counter = Counter()                 # method -> calls that had to open a connection
+_latency: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=SAMPLES))    # seconds
+_pool_wait: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=SAMPLES))  # seconds
+
+
+def _method(url: httpx.URL) -> str:
+    return url.path.rstrip("/").rsplit("/", 1)[-1] or "?"
+
+
+# -------------------------
+# httpx hooks
+# -------------------------
+async def _on_request(request: httpx.Request):
+    t = {"t0": time.perf_counter(), "conn": None, "new": False}
+    request.extensions["ellena_trace"] = t
+
+    async def trace(name: str, info: Dict[str, Any]):
+        # first thing the connection does for this request ends the pool wait
+        if t["conn"] is None and (name.startswith("connection.") or name.endswith(".send_request_headers.started")):
+            t["conn"] = time.perf_counter()
+        if name == "connection.connect_tcp.started":
+            t["new"] = True
+
+    request.extensions["trace"] = trace
+
+
+async def _on_response(response: httpx.Response):
+    t = response.request.extensions.get("ellena_trace")
+    if not t:
+        return
+    now = time.perf_counter()
+    m = _method(response.request.url)
+    _calls[m] += 1
+    _latency[m].append(now - t["t0"])
+    _pool_wait[m].append((t["conn"] or now) - t["t0"])
+    if t["new"]:
+        _new_conns[m] += 1
+
+
+class TracedRequest(HTTPXRequest):
+    """HTTPXRequest that also counts timeouts per method (they never reach the response hook)."""
+
+    async def do_request(self, url: str, method: str, *args, **kwargs):
+        try:
+            return await super().do_request(url, method, *args, **kwargs)
+        except TimedOut as e:
+            kind = "pool_timeout" if "Pool timeout" in str(e) else "timeout"
+            _errors[f"{_method(httpx.URL(url))}:{kind}"] += 1
+            raise
+
+
+# -------------------------
+# Builders
+# -------------------------
+def build_request(
+    pool_size: int = None,
+    http_version: str = None,
+    keepalive_s: float = None,
+    pool_timeout_s: float = None,
+    read_timeout_s: float = None,
+    trace: bool = None,
+) -> HTTPXRequest:
+    """One client; unset arguments come from config."""
+    pool_size = max(1, int(pool_size or HTTP_POOL_SIZE))
+    trace = HTTP_TRACE if trace is None else trace
+    kw: Dict[str, Any] = {
+        "limits": httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=HTTP_KEEPALIVE_S if keepalive_s is None else keepalive_s,
+        ),
+    }
+    if trace:
+        kw["event_hooks"] = {"request": [_on_request], "response": [_on_response]}
+    return TracedRequest(
+        connection_pool_size=pool_size,
+        http_version=http_version or HTTP_VERSION,
+        connect_timeout=HTTP_CONNECT_TIMEOUT_S,
+        read_timeout=HTTP_READ_TIMEOUT_S if read_timeout_s is None else read_timeout_s,
+        write_timeout=HTTP_WRITE_TIMEOUT_S,
+        pool_timeout=HTTP_POOL_TIMEOUT_S if pool_timeout_s is None else pool_timeout_s,
+        httpx_kwargs=kw,
+    )
+
+
+def apply(builder: ApplicationBuilder, **kw) -> ApplicationBuilder:
+    """Sends and getUpdates on their own clients (getUpdates' read timeout is extended by PTB per poll)."""
+    return builder.request(build_request(**kw)).get_updates_request(
+        build_request(pool_size=HTTP_UPDATES_POOL_SIZE, http_version=kw.get("http_version"), trace=kw.get("trace"))
+    )
+
+
+# -------------------------
+# Reporting
+# -------------------------
+def _pct(values, p: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    return s[min(len(s) - 1, int(p * len(s)))]
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    """method -> calls, p50/p99 latency and pool wait (ms, recent calls), new connections, errors."""
+    out: Dict[str, Dict[str, Any]] = {}
+    for m in sorted(_calls):
+        lat, wait = list(_latency[m]), list(_pool_wait[m])
+        out[m] = {
+            "calls": _calls[m],
+            "p50_ms": round(_pct(lat, 0.50) * 1000, 1),
+            "p99_ms": round(_pct(lat, 0.99) * 1000, 1),
+            "wait_p50_ms": round(_pct(wait, 0.50) * 1000, 1),
+            "wait_p99_ms": round(_pct(wait, 0.99) * 1000, 1),
+            "new_conns": _new_conns[m],
+        }
+    for key, n in _errors.items():
+        m, kind = key.split(":", 1)
+        out.setdefault(m, {"calls": 0})[kind] = n
+    return out
+
+
+def format_stats(methods=("sendMessage", "sendChatAction")) -> str:
+    s = stats()
+    parts = [f"http={HTTP_VERSION} pool={HTTP_POOL_SIZE}"]
+    for m in methods:
+        r = s.get(m)
+        if r and r.get("calls"):
+            parts.append(
+                f"{m} p50={r['p50_ms']}ms p99={r['p99_ms']}ms wait_p99={r['wait_p99_ms']}ms "
+                f"conns={r['new_conns']} timeouts={r.get('timeout', 0) + r.get('pool_timeout', 0)}"
+            )
+    return "\n".join(parts)
+
+
+def reset():
+    for c in (_calls, _errors, _new_conns, _latency, _pool_wait):
+        c.clear()